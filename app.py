@@ -1,284 +1,775 @@
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify
-import boto3
-from boto3.dynamodb.conditions import Key
+from time import perf_counter
+_import_started = perf_counter()
+
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify, make_response, Response, stream_with_context
+from markupsafe import Markup
 import os
 import uuid
-from datetime import datetime, date, time, timedelta
+import csv
+import hashlib
+import math
+import io
+import json
+import queue
+import click
+from datetime import datetime, date, timedelta
 from decimal import Decimal
+from applog import setup_logging
+from cache import make_cache, make_versions
+from ratelimit import make_limiter
+from metrics import DynamoDBMetrics, Registry, instrument_app
+from events import make_broker
+from billing import BillingError, accrued_charges, booking_start, compute_charge, tariff_from_owner, tariff_snapshot
+from storage import (RESERVATION_MAX_HOURS, ReservationConflict, SlotConflict, Throttled,
+                     history_key, make_repository, project, stay_blocks, stay_token)
+import geo
+import rollups
+import sweeper
+from assets import Assets, build_assets, vendor_assets
+
 
+log = setup_logging('parking')
 
 app = Flask(__name__)
 app.secret_key = "your_secret_key_here"  # Replace with a strong secret key
 app.permanent_session_lifetime = timedelta(minutes=30)
 
-# DynamoDB resource
-dynamodb = boto3.resource('dynamodb')
-
-
-# DynamoDB Tables setup functions
-def setup_users_table():
-    table_name = 'Userdata'
-    try:
-        # Try to get the table first
-        table = dynamodb.Table(table_name)
-        table.table_status  # This will raise an exception if table doesn't exist
-        return table
-    except dynamodb.meta.client.exceptions.ResourceNotFoundException:
-        # Create table if it doesn't exist
-        table = dynamodb.create_table(
-            TableName=table_name,
-            KeySchema=[
-                {'AttributeName': 'email', 'KeyType': 'HASH'},  # Primary key
-            ],
-            AttributeDefinitions=[
-                {'AttributeName': 'email', 'AttributeType': 'S'},
-                {'AttributeName': 'username', 'AttributeType': 'S'},
-            ],
-            GlobalSecondaryIndexes=[
-                {
-                    'IndexName': 'UsernameIndex',
-                    'KeySchema': [
-                        {'AttributeName': 'username', 'KeyType': 'HASH'},
-                    ],
-                    'Projection': {'ProjectionType': 'ALL'},
-                    'ProvisionedThroughput': {
-                        'ReadCapacityUnits': 5,
-                        'WriteCapacityUnits': 5
-                    }
-                },
-            ],
-            ProvisionedThroughput={'ReadCapacityUnits': 5, 'WriteCapacityUnits': 5}
-        )
-        # Wait until the table exists
-        table.meta.client.get_waiter('table_exists').wait(TableName=table_name)
-        return table
-    except Exception as e:
-        print(f"Error setting up Userdata table: {str(e)}")
-        return None
+# Fingerprinted, precompressed static files built by 'flask build-assets'
+assets = Assets(app)
 
-def setup_owners_table():
-    table_name = 'Owners'
-    try:
-        # Try to get the table first
-        table = dynamodb.Table(table_name)
-        table.table_status  # This will raise an exception if table doesn't exist
-        return table
-    except dynamodb.meta.client.exceptions.ResourceNotFoundException:
-        # Create table if it doesn't exist
-        table = dynamodb.create_table(
-            TableName=table_name,
-            KeySchema=[
-                {'AttributeName': 'email', 'KeyType': 'HASH'},  # Primary key
-            ],
-            AttributeDefinitions=[
-                {'AttributeName': 'email', 'AttributeType': 'S'},
-            ],
-            ProvisionedThroughput={'ReadCapacityUnits': 5, 'WriteCapacityUnits': 5}
-        )
-        # Wait until the table exists
-        table.meta.client.get_waiter('table_exists').wait(TableName=table_name)
-        return table
-    except Exception as e:
-        print(f"Error setting up Owners table: {str(e)}")
-        return None
+# Storage backend: DynamoDB by default, or STORAGE_BACKEND=memory/sqlite for
+# single-site, test and benchmark runs. See storage/__init__.py.
+repository = make_repository()
 
-def setup_slots_table():
-    table_name = 'SlotDetails'
-    try:
-        # Try to get the table first
-        table = dynamodb.Table(table_name)
-        table.table_status  # This will raise an exception if table doesn't exist
-        return table
-    except dynamodb.meta.client.exceptions.ResourceNotFoundException:
-        # Create table if it doesn't exist
-        table = dynamodb.create_table(
-            TableName=table_name,
-            KeySchema=[
-                {'AttributeName': 'id', 'KeyType': 'HASH'},  # Primary key
-            ],
-            AttributeDefinitions=[
-                {'AttributeName': 'id', 'AttributeType': 'S'},
-                {'AttributeName': 'ownerEmail', 'AttributeType': 'S'},
-            ],
-            GlobalSecondaryIndexes=[
-                {
-                    'IndexName': 'OwnerEmailIndex',
-                    'KeySchema': [
-                        {'AttributeName': 'ownerEmail', 'KeyType': 'HASH'},
-                    ],
-                    'Projection': {'ProjectionType': 'ALL'},
-                    'ProvisionedThroughput': {
-                        'ReadCapacityUnits': 5,
-                        'WriteCapacityUnits': 5
-                    }
-                },
-            ],
-            ProvisionedThroughput={'ReadCapacityUnits': 5, 'WriteCapacityUnits': 5}
+# Request and DynamoDB instrumentation, exposed at /metrics. Recording a
+# sample is a dict update under a lock; set METRICS_ENABLED=0 to skip it.
+metrics_registry = Registry()
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') != '0'
+if METRICS_ENABLED:
+    instrument_app(app, metrics_registry)
+    if repository.name == 'dynamodb':
+        # Each worker thread has its own client; the hook instruments all of them
+        dynamodb_metrics = DynamoDBMetrics(
+            metrics_registry,
+            consumed_capacity=os.environ.get('METRICS_CONSUMED_CAPACITY', '1') != '0',
         )
-        # Wait until the table exists
-        table.meta.client.get_waiter('table_exists').wait(TableName=table_name)
-        return table
-    except Exception as e:
-        print(f"Error setting up SlotDetails table: {str(e)}")
-        return None
+        repository.clients.add_client_hook(dynamodb_metrics.attach)
 
-# Initialize tables
-users_table = None
-owners_table = None
-slots_table = None
+# Live slot updates, one channel per lot. Set EVENTS_URL=redis://... to fan
+# out across workers.
+slot_events = make_broker(os.environ.get('EVENTS_URL'))
+SSE_KEEPALIVE_SECONDS = 15
 
-def verify_tables():
-    try:
-        # List all tables
-        existing_tables = dynamodb.meta.client.list_tables()['TableNames']
-        print("Existing DynamoDB tables:", existing_tables)
-        
-        # Check Owners table
-        if 'Owners' in existing_tables:
-            owners_table = dynamodb.Table('Owners')
-            print("Owners table exists with schema:", owners_table.key_schema)
-        else:
-            print("Owners table does not exist!")
-        
-        # Check Userdata table
-        if 'Userdata' in existing_tables:
-            users_table = dynamodb.Table('Userdata')
-            print("Userdata table exists with schema:", users_table.key_schema)
-        else:
-            print("Userdata table does not exist!")
-            
-    except Exception as e:
-        print("Error verifying tables:", str(e))
+# Owner records (orgName, costPerHour) rarely change, so lookups are cached.
+# Only the fields listings and billing read are kept, never credentials.
+# Set CACHE_URL=redis://... to share the cache between workers.
+OWNER_CACHE_FIELDS = ['email', 'orgName', 'orgType', 'costPerHour', 'graceMinutes', 'tiers', 'lat', 'lon']
+owner_cache = make_cache(
+    'owners',
+    maxsize=int(os.environ.get('OWNER_CACHE_SIZE', '1024')),
+    ttl=int(os.environ.get('OWNER_CACHE_TTL', '300')),
+    url=os.environ.get('CACHE_URL'),
+)
 
-def init_tables():
-    global users_table, owners_table, slots_table
-    print("Initializing DynamoDB tables...")
-    verify_tables()
-    users_table = setup_users_table()
-    owners_table = setup_owners_table()
-    slots_table = setup_slots_table()
-    print("Tables initialized:", {
-        'users_table': users_table is not None,
-        'owners_table': owners_table is not None,
-        'slots_table': slots_table is not None
-    })
+# The owner list and each lot's slot grid carry version stamps that every
+# write bumps. Stamps key the rendered grids and the pages' ETags, so a repeat
+# view is a 304 or a cached fragment, with no query and no grid render.
+# Without CACHE_URL stamps are per worker and roll over every
+# LISTING_VERSION_TTL seconds, which bounds how stale another worker can be.
+listing_versions = make_versions(
+    'listing',
+    ttl=int(os.environ.get('LISTING_VERSION_TTL', '30')),
+    url=os.environ.get('CACHE_URL'),
+)
+fragment_cache = make_cache(
+    'fragments',
+    maxsize=int(os.environ.get('FRAGMENT_CACHE_SIZE', '512')),
+    ttl=int(os.environ.get('FRAGMENT_CACHE_TTL', '600')),
+    url=os.environ.get('CACHE_URL'),
+)
+# Part of every fragment key and ETag, so a deploy never reuses old markup
+LISTING_RELEASE = os.environ.get('RELEASE') or os.environ.get('VERCEL_GIT_COMMIT_SHA') or uuid.uuid4().hex
+
+# Admission control for /book, /reserve, /get_bill and /cancel: token buckets
+# per user and per lot, so one client or one busy lot gets 429s instead of
+# using up the tables' throughput for everyone. Rates are requests per second.
+# Set RATE_LIMIT_URL (or CACHE_URL) to redis://... to share the buckets
+# between workers, or RATE_LIMIT_ENABLED=0 to turn admission control off.
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', '1') != '0'
+RATE_LIMIT_URL = os.environ.get('RATE_LIMIT_URL') or os.environ.get('CACHE_URL')
+user_limiter = make_limiter(
+    'ratelimit:user',
+    rate=float(os.environ.get('RATE_LIMIT_USER_RATE', '1')),
+    burst=float(os.environ.get('RATE_LIMIT_USER_BURST', '10')),
+    url=RATE_LIMIT_URL,
+)
+lot_limiter = make_limiter(
+    'ratelimit:lot',
+    rate=float(os.environ.get('RATE_LIMIT_LOT_RATE', '5')),
+    burst=float(os.environ.get('RATE_LIMIT_LOT_BURST', '25')),
+    url=RATE_LIMIT_URL,
+)
+rate_limit_decisions = metrics_registry.counter(
+    'rate_limit_requests_total', 'Booking requests checked by the rate limiter, by scope and result.',
+    ('scope', 'result'))
 
-# Initialize tables at startup
-with app.app_context():
-    init_tables()
+
+def init_tables():
+    """Create or verify whatever the storage backend needs."""
+    return repository.init_schema()
 
 # Model helper functions
 def find_user_by_email(email):
     try:
-        if not users_table:
-            init_tables()
-        response = users_table.get_item(Key={'email': email})
-        return response.get('Item')
+        return repository.find_user_by_email(email)
+    except Throttled:
+        raise
     except Exception as e:
-        print(f"Error finding user by email: {str(e)}")
+        log.error("Error finding user by email: %s", e)
         return None
 
 def find_user_by_username(username):
     try:
-        if not users_table:
-            init_tables()
-        response = users_table.query(
-            IndexName='UsernameIndex',
-            KeyConditionExpression=Key('username').eq(username)
-        )
-        items = response.get('Items', [])
-        return items[0] if items else None
+        return repository.find_user_by_username(username)
+    except Throttled:
+        raise
+    except Exception as e:
+        log.error("Error finding user by username: %s", e)
+        return None
+
+# The owner cache is best-effort: an unreachable cache reads as a miss and
+# never stands in for the store's answer
+def get_cached_owner(email):
+    try:
+        return owner_cache.get(email)
     except Exception as e:
-        print(f"Error finding user by username: {str(e)}")
+        log.error("Error reading owner cache: %s", e)
         return None
 
+def set_cached_owner(email, owner):
+    try:
+        owner_cache.set(email, owner)
+    except Exception as e:
+        log.error("Error writing owner cache: %s", e)
+
+def forget_cached_owner(email):
+    try:
+        owner_cache.delete(email)
+    except Exception as e:
+        log.error("Error invalidating owner cache for %s: %s", email, e)
+
 def find_owner_by_email(email):
+    """Return the owner's OWNER_CACHE_FIELDS, cached; use find_owner_login for the password."""
     try:
-        if not owners_table:
-            init_tables()
-        print("Looking up owner with email:", email)
-        response = owners_table.get_item(Key={'email': email})
-        owner = response.get('Item')
-        print("Found owner:", owner)
+        cached = get_cached_owner(email)
+        if cached is not None:
+            return dict(cached)
+        log.debug("Looking up owner with email: %s", email)
+        owner = project(repository.find_owner_by_email(email), OWNER_CACHE_FIELDS)
+        log.debug("Found owner", extra={'data': {'owner': owner}})
+        if owner:
+            set_cached_owner(email, dict(owner))
         return owner
+    except Throttled:
+        raise
     except Exception as e:
-        print(f"Error finding owner by email: {str(e)}")
+        log.error("Error finding owner by email: %s", e)
         return None
 
-def find_all_owners():
+def find_owner_login(email):
+    """Return the full owner record, password included, straight from the store."""
     try:
-        if not owners_table:
-            init_tables()
-        response = owners_table.scan()
-        return response.get('Items', [])
+        return repository.find_owner_by_email(email)
+    except Throttled:
+        raise
     except Exception as e:
-        print(f"Error finding all owners: {str(e)}")
-        return []
+        log.error("Error finding owner by email: %s", e)
+        return None
+
+OWNERS_PAGE_SIZE = 24
+OWNERS_MAX_PAGE_SIZE = 100
+OWNER_LIST_FIELDS = ['email', 'orgName', 'orgType', 'costPerHour']
+SCAN_SEGMENTS = int(os.environ.get('SCAN_SEGMENTS', '8'))
+
+def find_owners_page(limit=OWNERS_PAGE_SIZE, cursor=None):
+    """Return one page of owners and the cursor for the next page.
+
+    Only the attributes the owner list needs are read. The returned cursor
+    is None on the last page.
+    """
+    try:
+        return repository.find_owners_page(limit, cursor, OWNER_LIST_FIELDS)
+    except (ValueError, Throttled):
+        raise
+    except Exception as e:
+        log.error("Error finding owners page: %s", e)
+        return [], None
+
+def iter_owners(segments=None):
+    """Yield every owner; DynamoDB streams them with a parallel segmented scan."""
+    return repository.iter_owners(segments or SCAN_SEGMENTS)
+
+NEARBY_DEFAULT_LIMIT = 10
+NEARBY_MAX_LIMIT = 50
+
+def find_nearby_lots(lat, lon, limit=NEARBY_DEFAULT_LIMIT, org_type=None, max_price=None,
+                     max_distance_km=None, free_only=True):
+    """Return the nearest lots as (distance_km, owner, availability), nearest first.
+
+    Candidates come from geohash prefix reads around the point, never a
+    scan; with free_only, lots with no free slot are skipped.
+    """
+    availability = {}
+
+    def accept(owners):
+        if not free_only:
+            return owners
+        emails = [owner['email'] for owner in owners]
+        for start in range(0, len(emails), OWNERS_MAX_PAGE_SIZE):  # BatchGetItem takes 100 keys
+            availability.update(find_availability_for_owners(emails[start:start + OWNERS_MAX_PAGE_SIZE]))
+        return [owner for owner in owners if availability.get(owner['email'], {}).get('free', 0) > 0]
+
+    hits = geo.nearby(
+        lambda prefix: repository.find_owners_by_geohash(prefix, org_type, max_price),
+        lat, lon, limit, accept=accept, max_distance_km=max_distance_km,
+    )
+    if not free_only:
+        availability = find_availability_for_owners([owner['email'] for _, owner in hits])
+    return [(distance, owner, availability.get(owner['email'])) for distance, owner in hits]
 
 def find_slot_by_id(id):
     try:
-        if not slots_table:
-            init_tables()
-        response = slots_table.get_item(Key={'id': id})
-        return response.get('Item')
+        return repository.find_slot_by_id(id)
+    except Throttled:
+        raise
     except Exception as e:
-        print(f"Error finding slot by id: {str(e)}")
+        log.error("Error finding slot by id: %s", e)
         return None
 
 def find_slots_by_owner_email(ownerEmail):
     try:
-        if not slots_table:
-            init_tables()
-        response = slots_table.query(
-            IndexName='OwnerEmailIndex',
-            KeyConditionExpression=Key('ownerEmail').eq(ownerEmail)
-        )
-        return response.get('Items', [])
+        return repository.find_slots_by_owner_email(ownerEmail)
+    except Throttled:
+        raise
     except Exception as e:
-        print(f"Error finding slots by owner email: {str(e)}")
+        log.error("Error finding slots by owner email: %s", e)
         return []
 
+SLOTS_PAGE_SIZE = 50
+SLOTS_MAX_PAGE_SIZE = 200
+SLOT_LIST_FIELDS = ['id', 'slotNumber', 'floorNumber', 'status']
+
+def find_slots_page(owner_email, limit=SLOTS_PAGE_SIZE, cursor=None, floor_number=None):
+    """Return up to limit slots of a lot, projected to SLOT_LIST_FIELDS.
+
+    With floor_number set, only that floor's slots are returned. The
+    returned cursor is None once the lot is exhausted.
+    """
+    return repository.find_slots_page(owner_email, limit, cursor, floor_number, SLOT_LIST_FIELDS)
+
 def save_user(user_data):
     try:
-        if not users_table:
-            init_tables()
-        response = users_table.put_item(Item=user_data)
-        return response
+        return repository.save_user(user_data)
+    except Throttled:
+        raise
     except Exception as e:
-        print(f"Error saving user: {str(e)}")
+        log.error("Error saving user: %s", e)
         return None
 
 def save_owner(owner_data):
     try:
-        if not owners_table:
-            init_tables()
-        # Convert costPerHour to Decimal for DynamoDB
+        # Convert costPerHour to Decimal, the type every backend stores numbers as
         owner_data['costPerHour'] = Decimal(str(owner_data['costPerHour']))
-        print("Attempting to save owner data to DynamoDB:", owner_data)
-        response = owners_table.put_item(
-            Item={
-                'email': owner_data['email'],
-                'password': owner_data['password'],
-                'orgType': owner_data['orgType'],
-                'orgName': owner_data['orgName'],
-                'costPerHour': owner_data['costPerHour']
-            }
-        )
-        print("DynamoDB response:", response)
+        log.debug("Attempting to save owner data", extra={'data': {'owner': owner_data}})
+        item = {
+            'email': owner_data['email'],
+            'password': owner_data['password'],
+            'orgType': owner_data['orgType'],
+            'orgName': owner_data['orgName'],
+            'costPerHour': owner_data['costPerHour']
+        }
+        # Lots with coordinates are indexed for the nearby search, see geo.py
+        if owner_data.get('lat') is not None and owner_data.get('lon') is not None:
+            item['lat'] = Decimal(str(owner_data['lat']))
+            item['lon'] = Decimal(str(owner_data['lon']))
+            item['geohash'] = geo.encode(float(item['lat']), float(item['lon']))
+            item['geoPartition'] = item['geohash'][:geo.PARTITION_PRECISION]
+        # Optional tariff settings, see billing.Tariff
+        if owner_data.get('graceMinutes'):
+            item['graceMinutes'] = int(owner_data['graceMinutes'])
+        if owner_data.get('tiers'):
+            item['tiers'] = [{
+                'fromHours': Decimal(str(tier['fromHours'])),
+                'costPerHour': Decimal(str(tier['costPerHour']))
+            } for tier in owner_data['tiers']]
+        response = repository.save_owner(item)
+        log.debug("Storage response", extra={'data': {'response': response}})
+        forget_cached_owner(owner_data['email'])
+        bump_listing_version('owners')
         return response
+    except Throttled:
+        raise
     except Exception as e:
-        print(f"Error saving owner: {str(e)}")
+        log.error("Error saving owner: %s", e)
         raise e
 
 def save_slot(slot_data):
     try:
-        if not slots_table:
-            init_tables()
-        response = slots_table.put_item(Item=slot_data)
+        response = repository.save_slot(slot_data)
+        bump_listing_version(lot_version_key(slot_data['ownerEmail']))
         return response
+    except Throttled:
+        raise
+    except Exception as e:
+        log.error("Error saving slot: %s", e)
+        return None
+
+def create_slot(slot_data):
+    """Store a new free slot and count it in the same write."""
+    try:
+        repository.create_slot(slot_data)
+        bump_listing_version(lot_version_key(slot_data['ownerEmail']))
+        return True
+    except Throttled:
+        raise
+    except Exception as e:
+        log.error("Error creating slot: %s", e)
+        return False
+
+def find_availability(owner_email):
+    """Return free/occupied counts for a lot and each of its floors."""
+    try:
+        return repository.find_availability(owner_email)
+    except Throttled:
+        raise
     except Exception as e:
-        print(f"Error saving slot: {str(e)}")
+        log.error("Error finding availability: %s", e)
+        return None
+
+def find_availability_for_owners(owner_emails):
+    """Return {ownerEmail: {'free', 'occupied'}} for a page of lots."""
+    try:
+        return repository.find_availability_for_owners(owner_emails)
+    except Throttled:
+        raise
+    except Exception as e:
+        log.error("Error finding availability for owners: %s", e)
+        return {}
+
+def rebuild_slot_counters(owner_email):
+    """Recount a lot's counters from its slots, e.g. for data that predates them."""
+    return repository.rebuild_slot_counters(owner_email)
+
+BULK_SLOT_LIMIT = 5000
+
+def batch_save_slots(slots):
+    """Store new free slots in batches and yield a progress dict per batch."""
+    try:
+        yield from repository.batch_create_slots(slots)
+    finally:
+        for owner_email in {slot['ownerEmail'] for slot in slots}:
+            bump_listing_version(lot_version_key(owner_email))
+
+def lot_version_key(owner_email):
+    return f'lot:{owner_email}'
+
+def bump_listing_version(key):
+    try:
+        listing_versions.bump(key)
+    except Exception as e:
+        log.error("Error bumping listing version %s: %s", key, e)
+
+def get_listing_versions(keys):
+    """Return the version stamp of each key.
+
+    If the stamp store is unreachable every key gets a one-off stamp, so
+    nothing cached can match and pages render from storage.
+    """
+    try:
+        return listing_versions.get_many(keys)
+    except Exception as e:
+        log.error("Error reading listing versions: %s", e)
+        return [uuid.uuid4().hex for _ in keys]
+
+def get_fragment(key):
+    try:
+        return fragment_cache.get(key)
+    except Exception as e:
+        log.error("Error reading fragment cache: %s", e)
+        return None
+
+def set_fragment(key, value):
+    try:
+        fragment_cache.set(key, value)
+    except Exception as e:
+        log.error("Error writing fragment cache: %s", e)
+
+def listing_etag(*parts):
+    digest = hashlib.sha1(json.dumps([LISTING_RELEASE, *parts]).encode()).hexdigest()
+    return digest[:24]
+
+def listing_response(etag, body=None):
+    """Return body, or a 304 if the client already holds etag."""
+    response = make_response(body) if body is not None else Response(status=304)
+    response.set_etag(etag, weak=True)
+    # Behind a login, and must be revalidated on every view
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def take_rate_limit_token(scope, limiter, key):
+    """Take a token from key's bucket; return a 429 response if it is empty."""
+    wait = limiter.take(key)
+    if not wait:
+        rate_limit_decisions.inc(scope, 'admitted')
         return None
+    rate_limit_decisions.inc(scope, 'limited')
+    log.info("Rate limited %s %s for %.2fs", scope, key, wait)
+    response = jsonify({
+        'status': 'error',
+        'message': 'Too many requests, please try again shortly',
+        'retryAfter': math.ceil(wait),
+    })
+    response.status_code = 429
+    response.headers['Retry-After'] = str(math.ceil(wait))
+    return response
+
+def admit_booking_request(email, slot_id):
+    """Return a 429 response if email or the slot's lot is over its rate, else None.
+
+    The user's bucket is checked first, so a client being refused neither
+    drains its lot's nor costs a read to find the lot. Limiter errors admit
+    the request.
+    """
+    if not RATE_LIMIT_ENABLED:
+        return None
+    try:
+        limited = take_rate_limit_token('user', user_limiter, email)
+        if limited:
+            return limited
+        # Slot metadata is cached, so keying by lot costs no extra read when warm
+        meta = repository.find_slot_meta(slot_id) if slot_id else None
+        if meta:
+            return take_rate_limit_token('lot', lot_limiter, meta['ownerEmail'])
+    except Exception as e:
+        log.error("Error checking rate limits: %s", e)
+    return None
+
+def publish_slot_change(slot):
+    # Push the new state of a slot to everyone watching its lot. The write
+    # has already happened, so a broker outage must not fail the request;
+    # watchers resync on their next page load.
+    try:
+        slot_events.publish(slot['ownerEmail'], {'id': slot['id'], 'status': slot.get('status')})
+    except Exception as e:
+        log.error("Error publishing slot change for %s: %s", slot.get('id'), e)
+
+def claim_slot(slot_id, email):
+    """Book a free slot for email.
+
+    The slot and the lot/floor counters change together, and the owner's
+    current tariff and name are stored on the booking so billing needs no
+    owner lookup. Returns the updated slot. Raises SlotConflict if the slot
+    is missing or already held by someone.
+    """
+    booking = {
+        'bookingDate': date.today().isoformat(),
+        'checkinTime': datetime.now().time().isoformat(),
+    }
+    # Both lookups are cached, so a warm booking is still one write
+    meta = repository.find_slot_meta(slot_id)
+    if not meta:
+        raise SlotConflict(None)
+    owner = find_owner_by_email(meta['ownerEmail'])
+    if owner:
+        booking['tariff'] = tariff_snapshot(owner)
+        booking['orgName'] = owner.get('orgName')
+    else:
+        log.warning("Booking slot %s without a tariff snapshot, owner %s not found", slot_id, meta['ownerEmail'])
+    slot = repository.claim_slot(slot_id, email, booking)
+    bump_listing_version(lot_version_key(meta['ownerEmail']))
+    return slot
+
+def release_slot(slot_id, email):
+    """Free a slot held by email.
+
+    Returns the slot as it was before the release, so the caller can bill
+    it. Raises SlotConflict if the slot is missing, not booked by email or
+    has incomplete booking details, and ReservationConflict(None) if
+    concurrent writers kept the release from settling.
+    """
+    slot = repository.release_slot(slot_id, email)
+    bump_listing_version(lot_version_key(slot['ownerEmail']))
+    return slot
+
+# Every booking and checkout is appended to the booking history. Set
+# HISTORY_TTL_DAYS to have entries expire that many days later; 0 keeps them.
+HISTORY_TTL_DAYS = int(os.environ.get('HISTORY_TTL_DAYS', '0'))
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 200
+HISTORY_FIELDS = ('floorNumber', 'bookingDate', 'checkinTime', 'holdUntil', 'tariff', 'orgName', 'overstayAt')
+
+def record_booking_event(event, slot, at=None, bill=None):
+    """Append a 'booked', 'checkout' or 'overstay' entry for a slot's
+    current booking and add it to the lot's dashboard rollups.
+
+    History must not fail the booking it records, so errors are logged.
+    """
+    at = at or datetime.now()
+    entry = {
+        'ownerEmail': slot['ownerEmail'],
+        'email': slot['status'],
+        'slotId': slot['id'],
+        'event': event,
+        'at': at.isoformat(timespec='microseconds'),
+        **{field: slot[field] for field in HISTORY_FIELDS if slot.get(field) is not None},
+    }
+    if bill is not None:
+        entry['bill'] = bill
+    if HISTORY_TTL_DAYS:
+        entry['expiresAt'] = int((at + timedelta(days=HISTORY_TTL_DAYS)).timestamp())
+    try:
+        repository.append_history(entry)
+    except Exception as e:
+        log.error("Error recording %s of slot %s: %s", event, slot['id'], e)
+    try:
+        deltas = rollups.entry_deltas(entry)
+        if deltas:
+            repository.add_rollups(entry['ownerEmail'], deltas, token=history_key(entry))
+    except Exception as e:
+        log.error("Error updating rollups for %s of slot %s: %s", event, slot['id'], e)
+    return entry
+
+def rollup_metrics_json(metrics):
+    return {
+        'occupiedMinutes': float(metrics['occupiedMinutes']),
+        'bookings': int(metrics['bookings']),
+        'revenue': str(metrics['revenue']),
+    }
+
+def backfill_rollups(owner_email, page_size=500):
+    """Recompute a lot's rollups from its booking history; return the row count."""
+    entries = []
+    cursor = None
+    while True:
+        page, cursor = repository.find_owner_history(owner_email, limit=page_size, cursor=cursor)
+        entries.extend(page)
+        if not cursor:
+            break
+    rows = rollups.backfill(entries)
+    repository.replace_rollups(owner_email, rows)
+    return len(rows)
+
+def parse_history_range(args):
+    """Return (start, end, limit, cursor) from history query args.
+
+    from and to are ISO dates or date-times; to is exclusive.
+    """
+    bounds = []
+    for name in ('from', 'to'):
+        value = args.get(name)
+        if value:
+            datetime.fromisoformat(value)  # raises ValueError
+        bounds.append(value or None)
+    limit = max(1, min(args.get('limit', HISTORY_PAGE_SIZE, type=int), HISTORY_MAX_PAGE_SIZE))
+    return bounds[0], bounds[1], limit, args.get('cursor')
+
+def history_json(entries):
+    return [{
+        'slotId': entry['slotId'],
+        'ownerEmail': entry['ownerEmail'],
+        'email': entry['email'],
+        'event': entry['event'],
+        'at': entry['at'],
+        'orgName': entry.get('orgName'),
+        'floorNumber': entry.get('floorNumber'),
+        'bookingDate': entry.get('bookingDate'),
+        'checkinTime': entry.get('checkinTime'),
+        'bill': str(entry['bill']) if entry.get('bill') is not None else None,
+    } for entry in entries]
+
+def parse_window(start, end, now=None):
+    """Return (start, end) of a reservation window as local ISO strings.
+
+    Raises ValueError with a message for the user if the window is
+    malformed, already over or longer than RESERVATION_MAX_HOURS.
+    """
+    try:
+        start_at = datetime.fromisoformat(start)
+        end_at = datetime.fromisoformat(end)
+    except (TypeError, ValueError):
+        raise ValueError('start and end must be date-times such as 2024-05-01T14:00')
+    if start_at.tzinfo or end_at.tzinfo:
+        raise ValueError('Times are local to the lot, without a UTC offset')
+    if end_at <= start_at:
+        raise ValueError('The window must end after it starts')
+    if end_at - start_at > timedelta(hours=RESERVATION_MAX_HOURS):
+        raise ValueError(f'Windows can be at most {RESERVATION_MAX_HOURS} hours long')
+    if end_at <= (now or datetime.now()):
+        raise ValueError('The window is already over')
+    return start_at.isoformat(timespec='seconds'), end_at.isoformat(timespec='seconds')
+
+def reserve_slot(slot_id, email, start, end):
+    """Reserve a slot for email over [start, end) and return the reservation.
+
+    Raises SlotConflict if the slot is missing or its current stay may run
+    into the window, and ReservationConflict if the window is taken.
+    """
+    meta = repository.find_slot_meta(slot_id)
+    if not meta:
+        raise SlotConflict(None)
+    return repository.create_reservation({
+        'slotId': slot_id,
+        'start': start,
+        'end': end,
+        'ownerEmail': meta['ownerEmail'],
+        'floorNumber': meta['floorNumber'],
+        'email': email,
+        'createdAt': datetime.now().isoformat(timespec='seconds'),
+    })
+
+def cancel_reservation(slot_id, start, email):
+    """Delete email's reservation; raises ReservationConflict if there is none."""
+    return repository.cancel_reservation(slot_id, start, email)
+
+def find_free_slots(owner_email, start, end):
+    """Return the lot's slots that are free for the whole of [start, end).
+
+    One read of the lot's slots and one range read of its reservation index,
+    however many bookings the lot has had.
+    """
+    reserved = {r['slotId'] for r in repository.find_owner_reservations(owner_email, start, end)}
+    return [slot for slot in repository.find_slots_by_owner_email(owner_email)
+            if slot['id'] not in reserved and not stay_blocks(slot, start)]
+
+def reservation_conflict_message(reservation):
+    if not reservation:
+        return 'The slot is busy, please try again'
+    return f"The slot is reserved from {reservation['start']} to {reservation['end']}"
+
+def booking_tariff(slot, owner=None):
+    """Return the Tariff a booking is billed under.
+
+    Bookings made before tariffs were snapshotted fall back to the owner's
+    current tariff.
+    """
+    return tariff_from_owner(slot.get('tariff') or owner)
+
+def bill_booking(slot, owner=None, now=None):
+    """Return the Decimal charge for a booked slot."""
+    return compute_charge(booking_tariff(slot, owner), booking_start(slot), now or datetime.now())
+
+def accrued_revenue(owner, slots, now=None):
+    """Return (total, count) of charges accrued so far by the booked slots."""
+    # Bookings made at the same rate are billed together in one batch
+    groups = {}
+    for slot in slots:
+        if not slot.get('status'):
+            continue
+        try:
+            start = booking_start(slot)
+        except (ValueError, TypeError):
+            log.warning("Skipping slot with invalid booking details: %s", slot.get('id'))
+            continue
+        tariff = slot.get('tariff') or owner
+        key = json.dumps(tariff_snapshot(tariff), sort_keys=True, default=str)
+        groups.setdefault(key, (tariff, []))[1].append(start)
+    total, count = Decimal('0.00'), 0
+    for tariff, starts in groups.values():
+        charges = accrued_charges(tariff_from_owner(tariff), starts, now or datetime.now())
+        total += sum(charges, Decimal('0.00'))
+        count += len(charges)
+    return total, count
+
+# Overstays are handled by `flask sweep-overstays`, a separate process (see
+# sweeper.py). A stay expires STAY_MAX_HOURS after check-in (0 means never),
+# or earlier if the slot's next reservation starts before that. Expired
+# stays are flagged with overstayAt, or with OVERSTAY_ACTION=release checked
+# out and billed as if the user had cancelled.
+OVERSTAY_ACTIONS = ('flag', 'release')
+OVERSTAY_ACTION = os.environ.get('OVERSTAY_ACTION', 'flag')
+STAY_MAX_HOURS = float(os.environ.get('STAY_MAX_HOURS', '24'))
+SWEEP_INTERVAL_SECONDS = float(os.environ.get('SWEEP_INTERVAL_SECONDS', '30'))
+SWEEP_PAGE_SIZE = 100  # lots per tick, one BatchGetItem of their counters
+SWEEP_SLOT_FIELDS = ['id', 'ownerEmail', 'floorNumber', 'status', 'bookingDate', 'checkinTime',
+                     'holdUntil', 'overstayAt']
+
+def reconcile_stays(heap, cursor=None):
+    """Add the open stays of one page of lots to heap; return the next page's cursor."""
+    owners, next_cursor = repository.find_owners_page(SWEEP_PAGE_SIZE, cursor, ['email'])
+    emails = [owner['email'] for owner in owners]
+    availability = repository.find_availability_for_owners(emails)
+    for email in emails:
+        if email in availability and not availability[email]['occupied']:
+            continue
+        slot_cursor = None
+        while True:
+            slots, slot_cursor = repository.find_slots_page(email, SLOTS_MAX_PAGE_SIZE, slot_cursor,
+                                                            fields=SWEEP_SLOT_FIELDS)
+            for slot in slots:
+                expiry = None
+                if slot.get('status') and not (slot.get('overstayAt') and OVERSTAY_ACTION == 'flag'):
+                    try:
+                        expiry = sweeper.stay_expiry(slot, STAY_MAX_HOURS)
+                    except (ValueError, TypeError):
+                        log.warning("Skipping slot with invalid booking details: %s", slot['id'])
+                if expiry is None:
+                    heap.discard(slot['id'])
+                else:
+                    heap.add(slot['id'], expiry, stay_token(slot))
+            if not slot_cursor:
+                break
+    return next_cursor
+
+def settle_overstays(heap, now=None):
+    """Flag or release every stay in heap that expired by now; return how many."""
+    now = now or datetime.now()
+    settled = 0
+    for slot_id, token in heap.pop_due(now):
+        # Act on the slot as it is now: the stay may have ended or been
+        # rebooked since it was seen, and cancelling the reservation it was
+        # held for moves holdUntil, so the expiry is worked out again
+        slot = repository.find_slot_by_id(slot_id)
+        if not slot or stay_token(slot) != token:
+            continue
+        try:
+            expiry = sweeper.stay_expiry(slot, STAY_MAX_HOURS)
+            owner = None if slot.get('tariff') else find_owner_by_email(slot['ownerEmail'])
+            accrued = bill_booking(slot, owner, now)
+        except (BillingError, ValueError, TypeError) as e:
+            log.warning("Skipping overstay of slot %s: %s", slot_id, e)
+            continue
+        if expiry is None:
+            continue
+        if expiry > now:
+            heap.add(slot_id, expiry, token)
+            continue
+        if OVERSTAY_ACTION == 'release':
+            try:
+                slot = release_slot(slot_id, slot['status'])
+            except (SlotConflict, ReservationConflict):
+                continue
+            publish_slot_change({**slot, 'status': None})
+            log.info("Released overstayed slot %s", slot_id, extra={'data': {'slot': slot, 'bill': accrued}})
+            record_booking_event('overstay', slot, at=now, bill=accrued)
+            record_booking_event('checkout', slot, at=now, bill=accrued)
+        else:
+            flagged_at = now.isoformat(timespec='seconds')
+            if not repository.flag_overstay(slot, flagged_at):
+                continue
+            log.info("Flagged overstayed slot %s", slot_id, extra={'data': {'slot': slot, 'accrued': accrued}})
+            record_booking_event('overstay', {**slot, 'overstayAt': flagged_at}, at=now, bill=accrued)
+        settled += 1
+    return settled
+
+@app.errorhandler(Throttled)
+def storage_throttled(e):
+    # Still throttled after the storage layer's retries: the table is out of
+    # capacity, so say so rather than reporting a missing slot or an error
+    log.warning("Storage throttled: %s", e)
+    response = jsonify({'status': 'error', 'message': 'The service is busy, please try again shortly'})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(max(1, math.ceil(e.retry_after)))
+    return response
 
 # Routes
 @app.route('/')
@@ -338,14 +829,17 @@ def owner_register():
             org_type = request.form.get('orgType', '').lower()
             org_name = request.form.get('orgName')
             cost_per_hour = request.form.get('costPerHour', '0')
+            grace_minutes = request.form.get('graceMinutes') or '0'
+            lat = request.form.get('lat') or None
+            lon = request.form.get('lon') or None
             
             # Debug print
-            print("Registration Data:", {
+            log.debug("Registration Data", extra={'data': {
                 'email': email,
                 'org_type': org_type,
                 'org_name': org_name,
                 'cost_per_hour': cost_per_hour
-            })
+            }})
             
             # Input validation
             if not all([email, password, org_type, org_name, cost_per_hour]):
@@ -356,6 +850,19 @@ def owner_register():
             except ValueError:
                 return render_template('ownerreg.html', status='Invalid cost per hour value!')
             
+            if not grace_minutes.isdigit():
+                return render_template('ownerreg.html', status='Grace period must be a whole number of minutes!')
+            
+            if (lat is None) != (lon is None):
+                return render_template('ownerreg.html', status='Enter both latitude and longitude, or neither!')
+            if lat is not None:
+                try:
+                    lat, lon = float(lat), float(lon)
+                except ValueError:
+                    return render_template('ownerreg.html', status='Invalid location!')
+                if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+                    return render_template('ownerreg.html', status='Invalid location!')
+            
             # Validate organization type
             valid_org_types = ['mall', 'restaurant', 'hospital']
             if org_type not in valid_org_types:
@@ -375,19 +882,24 @@ def owner_register():
                 'password': password,
                 'orgType': org_type,
                 'orgName': org_name,
-                'costPerHour': cost_per_hour
+                'costPerHour': cost_per_hour,
+                'graceMinutes': int(grace_minutes),
+                'lat': lat,
+                'lon': lon
             }
             
             # Debug print
-            print("Saving owner data:", owner_data)
+            log.debug("Saving owner data", extra={'data': {'owner': owner_data}})
             
             # Save owner data
             save_owner(owner_data)
-            print("Owner data saved successfully")
+            log.info("Owner data saved successfully")
             return redirect(url_for('owner_login'))
             
+        except Throttled:
+            raise
         except Exception as e:
-            print("Error in owner registration:", str(e))
+            log.error("Error in owner registration: %s", e)
             return render_template('ownerreg.html', status='Error registering owner. Please try again.')
     
     return render_template('ownerreg.html')
@@ -399,16 +911,13 @@ def owner_login():
         password = request.form.get('password')
         
         # Debug print
-        print("Login attempt for email:", email)
+        log.debug("Login attempt for email: %s", email)
         
-        owner = find_owner_by_email(email)
-        
-        # Debug print
-        print("Found owner data:", owner)
+        owner = find_owner_login(email)
         
         if owner and owner.get('password') == password:
             session['logged_in_email'] = email
-            print("Login successful for email:", email)
+            log.info("Login successful for email: %s", email)
             return redirect(url_for('owner_dashboard'))
         else:
             error_message = 'Invalid email or password!'
@@ -416,7 +925,7 @@ def owner_login():
                 error_message = 'Email not found!'
             elif owner.get('password') != password:
                 error_message = 'Incorrect password!'
-            print("Login failed:", error_message)
+            log.info("Login failed: %s", error_message)
             return render_template('ownerlogin.html', status=error_message)
     
     return render_template('ownerlogin.html')
@@ -458,9 +967,87 @@ def add_slot_details():
         'status': None
     }
     
-    save_slot(slot_data)
+    create_slot(slot_data)
     return redirect(url_for('owner_dashboard'))
 
+def parse_slot_ranges(form):
+    # floorFrom..floorTo x slotFrom..slotTo, both inclusive
+    try:
+        floor_from = int(form.get('floorFrom', ''))
+        floor_to = int(form.get('floorTo', ''))
+        slot_from = int(form.get('slotFrom', ''))
+        slot_to = int(form.get('slotTo', ''))
+    except ValueError:
+        raise ValueError('Floor and slot ranges must be whole numbers')
+    if floor_from > floor_to or slot_from > slot_to:
+        raise ValueError('Range start must not be greater than range end')
+    count = (floor_to - floor_from + 1) * (slot_to - slot_from + 1)
+    if count > BULK_SLOT_LIMIT:
+        raise ValueError(f'At most {BULK_SLOT_LIMIT} slots can be added at once')
+    return [(str(floor), str(slot))
+            for floor in range(floor_from, floor_to + 1)
+            for slot in range(slot_from, slot_to + 1)]
+
+def parse_slot_csv(upload):
+    # Accepts a floorNumber,slotNumber header or two bare columns
+    text = upload.read().decode('utf-8-sig')
+    rows = [row for row in csv.reader(io.StringIO(text)) if any(cell.strip() for cell in row)]
+    if rows and [cell.strip() for cell in rows[0][:2]] == ['floorNumber', 'slotNumber']:
+        rows = rows[1:]
+    pairs = []
+    for line_number, row in enumerate(rows, start=1):
+        if len(row) < 2 or not row[0].strip() or not row[1].strip():
+            raise ValueError(f'Row {line_number} needs a floor number and a slot number')
+        pairs.append((row[0].strip(), row[1].strip()))
+    if len(pairs) > BULK_SLOT_LIMIT:
+        raise ValueError(f'At most {BULK_SLOT_LIMIT} slots can be added at once')
+    return pairs
+
+@app.route('/addSlotsBulk', methods=['POST'])
+def add_slots_bulk():
+    if 'logged_in_email' not in session:
+        return jsonify({'status': 'error', 'message': 'User not logged in'}), 401
+
+    owner_email = session['logged_in_email']
+    upload = request.files.get('slotsCsv')
+    try:
+        if upload and upload.filename:
+            pairs = parse_slot_csv(upload)
+        else:
+            pairs = parse_slot_ranges(request.form)
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    pairs = list(dict.fromkeys(pairs))
+    if not pairs:
+        return jsonify({'status': 'error', 'message': 'No slots to add'}), 400
+
+    slots = [{
+        'id': str(uuid.uuid4()),
+        'ownerEmail': owner_email,
+        'slotNumber': slot_number,
+        'floorNumber': floor_number,
+        'bookingDate': None,
+        'checkinTime': None,
+        'status': None
+    } for floor_number, slot_number in pairs]
+
+    def generate():
+        written = failed = 0
+        for progress in batch_save_slots(slots):
+            written += progress['written']
+            failed += progress['failed']
+            yield json.dumps(progress) + '\n'
+        yield json.dumps({
+            'status': 'success' if not failed else 'partial',
+            'total': len(slots),
+            'written': written,
+            'failed': failed
+        }) + '\n'
+
+    # One JSON line per batch so the page can show progress as it goes
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 @app.route('/ownerslots')
 def owner_slots():
     if 'logged_in_email' not in session:
@@ -476,162 +1063,441 @@ def get_all_owners():
     if 'logged_in_email' not in session:
         return redirect(url_for('login'))
     
-    owners = find_all_owners()
-    return render_template('bookslot.html', owners=owners)
+    limit = request.args.get('limit', OWNERS_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, OWNERS_MAX_PAGE_SIZE))
+    cursor = request.args.get('cursor')
+    owners_version, = get_listing_versions(['owners'])
+    page_key = f'{LISTING_RELEASE}:owners-page:{owners_version}:{limit}:{cursor or ""}'
+    page = get_fragment(page_key)
+    if page is None:
+        try:
+            owners, next_cursor = find_owners_page(limit, cursor)
+        except ValueError:
+            # Stale or tampered cursor, start again from the first page
+            owners, next_cursor = find_owners_page(limit)
+        page = {'owners': owners, 'next_cursor': next_cursor}
+        if owners:
+            set_fragment(page_key, page)
+
+    # Free counts on the cards change with bookings in each lot
+    emails = [owner['email'] for owner in page['owners']]
+    etag = listing_etag('owners', owners_version, limit, cursor, get_listing_versions(
+        [lot_version_key(email) for email in emails]))
+    if request.if_none_match.contains_weak(etag):
+        return listing_response(etag)
+
+    cards = get_fragment(f'owner-cards:{etag}')
+    if cards is None:
+        availability = find_availability_for_owners(emails)
+        cards = render_template('_owner_cards.html', owners=page['owners'], availability=availability)
+        if availability or not emails:
+            set_fragment(f'owner-cards:{etag}', cards)
+    return listing_response(etag, render_template('bookslot.html', owner_cards=Markup(cards),
+                                                  next_cursor=page['next_cursor'], limit=limit))
+
+@app.route('/api/lots/nearby')
+def nearby_lots():
+    if 'logged_in_email' not in session:
+        return jsonify({'status': 'error', 'message': 'User not logged in'}), 401
+
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    if lat is None or lon is None or not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return jsonify({'status': 'error', 'message': 'Valid lat and lon are required'}), 400
+    limit = max(1, min(request.args.get('limit', NEARBY_DEFAULT_LIMIT, type=int), NEARBY_MAX_LIMIT))
+    max_price = request.args.get('maxPrice')
+    try:
+        max_price = Decimal(max_price) if max_price else None
+    except ArithmeticError:
+        return jsonify({'status': 'error', 'message': 'Invalid maxPrice'}), 400
+
+    try:
+        lots = find_nearby_lots(
+            lat, lon, limit,
+            org_type=(request.args.get('orgType') or '').lower() or None,
+            max_price=max_price,
+            max_distance_km=request.args.get('maxDistanceKm', type=float),
+            free_only=request.args.get('available', '1') != '0',
+        )
+    except Throttled:
+        raise
+    except Exception as e:
+        log.error("Error finding nearby lots: %s", e)
+        return jsonify({'status': 'error', 'message': 'Could not search lots'}), 500
+
+    return jsonify({
+        'status': 'success',
+        'lots': [{
+            'email': owner['email'],
+            'orgName': owner.get('orgName'),
+            'orgType': owner.get('orgType'),
+            'costPerHour': str(owner['costPerHour']) if owner.get('costPerHour') is not None else None,
+            'distanceKm': round(distance, 3),
+            'free': (free or {}).get('free'),
+            'url': url_for('get_owner_slots', owner_email=owner['email'])
+        } for distance, owner, free in lots]
+    })
+
+@app.route('/api/availability/<owner_email>')
+def get_availability(owner_email):
+    if 'logged_in_email' not in session:
+        return jsonify({'status': 'error', 'message': 'User not logged in'}), 401
+
+    summary = find_availability(owner_email)
+    if summary is None:
+        return jsonify({'status': 'error', 'message': 'Could not load availability'}), 500
+    return jsonify({'status': 'success', **summary})
+
+@app.route('/api/slots/<owner_email>')
+def api_owner_slots(owner_email):
+    if 'logged_in_email' not in session:
+        return jsonify({'status': 'error', 'message': 'User not logged in'}), 401
+
+    logged_in_email = session['logged_in_email']
+    limit = request.args.get('limit', SLOTS_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, SLOTS_MAX_PAGE_SIZE))
+    try:
+        slots, next_cursor = find_slots_page(
+            owner_email,
+            limit=limit,
+            cursor=request.args.get('cursor'),
+            floor_number=request.args.get('floor')
+        )
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Invalid cursor'}), 400
+    except Throttled:
+        raise
+    except Exception as e:
+        log.error("Error finding slots page: %s", e)
+        return jsonify({'status': 'error', 'message': 'Could not load slots'}), 500
+
+    return jsonify({
+        'status': 'success',
+        'slots': [{
+            'id': slot['id'],
+            'slotNumber': slot.get('slotNumber'),
+            'floorNumber': slot.get('floorNumber'),
+            'booked': bool(slot.get('status')),
+            'mine': slot.get('status') == logged_in_email
+        } for slot in slots],
+        'nextCursor': next_cursor
+    })
+
+@app.route('/api/slots/<owner_email>/free')
+def api_free_slots(owner_email):
+    if 'logged_in_email' not in session:
+        return jsonify({'status': 'error', 'message': 'User not logged in'}), 401
+
+    try:
+        start, end = parse_window(request.args.get('start'), request.args.get('end'))
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    try:
+        slots = find_free_slots(owner_email, start, end)
+    except Throttled:
+        raise
+    except Exception as e:
+        log.error("Error finding free slots: %s", e)
+        return jsonify({'status': 'error', 'message': 'Could not load slots'}), 500
+
+    return jsonify({
+        'status': 'success',
+        'start': start,
+        'end': end,
+        'slots': [{
+            'id': slot['id'],
+            'slotNumber': slot.get('slotNumber'),
+            'floorNumber': slot.get('floorNumber')
+        } for slot in slots]
+    })
 
 @app.route('/slots/<owner_email>')
 def get_owner_slots(owner_email):
     if 'logged_in_email' not in session:
         return redirect(url_for('login'))
     
-    slots = find_slots_by_owner_email(owner_email)
-    return render_template('viewSlots.html', slots=slots, logged_in_email=session['logged_in_email'])
+    logged_in_email = session['logged_in_email']
+    lot_version, = get_listing_versions([lot_version_key(owner_email)])
+    holders_key = f'{LISTING_RELEASE}:lot-holders:{owner_email}:{lot_version}'
+    holders = get_fragment(holders_key)
+    slots = None
+    if holders is None:
+        slots = load_lot_slots(owner_email)
+        holders = {}
+        for slot in slots or []:
+            if slot.get('status'):
+                holders.setdefault(slot['status'], []).append(slot['id'])
+        if slots is not None:
+            set_fragment(holders_key, holders)
+
+    # The grid only differs between users by which bookings are theirs, so
+    # everyone without a booking here shares one cached grid
+    mine = sorted(holders.get(logged_in_email, []))
+    etag = listing_etag('slots', owner_email, lot_version, mine)
+    if request.if_none_match.contains_weak(etag):
+        return listing_response(etag)
+
+    grid = get_fragment(f'slot-grid:{etag}')
+    if grid is None:
+        if slots is None:
+            slots = load_lot_slots(owner_email)
+        grid = render_template('_slot_grid.html', slots=slots or [], mine=set(mine))
+        if slots is not None:
+            set_fragment(f'slot-grid:{etag}', grid)
+    return listing_response(etag, render_template('viewSlots.html', slot_grid=Markup(grid),
+                                                  owner_email=owner_email))
+
+def load_lot_slots(owner_email):
+    """Return every slot of a lot, or None if storage failed (so it isn't cached)."""
+    try:
+        return repository.find_slots_by_owner_email(owner_email)
+    except Throttled:
+        raise
+    except Exception as e:
+        log.error("Error finding slots by owner email: %s", e)
+        return None
+
+@app.route('/slots/<owner_email>/events')
+def owner_slot_events(owner_email):
+    if 'logged_in_email' not in session:
+        return jsonify({'status': 'error', 'message': 'User not logged in'}), 401
+
+    logged_in_email = session['logged_in_email']
+    subscription = slot_events.subscribe(owner_email)
+
+    def stream():
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    event = subscription.get(timeout=SSE_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                # Subscribers only learn whether a slot is theirs, not who holds it
+                delta = {
+                    'id': event['id'],
+                    'booked': bool(event.get('status')),
+                    'mine': event.get('status') == logged_in_email
+                }
+                yield f"event: slot\ndata: {json.dumps(delta)}\n\n"
+        finally:
+            slot_events.unsubscribe(owner_email, subscription)
+
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/book', methods=['POST'])
 def book_slot():
     if 'logged_in_email' not in session:
-        print("User not logged in")
+        log.info("User not logged in")
         return jsonify({'status': 'error', 'message': 'User not logged in'}), 401
     
     logged_in_email = session.get('logged_in_email')
-    print(f"Booking request from user: {logged_in_email}")
+    log.debug("Booking request from user: %s", logged_in_email)
     
     slot_id = request.form.get('slotId')
-    print(f"Slot ID to book: {slot_id}")
+    log.debug("Slot ID to book: %s", slot_id)
     
-    slot = find_slot_by_id(slot_id)
-    print(f"Found slot: {slot}")
-    
-    if not slot:
-        return jsonify({'status': 'error', 'message': 'Slot not found'}), 404
+    if not slot_id:
+        return jsonify({'status': 'error', 'message': 'Slot ID is required'}), 400
     
-    if slot.get('status'):
-        print(f"Slot already booked by: {slot.get('status')}")
+    limited = admit_booking_request(logged_in_email, slot_id)
+    if limited:
+        return limited
+
+    try:
+        slot = claim_slot(slot_id, logged_in_email)
+    except SlotConflict as e:
+        if not e.slot:
+            return jsonify({'status': 'error', 'message': 'Slot not found'}), 404
+        log.debug("Slot already booked: %s", slot_id)
         return jsonify({'status': 'error', 'message': 'Slot is already booked'}), 409
+    except ReservationConflict as e:
+        log.debug("Slot reserved by someone else: %s", slot_id)
+        return jsonify({'status': 'error', 'message': reservation_conflict_message(e.reservation)}), 409
     
-    # Update the slot details
-    today = date.today().isoformat()
-    current_time = datetime.now().time().isoformat()
-    
-    slot['bookingDate'] = today
-    slot['checkinTime'] = current_time
-    slot['status'] = logged_in_email
+    log.info("Slot booked successfully", extra={'data': {'slot': slot}})
+    publish_slot_change(slot)
+    record_booking_event('booked', slot)
     
-    print(f"Updating slot with data: {slot}")
-    save_slot(slot)
-    print("Slot booked successfully")
-    
-    return jsonify({'status': 'success', 'message': 'Slot booked successfully'})
+    # holdUntil is when the next reservation of this slot starts, if any
+    return jsonify({'status': 'success', 'message': 'Slot booked successfully',
+                    'holdUntil': slot.get('holdUntil')})
+
+@app.route('/reserve', methods=['POST'])
+def reserve():
+    if 'logged_in_email' not in session:
+        return jsonify({'status': 'error', 'message': 'User not logged in'}), 401
+
+    slot_id = request.form.get('slotId')
+    if not slot_id:
+        return jsonify({'status': 'error', 'message': 'Slot ID is required'}), 400
+    limited = admit_booking_request(session['logged_in_email'], slot_id)
+    if limited:
+        return limited
+    try:
+        start, end = parse_window(request.form.get('start'), request.form.get('end'))
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    if start < datetime.now().replace(second=0, microsecond=0).isoformat(timespec='seconds'):
+        return jsonify({'status': 'error', 'message': 'Reservations cannot start in the past'}), 400
+
+    try:
+        reservation = reserve_slot(slot_id, session['logged_in_email'], start, end)
+    except SlotConflict as e:
+        if not e.slot:
+            return jsonify({'status': 'error', 'message': 'Slot not found'}), 404
+        return jsonify({'status': 'error', 'message': 'The slot is in use and may still be then'}), 409
+    except ReservationConflict as e:
+        return jsonify({'status': 'error', 'message': reservation_conflict_message(e.reservation)}), 409
+
+    log.info("Slot reserved", extra={'data': {'reservation': reservation}})
+    return jsonify({'status': 'success', 'slotId': slot_id, 'start': start, 'end': end})
+
+@app.route('/reservations/cancel', methods=['POST'])
+def cancel_reservation_route():
+    if 'logged_in_email' not in session:
+        return jsonify({'status': 'error', 'message': 'User not logged in'}), 401
+
+    slot_id = request.form.get('slotId')
+    start = request.form.get('start')
+    if not slot_id or not start:
+        return jsonify({'status': 'error', 'message': 'Slot ID and start are required'}), 400
+    try:
+        start = datetime.fromisoformat(start).isoformat(timespec='seconds')
+        cancel_reservation(slot_id, start, session['logged_in_email'])
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Invalid start time'}), 400
+    except ReservationConflict as e:
+        if not e.reservation:
+            return jsonify({'status': 'error', 'message': 'Reservation not found'}), 404
+        return jsonify({'status': 'error', 'message': 'You are not authorized to cancel this reservation'}), 403
+    return jsonify({'status': 'success', 'message': 'Reservation cancelled'})
 
 @app.route('/cancel', methods=['POST'])
 def cancel_slot():
     if 'logged_in_email' not in session:
-        print("User not logged in")
+        log.info("User not logged in")
         return jsonify({
             'status': 'error',
             'message': 'User not logged in'
         }), 401
     
     logged_in_email = session.get('logged_in_email')
-    print(f"Cancel request from user: {logged_in_email}")
+    log.debug("Cancel request from user: %s", logged_in_email)
     
     slot_id = request.form.get('slotId')
-    print(f"Slot ID to cancel: {slot_id}")
+    log.debug("Slot ID to cancel: %s", slot_id)
     
     if not slot_id:
-        print("No slot ID provided")
+        log.info("No slot ID provided")
         return jsonify({
             'status': 'error',
             'message': 'Slot ID is required'
         }), 400
     
+    limited = admit_booking_request(logged_in_email, slot_id)
+    if limited:
+        return limited
+    
     try:
-        slot = find_slot_by_id(slot_id)
-        print(f"Found slot: {slot}")
-        
-        if not slot:
-            print("Slot not found")
-            return jsonify({
-                'status': 'error',
-                'message': 'Slot not found'
-            }), 404
+        # Bookings made before tariffs were snapshotted bill at the owner's
+        # current tariff, so make sure it can be found before freeing the
+        # slot. Both lookups are cached.
+        meta = repository.find_slot_meta(slot_id)
+        owner = find_owner_by_email(meta['ownerEmail']) if meta else None
+        if meta and not owner:
+            current = find_slot_by_id(slot_id)
+            if current and current.get('status') == logged_in_email and not current.get('tariff'):
+                log.warning("Owner not found for email: %s", meta['ownerEmail'])
+                return jsonify({
+                    'status': 'error',
+                    'message': 'Owner not found'
+                }), 404
 
-        slot_status = slot.get('status')
-        print(f"Comparing slot status: '{slot_status}' with logged in email: '{logged_in_email}'")
-        
-        if not slot_status:
-            print("Slot is not booked")
+        # release_slot is the ownership check, and the pre-release item it
+        # returns is what we bill against.
+        try:
+            slot = release_slot(slot_id, logged_in_email)
+        except SlotConflict as e:
+            slot = e.slot
+            if not slot:
+                log.info("Slot not found")
+                return jsonify({
+                    'status': 'error',
+                    'message': 'Slot not found'
+                }), 404
+
+            slot_status = slot.get('status')
+            log.debug("Comparing slot status: '%s' with logged in email: '%s'", slot_status, logged_in_email)
+
+            if not slot_status:
+                log.info("Slot is not booked")
+                return jsonify({
+                    'status': 'error',
+                    'message': 'This slot is not booked'
+                }), 400
+
+            if slot_status.strip() != logged_in_email.strip():
+                log.warning("Authorization failed. Slot booked by '%s'", slot_status)
+                return jsonify({
+                    'status': 'error',
+                    'message': f"You are not authorized to cancel this booking. The slot was booked by {slot_status}"
+                }), 403
+
+            log.info("Incomplete booking details")
             return jsonify({
                 'status': 'error',
-                'message': 'This slot is not booked'
+                'message': 'Booking details are incomplete'
             }), 400
-            
-        if slot_status.strip() != logged_in_email.strip():
-            print(f"Authorization failed. Slot booked by '{slot_status}'")
+        except ReservationConflict as e:
+            log.debug("Release of slot %s kept conflicting", slot_id)
             return jsonify({
                 'status': 'error',
-                'message': f"You are not authorized to cancel this booking. The slot was booked by {slot_status}"
-            }), 403
+                'message': reservation_conflict_message(e.reservation)
+            }), 409
 
-        owner = find_owner_by_email(slot.get('ownerEmail'))
-        if not owner:
-            print(f"Owner not found for email: {slot.get('ownerEmail')}")
-            return jsonify({
-                'status': 'error',
-                'message': 'Owner not found'
-            }), 404
+        log.info("Slot reset successfully", extra={'data': {'slot': slot}})
+        publish_slot_change({**slot, 'status': None})
 
-        if slot.get('bookingDate') and slot.get('checkinTime'):
-            try:
-                booking_time = datetime.combine(
-                    date.fromisoformat(slot.get('bookingDate')),
-                    time.fromisoformat(slot.get('checkinTime'))
-                )
-                current_time = datetime.now()
-                
-                # Calculate the duration in hours
-                duration_in_hours = (current_time - booking_time).total_seconds() / 3600
-                print(f"Duration: {duration_in_hours:.2f} hours")
-                
-                if duration_in_hours < 0:
-                    print("Invalid duration (negative time)")
-                    return jsonify({
-                        'status': 'error',
-                        'message': 'Invalid booking time'
-                    }), 400
-                
-                # Calculate the bill amount
-                cost_per_hour = float(owner.get('costPerHour', 0))
-                bill_amount = cost_per_hour * duration_in_hours
-                print(f"Bill amount: ₹{bill_amount:.2f} (₹{cost_per_hour}/hour)")
-                
-                # Reset the slot details
-                slot['bookingDate'] = None
-                slot['checkinTime'] = None
-                slot['status'] = None
-                
-                print(f"Resetting slot with data: {slot}")
-                save_slot(slot)
-                print("Slot reset successfully")
-                
-                return jsonify({
-                    'status': 'success',
-                    'message': f'Booking cancelled successfully. Bill Amount: ₹{bill_amount:.2f}'
-                })
-            except (ValueError, TypeError) as e:
-                print(f"Error calculating bill: {str(e)}")
+        checkout_at = datetime.now()
+        bill_amount = None
+        try:
+            if not slot.get('tariff') and not owner:
+                # The owner went missing between the check and the release
+                log.warning("Owner not found for email: %s", slot.get('ownerEmail'))
                 return jsonify({
                     'status': 'error',
-                    'message': 'Error calculating bill: Invalid date/time format'
-                }), 400
-        else:
-            print("Incomplete booking details")
+                    'message': 'Owner not found'
+                }), 404
+            bill_amount = bill_booking(slot, owner, checkout_at)
+            log.debug("Bill amount: ₹%s", bill_amount)
+            
+            return jsonify({
+                'status': 'success',
+                'message': f'Booking cancelled successfully. Bill Amount: ₹{bill_amount}',
+                'orgName': slot.get('orgName') or (owner or {}).get('orgName')
+            })
+        except BillingError as e:
+            log.info("Invalid duration (negative time)")
             return jsonify({
                 'status': 'error',
-                'message': 'Booking details are incomplete'
+                'message': str(e)
             }), 400
+        except (ValueError, TypeError) as e:
+            log.error("Error calculating bill: %s", e)
+            return jsonify({
+                'status': 'error',
+                'message': 'Error calculating bill: Invalid date/time format'
+            }), 400
+        finally:
+            # The slot is free either way, so the stay is recorded even unbilled
+            record_booking_event('checkout', slot, at=checkout_at, bill=bill_amount)
+    except Throttled:
+        raise
     except Exception as e:
-        print(f"Error in cancel_slot: {str(e)}")
+        log.error("Error in cancel_slot: %s", e)
         return jsonify({
             'status': 'error',
             'message': 'An error occurred while cancelling the slot'
@@ -640,106 +1506,303 @@ def cancel_slot():
 @app.route('/get_bill', methods=['POST'])
 def get_bill():
     if 'logged_in_email' not in session:
-        print("User not logged in")
+        log.info("User not logged in")
         return jsonify({
             'status': 'error',
             'message': 'User not logged in'
         }), 401
     
     logged_in_email = session.get('logged_in_email')
-    print(f"Bill request from user: {logged_in_email}")
+    log.debug("Bill request from user: %s", logged_in_email)
     
     slot_id = request.form.get('slotId')
-    print(f"Slot ID for bill: {slot_id}")
+    log.debug("Slot ID for bill: %s", slot_id)
+    
+    limited = admit_booking_request(logged_in_email, slot_id)
+    if limited:
+        return limited
     
     try:
         slot = find_slot_by_id(slot_id)
-        print(f"Found slot: {slot}")
+        log.debug("Found slot", extra={'data': {'slot': slot}})
         
         if not slot:
-            print("Slot not found")
+            log.info("Slot not found")
             return jsonify({
                 'status': 'error',
                 'message': 'Slot not found'
             }), 404
 
         slot_status = slot.get('status')
-        print(f"Comparing slot status: '{slot_status}' with logged in email: '{logged_in_email}'")
+        log.debug("Comparing slot status: '%s' with logged in email: '%s'", slot_status, logged_in_email)
         
         if not slot_status:
-            print("Slot is not booked")
+            log.info("Slot is not booked")
             return jsonify({
                 'status': 'error',
                 'message': 'This slot is not booked'
             }), 400
             
         if slot_status.strip() != logged_in_email.strip():
-            print(f"Authorization failed. Slot booked by '{slot_status}'")
+            log.warning("Authorization failed. Slot booked by '%s'", slot_status)
             return jsonify({
                 'status': 'error',
                 'message': f"You are not authorized to view bill for this booking"
             }), 403
 
-        owner = find_owner_by_email(slot.get('ownerEmail'))
-        if not owner:
-            print(f"Owner not found for email: {slot.get('ownerEmail')}")
-            return jsonify({
-                'status': 'error',
-                'message': 'Owner not found'
-            }), 404
+        owner = None
+        if not slot.get('tariff'):
+            owner = find_owner_by_email(slot.get('ownerEmail'))
+            if not owner:
+                log.warning("Owner not found for email: %s", slot.get('ownerEmail'))
+                return jsonify({
+                    'status': 'error',
+                    'message': 'Owner not found'
+                }), 404
 
         if slot.get('bookingDate') and slot.get('checkinTime'):
             try:
-                booking_time = datetime.combine(
-                    date.fromisoformat(slot.get('bookingDate')),
-                    time.fromisoformat(slot.get('checkinTime'))
-                )
-                current_time = datetime.now()
-                
-                # Calculate the duration in hours
-                duration_in_hours = (current_time - booking_time).total_seconds() / 3600
-                print(f"Duration: {duration_in_hours:.2f} hours")
-                
-                if duration_in_hours < 0:
-                    print("Invalid duration (negative time)")
-                    return jsonify({
-                        'status': 'error',
-                        'message': 'Invalid booking time'
-                    }), 400
-                
-                # Calculate the bill amount
-                cost_per_hour = float(owner.get('costPerHour', 0))
-                bill_amount = cost_per_hour * duration_in_hours
-                print(f"Bill amount: ₹{bill_amount:.2f} (₹{cost_per_hour}/hour)")
+                bill_amount = bill_booking(slot, owner)
+                log.debug("Bill amount: ₹%s", bill_amount)
                 
                 return jsonify({
                     'status': 'success',
-                    'message': f'Bill Amount: ₹{bill_amount:.2f}',
-                    'amount': bill_amount
+                    'message': f'Bill Amount: ₹{bill_amount}',
+                    'amount': float(bill_amount),
+                    'orgName': slot.get('orgName') or (owner or {}).get('orgName')
                 })
+            except BillingError as e:
+                log.info("Invalid duration (negative time)")
+                return jsonify({
+                    'status': 'error',
+                    'message': str(e)
+                }), 400
             except (ValueError, TypeError) as e:
-                print(f"Error calculating bill: {str(e)}")
+                log.error("Error calculating bill: %s", e)
                 return jsonify({
                     'status': 'error',
                     'message': 'Error calculating bill: Invalid date/time format'
                 }), 400
         else:
-            print("Incomplete booking details")
+            log.info("Incomplete booking details")
             return jsonify({
                 'status': 'error',
                 'message': 'Booking details are incomplete'
             }), 400
+    except Throttled:
+        raise
     except Exception as e:
-        print(f"Error in get_bill: {str(e)}")
+        log.error("Error in get_bill: %s", e)
         return jsonify({
             'status': 'error',
             'message': 'An error occurred while calculating the bill'
         }), 500
 
+@app.route('/api/revenue')
+def owner_revenue():
+    if 'logged_in_email' not in session:
+        return jsonify({'status': 'error', 'message': 'User not logged in'}), 401
+
+    owner = find_owner_by_email(session['logged_in_email'])
+    if not owner:
+        return jsonify({'status': 'error', 'message': 'Only lot owners can view revenue'}), 403
+
+    total, active = accrued_revenue(owner, find_slots_by_owner_email(owner['email']))
+    return jsonify({
+        'status': 'success',
+        'activeBookings': active,
+        'accruedRevenue': str(total)
+    })
+
+@app.route('/api/history')
+def booking_history():
+    if 'logged_in_email' not in session:
+        return jsonify({'status': 'error', 'message': 'User not logged in'}), 401
+
+    try:
+        start, end, limit, cursor = parse_history_range(request.args)
+        entries, next_cursor = repository.find_user_history(session['logged_in_email'], start, end, limit, cursor)
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Invalid date range or cursor'}), 400
+    except Throttled:
+        raise
+    except Exception as e:
+        log.error("Error finding booking history: %s", e)
+        return jsonify({'status': 'error', 'message': 'Could not load booking history'}), 500
+    return jsonify({'status': 'success', 'entries': history_json(entries), 'nextCursor': next_cursor})
+
+@app.route('/api/owner/history')
+def owner_booking_history():
+    if 'logged_in_email' not in session:
+        return jsonify({'status': 'error', 'message': 'User not logged in'}), 401
+
+    owner = find_owner_by_email(session['logged_in_email'])
+    if not owner:
+        return jsonify({'status': 'error', 'message': 'Only lot owners can view the audit trail'}), 403
+
+    try:
+        start, end, limit, cursor = parse_history_range(request.args)
+        entries, next_cursor = repository.find_owner_history(owner['email'], start, end, limit, cursor)
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Invalid date range or cursor'}), 400
+    except Throttled:
+        raise
+    except Exception as e:
+        log.error("Error finding owner history: %s", e)
+        return jsonify({'status': 'error', 'message': 'Could not load booking history'}), 500
+    return jsonify({'status': 'success', 'entries': history_json(entries), 'nextCursor': next_cursor})
+
+@app.route('/api/owner/stats')
+def owner_stats():
+    """A month of hourly or daily occupancy and revenue, from one range read."""
+    if 'logged_in_email' not in session:
+        return jsonify({'status': 'error', 'message': 'User not logged in'}), 401
+
+    owner = find_owner_by_email(session['logged_in_email'])
+    if not owner:
+        return jsonify({'status': 'error', 'message': 'Only lot owners can view stats'}), 403
+
+    month = request.args.get('month') or date.today().isoformat()[:7]
+    granularity = request.args.get('granularity', 'day').upper()
+    try:
+        datetime.strptime(month, '%Y-%m')
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'month must look like 2024-05'}), 400
+    if granularity not in rollups.GRANULARITIES:
+        return jsonify({'status': 'error', 'message': 'granularity must be hour or day'}), 400
+
+    try:
+        rows = repository.find_rollups(owner['email'], f'{granularity}#{month}')
+    except Throttled:
+        raise
+    except Exception as e:
+        log.error("Error finding rollups: %s", e)
+        return jsonify({'status': 'error', 'message': 'Could not load stats'}), 500
+    summary = rollups.summarize(rows, granularity)
+    return jsonify({
+        'status': 'success',
+        'month': month,
+        'granularity': granularity.lower(),
+        'totals': rollup_metrics_json(summary['totals']),
+        'periods': [{
+            'period': period['period'],
+            'total': rollup_metrics_json(period['total']),
+            'floors': {floor: rollup_metrics_json(metrics) for floor, metrics in period['floors'].items()},
+        } for period in summary['periods']],
+    })
+
+@app.route('/metrics')
+def metrics():
+    if not METRICS_ENABLED:
+        return Response('Metrics are disabled\n', status=404, mimetype='text/plain')
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/logout')
 def logout():
     session.pop('logged_in_email', None)
     return redirect(url_for('login'))
 
+@app.cli.command('export-owners')
+@click.option('--segments', default=SCAN_SEGMENTS, show_default=True,
+              help='Number of parallel scan segments (DynamoDB only).')
+def export_owners(segments):
+    """Stream every owner as JSON lines, using a parallel segmented scan on DynamoDB."""
+    for owner in iter_owners(segments):
+        owner.pop('password', None)
+        click.echo(json.dumps(owner, default=str))
+
+@app.cli.command('rebuild-counters')
+@click.argument('owner_email', required=False)
+def rebuild_counters_command(owner_email):
+    """Recount free/occupied counters for one lot, or for every lot."""
+    emails = [owner_email] if owner_email else [owner['email'] for owner in iter_owners()]
+    for email in emails:
+        counts = rebuild_slot_counters(email)
+        click.echo(f"{email}: {sum(c['free'] for c in counts.values())} free, "
+                   f"{sum(c['occupied'] for c in counts.values())} occupied")
+
+@app.cli.command('backfill-rollups')
+@click.argument('owner_email', required=False)
+def backfill_rollups_command(owner_email):
+    """Rebuild dashboard rollups from booking history, for one lot or every lot.
+
+    Run it while the lot takes no bookings: rows are replaced, so events
+    recorded during the run can be lost. History past its TTL is gone and
+    no longer counted.
+    """
+    emails = [owner_email] if owner_email else [owner['email'] for owner in iter_owners()]
+    for email in emails:
+        click.echo(f"{email}: {backfill_rollups(email)} rollup rows")
+
+@app.cli.command('sweep-overstays')
+@click.option('--once', is_flag=True, help='Make one pass over every lot, settle what is due and exit.')
+def sweep_overstays_command(once):
+    """Flag or release stays past their expiry; runs until stopped.
+
+    Run a single sweeper per deployment, apart from the web workers.
+    """
+    if OVERSTAY_ACTION not in OVERSTAY_ACTIONS:
+        raise click.ClickException(f"OVERSTAY_ACTION must be one of {', '.join(OVERSTAY_ACTIONS)}")
+    heap = sweeper.ExpiryHeap()
+    if once:
+        cursor = reconcile_stays(heap)
+        while cursor:
+            cursor = reconcile_stays(heap, cursor)
+        settled = settle_overstays(heap)
+        click.echo(f"{len(heap)} open stays left, {settled} overstays "
+                   f"{'released' if OVERSTAY_ACTION == 'release' else 'flagged'}")
+        return
+
+    cursor = None
+
+    def tick():
+        nonlocal cursor
+        cursor = reconcile_stays(heap, cursor)
+        settled = settle_overstays(heap)
+        if settled:
+            log.info("Settled %d overstays, %d open stays tracked", settled, len(heap))
+
+    log.info("Sweeping overstays every %ss (%s)", SWEEP_INTERVAL_SECONDS, OVERSTAY_ACTION)
+    sweeper.run(tick, SWEEP_INTERVAL_SECONDS, log=log)
+
+@app.cli.command('vendor-assets')
+@click.option('--force', is_flag=True, help='Download files that are already present.')
+def vendor_assets_command(force):
+    """Download the third-party CSS/JS the templates use into static/vendor."""
+    for path, status in vendor_assets(app.static_folder, force):
+        click.echo(f"{path}: {status}")
+
+@app.cli.command('build-assets')
+def build_assets_command():
+    """Fingerprint, precompress and resize static files into static/dist."""
+    manifest = build_assets(app.static_folder, log=click.echo)
+    assets.load()
+    click.echo(f"{len(manifest['files'])} files, {len(manifest['encodings'])} precompressed, "
+               f"{len(manifest['images'])} images with variants")
+
+@app.cli.command('init-tables')
+def init_tables_command():
+    """Verify the storage schema and create any missing tables."""
+    if not init_tables():
+        raise click.ClickException('One or more tables could not be set up')
+
+# Cold-start cost of importing this module, tracked for regressions
+STARTUP_SECONDS = perf_counter() - _import_started
+app.config['STARTUP_SECONDS'] = STARTUP_SECONDS
+
+metrics_registry.gauge('app_startup_seconds', 'Time taken to import the app module.',
+                       lambda: STARTUP_SECONDS)
+metrics_registry.gauge('owner_cache_lookups', 'Owner cache lookups by result since start.',
+                       lambda: {('hit',): owner_cache.hits, ('miss',): owner_cache.misses},
+                       labels=('result',))
+metrics_registry.gauge('fragment_cache_lookups', 'Listing fragment cache lookups by result since start.',
+                       lambda: {('hit',): fragment_cache.hits, ('miss',): fragment_cache.misses},
+                       labels=('result',))
+metrics_registry.gauge('slot_event_subscribers', 'Open live slot update streams.',
+                       slot_events.subscriber_count)
+metrics_registry.gauge('log_records_dropped', 'Log records dropped since start because the queue was full.',
+                       lambda: log.queue_handler.dropped)
+log.info("App module loaded in %.1fms", STARTUP_SECONDS * 1000)
+
 if __name__ == "__main__":
     app.run(debug=True, host="0.0.0.0", port=5000)
\ No newline at end of file
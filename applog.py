@@ -0,0 +1,150 @@
+"""Structured, non-blocking logging for the app.
+
+Request threads only put records on a bounded queue; a QueueListener thread
+formats them as JSON lines and writes them out. Records are redacted
+before they are queued, DEBUG records can be sampled, and each Flask
+endpoint can have its own level.
+
+Environment:
+    LOG_LEVEL               default level, INFO
+    LOG_ROUTE_LEVELS        per-endpoint levels, e.g. "book_slot=DEBUG,login=WARNING"
+    LOG_DEBUG_SAMPLE_RATE   fraction of DEBUG records kept, 1.0 keeps all
+    LOG_QUEUE_SIZE          records buffered before new ones are dropped
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+
+try:
+    from flask import has_request_context, request
+except ImportError:  # pragma: no cover - only used inside the Flask app
+    has_request_context = None
+
+REDACTED = '[REDACTED]'
+SENSITIVE_KEYS = {'password', 'cpassword', 'secret', 'token', 'authorization', 'cookie'}
+
+
+def redact(value):
+    """Return value with any sensitive dict keys masked, at any depth."""
+    if isinstance(value, dict):
+        return {k: REDACTED if str(k).lower() in SENSITIVE_KEYS else redact(v)
+                for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(v) for v in value]
+    return value
+
+
+def _current_endpoint():
+    if has_request_context is not None and has_request_context():
+        return request.endpoint
+    return None
+
+
+class RouteLevelFilter(logging.Filter):
+    """Drop records below the level configured for the current endpoint."""
+
+    def __init__(self, default_level, route_levels=None):
+        super().__init__()
+        self.default_level = default_level
+        self.route_levels = route_levels or {}
+
+    def filter(self, record):
+        endpoint = _current_endpoint()
+        record.route = endpoint
+        return record.levelno >= self.route_levels.get(endpoint, self.default_level)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of DEBUG records; higher levels always pass."""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or self.rate >= 1 or random.random() < self.rate
+
+
+class RedactingFilter(logging.Filter):
+    def filter(self, record):
+        if isinstance(getattr(record, 'data', None), dict):
+            record.data = redact(record.data)
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks: records are dropped when the queue is full."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if getattr(record, 'route', None):
+            entry['route'] = record.route
+        if getattr(record, 'data', None):
+            entry['data'] = record.data
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def _parse_route_levels(spec):
+    levels = {}
+    for part in (spec or '').split(','):
+        if '=' in part:
+            endpoint, level = part.split('=', 1)
+            levels[endpoint.strip()] = logging.getLevelName(level.strip().upper())
+    return levels
+
+
+def setup_logging(name, stream=None):
+    """Configure and return the named logger with a background writer thread."""
+    logger = logging.getLogger(name)
+    if getattr(logger, 'queue_handler', None):
+        return logger
+
+    default_level = logging.getLevelName(os.environ.get('LOG_LEVEL', 'INFO').upper())
+    route_levels = _parse_route_levels(os.environ.get('LOG_ROUTE_LEVELS'))
+    sample_rate = float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', '1.0'))
+
+    log_queue = queue.Queue(maxsize=int(os.environ.get('LOG_QUEUE_SIZE', '10000')))
+    queue_handler = DroppingQueueHandler(log_queue)
+    # Filters run on the calling thread, so records that would be thrown
+    # away are never formatted or queued
+    queue_handler.addFilter(RouteLevelFilter(default_level, route_levels))
+    queue_handler.addFilter(SamplingFilter(sample_rate))
+    queue_handler.addFilter(RedactingFilter())
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter())
+    listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=False)
+    listener.start()
+    atexit.register(listener.stop)
+
+    logger.setLevel(min([default_level, *route_levels.values()]))
+    logger.addHandler(queue_handler)
+    logger.propagate = False
+    logger.queue_handler = queue_handler
+    logger.queue_listener = listener
+    return logger
@@ -0,0 +1,273 @@
+"""Static asset pipeline.
+
+`flask vendor-assets` downloads the third-party CSS/JS (and Font Awesome's
+fonts) that the templates used to pull from CDNs into static/vendor.
+
+`flask build-assets` writes static/dist:
+    - every file under static/ under a content-hashed name, with url()
+      references inside CSS rewritten to the hashed names
+    - .gz and .br copies of compressible files (.br needs the brotli package)
+    - WebP and AVIF variants of JPEG/PNG images at a few widths (needs Pillow)
+    - manifest.json describing all of the above
+
+At runtime asset_url() and asset_picture() resolve logical paths such as
+'css/style.css' through the manifest, and /assets/<file> serves built files
+with far-future immutable caching, picking the precompressed copy the client
+accepts. Without a build everything falls back to /static, and vendored
+files that were never downloaded fall back to their CDN URL, so a fresh
+checkout still renders.
+
+Neither output is committed. Vercel deploys run both commands as their
+build step (buildCommand in vercel.json) and ship static/ with the function.
+"""
+import gzip
+import hashlib
+import io
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+import urllib.request
+
+from markupsafe import Markup, escape
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+IMAGE_WIDTHS = (480, 960, 1600)
+IMAGE_FORMATS = (('avif', 'AVIF', {'quality': 55}), ('webp', 'WEBP', {'quality': 78, 'method': 6}))
+COMPRESSIBLE = {'.css', '.js', '.svg', '.json', '.txt', '.html', '.eot', '.ttf', '.otf'}
+RESIZABLE = {'.jpg', '.jpeg', '.png'}
+
+_FA = 'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/4.7.0'
+VENDOR_ASSETS = {
+    'vendor/bootstrap-4.6.1/bootstrap.min.css': 'https://cdn.jsdelivr.net/npm/bootstrap@4.6.1/dist/css/bootstrap.min.css',
+    'vendor/bootstrap-4.6.1/bootstrap.bundle.min.js': 'https://cdn.jsdelivr.net/npm/bootstrap@4.6.1/dist/js/bootstrap.bundle.min.js',
+    'vendor/bootstrap-4.0.0/bootstrap.min.css': 'https://cdn.jsdelivr.net/npm/bootstrap@4.0.0/dist/css/bootstrap.min.css',
+    'vendor/bootstrap-4.0.0/bootstrap.min.js': 'https://maxcdn.bootstrapcdn.com/bootstrap/4.0.0/js/bootstrap.min.js',
+    'vendor/jquery-3.5.1/jquery.slim.min.js': 'https://cdn.jsdelivr.net/npm/jquery@3.5.1/dist/jquery.slim.min.js',
+    'vendor/jquery-3.2.1/jquery.slim.min.js': 'https://code.jquery.com/jquery-3.2.1.slim.min.js',
+    'vendor/popper-1.11.0/popper.min.js': 'https://cdnjs.cloudflare.com/ajax/libs/popper.js/1.11.0/umd/popper.min.js',
+    'vendor/font-awesome-4.7.0/css/font-awesome.min.css': f'{_FA}/css/font-awesome.min.css',
+    # Referenced from the stylesheet as ../fonts/..., so the layout is kept
+    **{f'vendor/font-awesome-4.7.0/fonts/{name}': f'{_FA}/fonts/{name}' for name in (
+        'fontawesome-webfont.eot', 'fontawesome-webfont.woff2', 'fontawesome-webfont.woff',
+        'fontawesome-webfont.ttf', 'fontawesome-webfont.svg', 'FontAwesome.otf')},
+}
+
+_CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+
+
+def vendor_assets(static_dir, force=False, timeout=30):
+    """Download VENDOR_ASSETS into static_dir; yield (path, status) per file."""
+    for path, url in VENDOR_ASSETS.items():
+        target = os.path.join(static_dir, path)
+        if os.path.exists(target) and not force:
+            yield path, 'present'
+            continue
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            data = response.read()
+        with open(target + '.tmp', 'wb') as f:
+            f.write(data)
+        os.replace(target + '.tmp', target)
+        yield path, f'{len(data)} bytes'
+
+
+def _hashed_name(path, data):
+    root, ext = posixpath.splitext(path)
+    return f'{root}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+
+
+def _rewrite_css(css_path, text, files):
+    # Point relative url()s at the hashed files, keeping ?query and #fragment
+    def replace(match):
+        quote, ref = match.groups()
+        if ref.startswith(('data:', 'http:', 'https:', '//', '#', '/')):
+            return match.group(0)
+        target, suffix = re.match(r'([^?#]*)(.*)', ref).groups()
+        logical = posixpath.normpath(posixpath.join(posixpath.dirname(css_path), target))
+        built = files.get(logical)
+        if not built:
+            return match.group(0)
+        # Hashed files stay in their directory, so relative paths carry over
+        relative = posixpath.relpath(built, posixpath.dirname(css_path) or '.')
+        return f'url({quote}{relative}{suffix}{quote})'
+    return _CSS_URL.sub(replace, text)
+
+
+def _write(out_dir, path, data):
+    target = os.path.join(out_dir, path)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with open(target, 'wb') as f:
+        f.write(data)
+
+
+def _precompress(out_dir, path, data, brotli):
+    encodings = []
+    compressed = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(compressed) < len(data):
+        _write(out_dir, path + '.gz', compressed)
+        encodings.append('gzip')
+    if brotli is not None:
+        compressed = brotli.compress(data, quality=11)
+        if len(compressed) < len(data):
+            _write(out_dir, path + '.br', compressed)
+            encodings.append('br')
+    return encodings
+
+
+def _image_variants(out_dir, path, data, Image, log):
+    with Image.open(io.BytesIO(data)) as source:
+        source.load()
+        width, height = source.size
+        image = source.convert('RGBA' if source.mode in ('RGBA', 'LA', 'P') else 'RGB')
+    variants = {'width': width, 'height': height}
+    widths = [w for w in IMAGE_WIDTHS if w < width] + [width]
+    for suffix, pil_format, options in IMAGE_FORMATS:
+        built = []
+        for w in widths:
+            resized = image if w == width else image.resize((w, round(height * w / width)), Image.LANCZOS)
+            buffer = io.BytesIO()
+            try:
+                resized.save(buffer, pil_format, **options)
+            except (KeyError, OSError, ValueError) as e:
+                log(f'skipping {suffix} variants: {e}')
+                built = []
+                break
+            root = posixpath.splitext(path)[0]
+            name = _hashed_name(f'{root}.{w}w.{suffix}', buffer.getvalue())
+            _write(out_dir, name, buffer.getvalue())
+            built.append([w, name])
+        if built:
+            variants[suffix] = built
+    return variants
+
+
+def build_assets(static_dir, out_dir=None, log=print):
+    """Build static_dir into out_dir (static/dist) and return the manifest."""
+    out_dir = out_dir or os.path.join(static_dir, 'dist')
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+        log('brotli is not installed; writing gzip only')
+    try:
+        from PIL import Image
+    except ImportError:
+        Image = None
+        log('Pillow is not installed; skipping WebP/AVIF variants')
+
+    sources = {}
+    for root, dirs, names in os.walk(static_dir):
+        if os.path.abspath(root).startswith(os.path.abspath(out_dir)):
+            continue
+        for name in names:
+            full = os.path.join(root, name)
+            sources[os.path.relpath(full, static_dir).replace(os.sep, '/')] = full
+
+    if os.path.isdir(out_dir):
+        shutil.rmtree(out_dir)
+    manifest = {'files': {}, 'encodings': {}, 'images': {}}
+    files = manifest['files']
+    contents = {}
+    # Hash everything except stylesheets first, so CSS can point at the results
+    ordered = sorted(sources, key=lambda p: (p.endswith('.css'), p))
+    for path in ordered:
+        with open(sources[path], 'rb') as f:
+            data = f.read()
+        if path.endswith('.css'):
+            data = _rewrite_css(path, data.decode('utf-8'), files).encode('utf-8')
+        files[path] = _hashed_name(path, data)
+        contents[path] = data
+        _write(out_dir, files[path], data)
+
+    for path, data in contents.items():
+        ext = posixpath.splitext(path)[1].lower()
+        if ext in COMPRESSIBLE:
+            encodings = _precompress(out_dir, files[path], data, brotli)
+            if encodings:
+                manifest['encodings'][files[path]] = encodings
+        elif ext in RESIZABLE and Image is not None:
+            manifest['images'][path] = _image_variants(out_dir, path, data, Image, log)
+
+    with open(os.path.join(out_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    return manifest
+
+
+class Assets:
+    """Template helpers and the /assets route for built files."""
+
+    def __init__(self, app=None):
+        self.manifest = {'files': {}, 'encodings': {}, 'images': {}}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.static_dir = app.static_folder
+        self.dist_dir = os.path.join(app.static_folder, 'dist')
+        self.load()
+        app.add_url_rule('/assets/<path:filename>', 'built_asset', self.serve)
+        app.add_template_global(self.asset_url, 'asset_url')
+        app.add_template_global(self.asset_picture, 'asset_picture')
+
+    def load(self):
+        try:
+            with open(os.path.join(self.dist_dir, 'manifest.json')) as f:
+                self.manifest = json.load(f)
+        except FileNotFoundError:
+            pass
+
+    def asset_url(self, path):
+        from flask import url_for
+        built = self.manifest['files'].get(path)
+        if built:
+            return url_for('built_asset', filename=built)
+        if path in VENDOR_ASSETS and not os.path.exists(os.path.join(self.static_dir, path)):
+            return VENDOR_ASSETS[path]
+        return url_for('static', filename=path)
+
+    def asset_picture(self, path, alt, sizes='100vw', lazy=False, **attrs):
+        """Return a <picture> with AVIF/WebP sources, or a plain <img> if unbuilt."""
+        from flask import url_for
+        image = self.manifest['images'].get(path, {})
+        img_attrs = {'src': self.asset_url(path), 'alt': alt, **attrs}
+        if image:
+            img_attrs.setdefault('width', image['width'])
+            img_attrs.setdefault('height', image['height'])
+        if lazy:
+            img_attrs['loading'] = 'lazy'
+            img_attrs['decoding'] = 'async'
+        img = '<img ' + ' '.join(f'{k.replace("_", "-")}="{escape(v)}"' for k, v in img_attrs.items()) + '>'
+        sources = []
+        for suffix, _, _ in IMAGE_FORMATS:
+            if image.get(suffix):
+                srcset = ', '.join(f"{url_for('built_asset', filename=name)} {w}w" for w, name in image[suffix])
+                sources.append(f'<source type="image/{suffix}" srcset="{escape(srcset)}" sizes="{escape(sizes)}">')
+        if not sources:
+            return Markup(img)
+        return Markup('<picture>' + ''.join(sources) + img + '</picture>')
+
+    def serve(self, filename):
+        from flask import request, send_from_directory
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        encoding = None
+        available = self.manifest['encodings'].get(filename, ())
+        for candidate in ('br', 'gzip'):
+            if candidate in available and candidate in request.accept_encodings:
+                encoding = candidate
+                break
+        response = send_from_directory(
+            self.dist_dir,
+            filename + ('.br' if encoding == 'br' else '.gz' if encoding else ''),
+            mimetype=mimetype,
+            max_age=IMMUTABLE_MAX_AGE,
+        )
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if available:
+            response.headers['Vary'] = 'Accept-Encoding'
+        # The name changes whenever the content does
+        response.headers['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+        return response
@@ -0,0 +1,157 @@
+"""Hammer a single slot with concurrent /book and /cancel requests.
+
+Every round, N threads race to book the same slot; exactly one must win
+and the rest must get a 409. The winner then releases the slot and the
+next round starts. Booking latency is reported as p50/p99 per mode, and
+release latency with, on DynamoDB, the calls and capacity units each
+release costs:
+
+    python benchmarks/booking_contention.py --threads 32 --rounds 50
+    python benchmarks/booking_contention.py --legacy   # old read-check-write path
+
+By default the run uses moto's in-process DynamoDB; pass --live to hit the
+tables configured in the environment instead, or --backend memory/sqlite to
+race the local backends. moto does not serialize concurrent conditional
+writes, so under moto double wins are not counted as a failure, and its
+consumed capacity figures are only indicative.
+"""
+import argparse
+import statistics
+import sys
+import threading
+import time
+import uuid
+
+from common import BACKENDS, dynamodb_standin, logged_in_client, percentile, select_backend
+
+
+def legacy_book(app_module, slot_id, email):
+    # The pre-atomic flow: get_item, check in Python, put_item back
+    slot = app_module.find_slot_by_id(slot_id)
+    if not slot:
+        return 404
+    if slot.get('status'):
+        return 409
+    slot['bookingDate'] = app_module.date.today().isoformat()
+    slot['checkinTime'] = app_module.datetime.now().time().isoformat()
+    slot['status'] = email
+    app_module.save_slot(slot)
+    return 200
+
+
+def dynamodb_usage(app_module):
+    """Snapshot ({operation: calls}, capacity units) from the app's DynamoDB metrics."""
+    dynamodb_metrics = getattr(app_module, 'dynamodb_metrics', None)
+    if dynamodb_metrics is None:
+        return {}, 0
+    calls = {operation: count for (operation,), count in dynamodb_metrics.calls.values().items()}
+    return calls, sum(dynamodb_metrics.capacity.values().values())
+
+
+def run(args):
+    import app as app_module
+    if not args.live:
+        app_module.init_tables()
+
+    owner_email = f'bench-owner-{uuid.uuid4().hex[:8]}@example.com'
+    # /book snapshots the lot's tariff, so the lot needs an owner, as in routes.seed
+    app_module.save_owner({
+        'email': owner_email,
+        'password': 'password1',
+        'orgType': 'mall',
+        'orgName': 'Bench Lot',
+        'costPerHour': 20,
+    })
+    slot_id = str(uuid.uuid4())
+    app_module.create_slot({
+        'id': slot_id,
+        'ownerEmail': owner_email,
+        'slotNumber': '1',
+        'floorNumber': '1',
+        'bookingDate': None,
+        'checkinTime': None,
+        'status': None,
+    })
+
+    latencies = []
+    release_latencies = []
+    release_calls = {}
+    release_units = 0
+    double_wins = 0
+    lock = threading.Lock()
+
+    for _ in range(args.rounds):
+        barrier = threading.Barrier(args.threads)
+        winners = []
+
+        def worker(n):
+            email = f'driver-{n}@example.com'
+            client = logged_in_client(app_module, email)
+            barrier.wait()
+            started = time.perf_counter()
+            if args.legacy:
+                status = legacy_book(app_module, slot_id, email)
+            else:
+                status = client.post('/book', data={'slotId': slot_id}).status_code
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if status == 200:
+                    winners.append(email)
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(args.threads)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        if len(winners) > 1:
+            double_wins += 1
+        holder = app_module.find_slot_by_id(slot_id).get('status')
+        if holder:
+            calls_before, units_before = dynamodb_usage(app_module)
+            started = time.perf_counter()
+            app_module.release_slot(slot_id, holder)
+            release_latencies.append(time.perf_counter() - started)
+            calls_after, units_after = dynamodb_usage(app_module)
+            for operation, count in calls_after.items():
+                release_calls[operation] = release_calls.get(operation, 0) + count - calls_before.get(operation, 0)
+            release_units += units_after - units_before
+
+    mode = 'legacy' if args.legacy else 'atomic'
+    total = len(latencies)
+    print(f"backend={app_module.repository.name} mode={mode} threads={args.threads} rounds={args.rounds} requests={total}")
+    print(f"  p50={percentile(latencies, 50) * 1000:.2f}ms "
+          f"p99={percentile(latencies, 99) * 1000:.2f}ms "
+          f"mean={statistics.mean(latencies) * 1000:.2f}ms")
+    print(f"  rounds with more than one winner: {double_wins}")
+    if release_latencies:
+        releases = len(release_latencies)
+        print(f"  release p50={percentile(release_latencies, 50) * 1000:.2f}ms "
+              f"p99={percentile(release_latencies, 99) * 1000:.2f}ms")
+        if release_calls:
+            per_release = ' '.join(f"{operation}={count / releases:g}"
+                                   for operation, count in sorted(release_calls.items()) if count)
+            print(f"  DynamoDB per release: {per_release} capacity={release_units / releases:g} units")
+    enforced = args.live or args.backend != 'dynamodb'
+    return 1 if double_wins and enforced and not args.legacy else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--legacy', action='store_true',
+                        help='use the old find_slot_by_id + save_slot path')
+    parser.add_argument('--backend', choices=BACKENDS, default='dynamodb')
+    parser.add_argument('--live', action='store_true',
+                        help='run against real DynamoDB instead of moto')
+    args = parser.parse_args()
+    select_backend(args.backend)
+
+    with dynamodb_standin(args.live):
+        return run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,54 @@
+"""Measure how long a fresh interpreter takes to import the app.
+
+Each run imports app.py in a new process and reads STARTUP_SECONDS, which
+covers everything the module does at import. Use --max-ms to turn the
+median into a regression gate:
+
+    python benchmarks/cold_start.py --runs 10 --max-ms 400
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Log records are written to stdout by a background thread and may come
+# after the probe's line, so the value is found by its prefix
+PROBE_PREFIX = 'STARTUP_SECONDS='
+PROBE = f"import app; print('{PROBE_PREFIX}' + repr(app.STARTUP_SECONDS), flush=True)"
+
+
+def probe_seconds(output):
+    for line in output.splitlines():
+        if line.startswith(PROBE_PREFIX):
+            return float(line[len(PROBE_PREFIX):])
+    raise ValueError(f'no {PROBE_PREFIX} line in probe output: {output!r}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--max-ms', type=float, default=None,
+                        help='fail if the median startup time exceeds this')
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    samples = []
+    for _ in range(args.runs):
+        output = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT, env=env,
+                                capture_output=True, text=True, check=True).stdout
+        samples.append(probe_seconds(output) * 1000)
+
+    median = statistics.median(samples)
+    print(f"runs={args.runs} median={median:.1f}ms min={min(samples):.1f}ms max={max(samples):.1f}ms")
+    if args.max_ms is not None and median > args.max_ms:
+        print(f"startup regression: median {median:.1f}ms > {args.max_ms:.1f}ms")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,49 @@
+"""Shared helpers for the benchmark scripts."""
+import contextlib
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+# Benchmarks measure the routes themselves, not admission control
+os.environ.setdefault('RATE_LIMIT_ENABLED', '0')
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+BACKENDS = ('dynamodb', 'memory', 'sqlite')
+
+
+def select_backend(backend):
+    """Point the app at a storage backend; call before importing app."""
+    os.environ['STORAGE_BACKEND'] = backend
+    if backend == 'sqlite' and 'SQLITE_PATH' not in os.environ:
+        os.environ['SQLITE_PATH'] = os.path.join(tempfile.mkdtemp(prefix='parking-bench-'), 'parking.db')
+
+
+@contextlib.contextmanager
+def dynamodb_standin(live=False):
+    """Run the body against moto's in-process DynamoDB unless live is set."""
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    if live:
+        yield
+        return
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+    from moto import mock_aws
+    with mock_aws():
+        yield
+
+
+def logged_in_client(app_module, email):
+    client = app_module.app.test_client()
+    with client.session_transaction() as sess:
+        sess['logged_in_email'] = email
+    return client
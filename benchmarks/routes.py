@@ -0,0 +1,177 @@
+"""Benchmark every main route against a seeded storage backend.
+
+Seeds moto (or the in-memory/SQLite backend) with drivers, lots and slots, then drives /login, /owners,
+/slots/<owner_email>, /book, /get_bill and /cancel through the Flask test
+client. Prints throughput and p50/p99 latency per route:
+
+    python benchmarks/routes.py --owners 2000 --slots 20000 --iterations 200
+    python benchmarks/routes.py --save-baseline          # record current numbers
+    python benchmarks/routes.py --tolerance 1.25         # fail if p99 regresses >25%
+    python benchmarks/routes.py --backend sqlite         # compare storage backends
+
+Baselines are stored per route in benchmarks/baseline.json by default. They
+are machine-specific, so record them on the machine that checks them, and
+per backend (pass --baseline to keep one file for each).
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import uuid
+
+from common import BACKENDS, dynamodb_standin, logged_in_client, percentile, select_backend
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+ORG_TYPES = ['mall', 'restaurant', 'hospital']
+
+
+def seed(app_module, owners, slots, drivers, rng):
+    """Create drivers, lots and slots; return (driver credentials, owner emails)."""
+    started = time.perf_counter()
+    credentials = []
+    for n in range(drivers):
+        username = f'driver{n}'
+        app_module.save_user({'email': f'{username}@example.com', 'username': username,
+                              'password': 'password1'})
+        credentials.append((username, 'password1', f'{username}@example.com'))
+
+    owner_emails = []
+    for n in range(owners):
+        email = f'lot{n}@example.com'
+        app_module.save_owner({
+            'email': email,
+            'password': 'password1',
+            'orgType': rng.choice(ORG_TYPES),
+            'orgName': f'Lot {n}',
+            'costPerHour': rng.choice([20, 30, 40, 50, 60]),
+        })
+        owner_emails.append(email)
+
+    # Lots get a skewed share of slots, like a few malls and many small car parks
+    weights = [1.0 / (rank + 1) for rank in range(owners)]
+    scale = slots / sum(weights)
+    slot_items = []
+    for email, weight in zip(owner_emails, weights):
+        for n in range(max(1, int(weight * scale))):
+            slot_items.append({
+                'id': str(uuid.uuid4()),
+                'ownerEmail': email,
+                'slotNumber': str(n % 100 + 1),
+                'floorNumber': str(n // 100 + 1),
+                'bookingDate': None,
+                'checkinTime': None,
+                'status': None,
+            })
+    for _ in app_module.batch_save_slots(slot_items):
+        pass
+    print(f"seeded {drivers} drivers, {owners} lots, {len(slot_items)} slots "
+          f"in {time.perf_counter() - started:.1f}s")
+    return credentials, owner_emails
+
+
+def timed(samples, call):
+    started = time.perf_counter()
+    response = call()
+    samples.append(time.perf_counter() - started)
+    return response
+
+
+def run(args):
+    import app as app_module
+    if not args.live:
+        app_module.init_tables()
+
+    rng = random.Random(args.seed)
+    credentials, owner_emails = seed(app_module, args.owners, args.slots, args.drivers, rng)
+    busiest_lot = owner_emails[0]
+    free_slots = [slot['id'] for slot in app_module.find_slots_by_owner_email(busiest_lot)]
+    rng.shuffle(free_slots)
+
+    samples = {route: [] for route in ('login', 'owners', 'slots', 'book', 'get_bill', 'cancel')}
+    statuses = {route: {} for route in samples}
+
+    def record(route, response):
+        statuses[route][response.status_code] = statuses[route].get(response.status_code, 0) + 1
+
+    anonymous = app_module.app.test_client()
+    for i in range(args.iterations):
+        username, password, email = credentials[i % len(credentials)]
+        record('login', timed(samples['login'], lambda: anonymous.post(
+            '/login', data={'username': username, 'password': password})))
+
+        client = logged_in_client(app_module, email)
+        record('owners', timed(samples['owners'], lambda: client.get('/owners')))
+        lot = rng.choice(owner_emails[:max(1, len(owner_emails) // 10)])
+        record('slots', timed(samples['slots'], lambda: client.get(f'/slots/{lot}')))
+
+        slot_id = free_slots[i % len(free_slots)]
+        form = {'slotId': slot_id}
+        record('book', timed(samples['book'], lambda: client.post('/book', data=form)))
+        record('get_bill', timed(samples['get_bill'], lambda: client.post('/get_bill', data=form)))
+        record('cancel', timed(samples['cancel'], lambda: client.post('/cancel', data=form)))
+
+    results = {}
+    print(f"backend={app_module.repository.name}")
+    print(f"{'route':<10} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9}  statuses")
+    for route, latencies in samples.items():
+        total = sum(latencies)
+        results[route] = {
+            'throughput': len(latencies) / total if total else 0.0,
+            'p50': percentile(latencies, 50),
+            'p99': percentile(latencies, 99),
+        }
+        print(f"{route:<10} {results[route]['throughput']:>9.1f} {results[route]['p50'] * 1000:>9.2f} "
+              f"{results[route]['p99'] * 1000:>9.2f}  {statuses[route]}")
+    return results
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for route, current in results.items():
+        previous = baseline.get(route)
+        if previous and current['p99'] > previous['p99'] * tolerance:
+            regressions.append(f"{route}: p99 {current['p99'] * 1000:.2f}ms "
+                               f"> {previous['p99'] * 1000:.2f}ms x {tolerance}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--owners', type=int, default=2000)
+    parser.add_argument('--slots', type=int, default=20000)
+    parser.add_argument('--drivers', type=int, default=200)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=1.5,
+                        help='allowed p99 ratio against the baseline')
+    parser.add_argument('--backend', choices=BACKENDS, default='dynamodb')
+    parser.add_argument('--live', action='store_true',
+                        help='run against real DynamoDB instead of moto')
+    args = parser.parse_args()
+    select_backend(args.backend)
+
+    with dynamodb_standin(args.live):
+        results = run(args)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"baseline saved to {args.baseline}")
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
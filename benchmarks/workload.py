@@ -0,0 +1,277 @@
+"""Simulate parking traffic against the app for capacity planning.
+
+Drivers arrive at each lot as a Poisson process, either at a constant rate
+or following a daily profile with morning and evening peaks, and stay for
+a log-normally distributed time. Each arrival drives the whole flow through
+the Flask test client: /register, /login, /owners, /slots/<owner_email>
+and /book (trying another free slot on a 409), then, once its stay is
+over, /get_bill and /cancel. Sessions run concurrently on a thread pool.
+
+Simulated time runs --speedup times faster than the wall clock, so a day
+of traffic fits in a short run while the request rate the app sees is the
+real one scaled by the same factor:
+
+    python benchmarks/workload.py --hours 24 --speedup 1440 --arrivals 600
+    python benchmarks/workload.py --profile poisson --arrivals 2000 --workers 64
+    python benchmarks/workload.py --rate-limit          # keep admission control on
+
+Reports throughput, latency percentiles per route, booking conflict and
+rejection rates, and, on DynamoDB, consumed capacity and throttles per
+table. By default the run uses moto's in-process DynamoDB; pass --live to
+use the tables configured in the environment (point
+AWS_ENDPOINT_URL_DYNAMODB at DynamoDB Local for a local stand-in that
+enforces capacity), or --backend memory/sqlite.
+
+moto does not serialise conditional writes across threads, so under
+concurrency two drivers can both win a slot and the loser later sees a 403
+or 400 on /get_bill and /cancel. Conflict rates are only meaningful on
+DynamoDB Local, real DynamoDB or the memory/SQLite backends.
+"""
+import argparse
+import heapq
+import itertools
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common import BACKENDS, dynamodb_standin, percentile, select_backend
+from routes import seed
+
+ROUTES = ('register', 'login', 'owners', 'slots', 'book', 'get_bill', 'cancel')
+BOOK_ATTEMPTS = 3
+# Arrivals per hour of day relative to the daily mean: commuter peaks at 9:00
+# and 18:00 over a quiet night
+PEAKS = ((9, 1.5, 2.2), (18, 2.0, 1.8))
+NIGHT = 0.15
+
+_FREE_SLOT = re.compile(r'class="card available" data-slot-id="([^"]+)"')
+
+
+def diurnal(hour):
+    """Relative arrival rate at an hour of the day (0-24)."""
+    rate = NIGHT
+    for peak, width, height in PEAKS:
+        distance = min(abs(hour - peak), 24 - abs(hour - peak))
+        rate += height * math.exp(-0.5 * (distance / width) ** 2)
+    return rate
+
+
+def arrival_times(rate_per_hour, hours, profile, rng):
+    """Yield arrival times in simulated hours from a (non-homogeneous) Poisson process.
+
+    diurnal arrivals are drawn by thinning: candidates come at the peak
+    rate and each is kept with probability rate(t) / peak rate, which keeps
+    the daily mean at rate_per_hour.
+    """
+    if profile == 'poisson':
+        scale, peak = 1.0, 1.0
+    else:
+        scale = 24 / sum(diurnal(h / 10) / 10 for h in range(240))  # normalise the mean to 1
+        peak = max(diurnal(h / 10) for h in range(240)) * scale
+    t = 0.0
+    while True:
+        t += rng.expovariate(rate_per_hour * peak)
+        if t >= hours:
+            return
+        if profile == 'poisson' or rng.random() * peak < diurnal(t % 24) * scale:
+            yield t
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = {route: [] for route in ROUTES}
+        self.statuses = {route: {} for route in ROUTES}
+        self.outcomes = {}
+        self._lock = threading.Lock()
+
+    def request(self, route, call):
+        started = time.perf_counter()
+        response = call()
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.latencies[route].append(elapsed)
+            counts = self.statuses[route]
+            counts[response.status_code] = counts.get(response.status_code, 0) + 1
+        return response
+
+    def outcome(self, name):
+        with self._lock:
+            self.outcomes[name] = self.outcomes.get(name, 0) + 1
+
+
+class Scheduler:
+    """Run callables on a thread pool at wall-clock times, earliest first."""
+
+    def __init__(self, workers):
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self._events = []
+        self._order = itertools.count()
+        self._pending = 0
+        self._cond = threading.Condition()
+        self.late = []  # how far behind schedule each event started
+
+    def at(self, due, call):
+        with self._cond:
+            heapq.heappush(self._events, (due, next(self._order), call))
+            self._pending += 1
+            self._cond.notify()
+
+    def _run(self, due, call):
+        self.late.append(max(0.0, time.monotonic() - due))
+        try:
+            call()
+        finally:
+            with self._cond:
+                self._pending -= 1
+                self._cond.notify()
+
+    def run(self):
+        """Dispatch events until none are left, including ones added meanwhile."""
+        with self._cond:
+            while self._pending:
+                if not self._events:
+                    self._cond.wait()
+                    continue
+                due, _, call = self._events[0]
+                wait = due - time.monotonic()
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+                heapq.heappop(self._events)
+                self.pool.submit(self._run, due, call)
+        self.pool.shutdown()
+
+
+def drive(app_module, stats, scheduler, driver, lot, stay_seconds, rng):
+    """One driver's arrival; schedules the departure once parked."""
+    client = app_module.app.test_client()
+    username, email = f'sim{driver}', f'sim{driver}@example.com'
+    stats.request('register', lambda: client.post(
+        '/register', data={'email': email, 'username': username, 'password': 'password1'}))
+    login = stats.request('login', lambda: client.post(
+        '/login', data={'username': username, 'password': 'password1'}))
+    if login.status_code != 302:
+        stats.outcome('login failed')
+        return
+    stats.request('owners', lambda: client.get('/owners'))
+    free = _FREE_SLOT.findall(stats.request('slots', lambda: client.get(f'/slots/{lot}')).get_data(as_text=True))
+    rng.shuffle(free)
+    for slot_id in free[:BOOK_ATTEMPTS]:
+        booked = stats.request('book', lambda: client.post('/book', data={'slotId': slot_id}))
+        if booked.status_code == 200:
+            stats.outcome('parked')
+            scheduler.at(time.monotonic() + stay_seconds, lambda: depart(stats, client, slot_id))
+            return
+        if booked.status_code != 409:
+            stats.outcome(f'book {booked.status_code}')
+            return
+        stats.outcome('conflict')
+    stats.outcome('lot full' if not free else 'gave up')
+
+
+def depart(stats, client, slot_id):
+    form = {'slotId': slot_id}
+    stats.request('get_bill', lambda: client.post('/get_bill', data=form))
+    cancelled = stats.request('cancel', lambda: client.post('/cancel', data=form))
+    stats.outcome('left' if cancelled.status_code == 200 else f'cancel {cancelled.status_code}')
+
+
+def capacity_report(app_module, before, wall):
+    dynamodb_metrics = getattr(app_module, 'dynamodb_metrics', None)
+    if dynamodb_metrics is None:
+        return
+    per_table = {}
+    for (operation, table), units in dynamodb_metrics.capacity.values().items():
+        per_table[table] = per_table.get(table, 0) + units - before.get((operation, table), 0)
+    print(f"\n{'table':<16} {'units':>10} {'units/s':>9}")
+    for table, units in sorted(per_table.items()):
+        if units:
+            print(f"{table:<16} {units:>10.1f} {units / wall:>9.2f}")
+    throttles = sum(dynamodb_metrics.throttles.values().values())
+    print(f"throttled attempts: {throttles}")
+
+
+def run(args):
+    import app as app_module
+    if not args.live:
+        app_module.init_tables()
+
+    rng = random.Random(args.seed)
+    _, owner_emails = seed(app_module, args.owners, args.slots, 0, rng)
+    # Busy lots draw more drivers, in the same skew as their slot counts
+    weights = [1.0 / (rank + 1) for rank in range(len(owner_emails))]
+    arrivals = list(arrival_times(args.arrivals, args.hours, args.profile, rng))
+    print(f"{len(arrivals)} arrivals over {args.hours}h ({args.profile}), "
+          f"{args.hours * 3600 / args.speedup:.0f}s of wall time at {args.speedup}x")
+
+    dynamodb_metrics = getattr(app_module, 'dynamodb_metrics', None)
+    before = dynamodb_metrics.capacity.values() if dynamodb_metrics else {}
+    stats = Stats()
+    scheduler = Scheduler(args.workers)
+    start = time.monotonic() + 0.1
+    for driver, at in enumerate(arrivals):
+        lot = rng.choices(owner_emails, weights)[0]
+        stay_hours = rng.lognormvariate(math.log(args.stay_hours), 0.6)
+        driver_rng = random.Random(rng.random())
+        scheduler.at(start + at * 3600 / args.speedup,
+                     lambda d=driver, l=lot, s=stay_hours * 3600 / args.speedup, r=driver_rng:
+                     drive(app_module, stats, scheduler, d, l, s, r))
+    scheduler.run()
+    wall = time.monotonic() - start
+
+    total = sum(len(latencies) for latencies in stats.latencies.values())
+    print(f"\nbackend={app_module.repository.name} workers={args.workers} wall={wall:.1f}s "
+          f"requests={total} throughput={total / wall:.1f} req/s")
+    print(f"{'route':<10} {'count':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  statuses")
+    for route in ROUTES:
+        latencies = stats.latencies[route]
+        print(f"{route:<10} {len(latencies):>7} {len(latencies) / wall:>8.1f} "
+              f"{percentile(latencies, 50) * 1000:>8.2f} {percentile(latencies, 95) * 1000:>8.2f} "
+              f"{percentile(latencies, 99) * 1000:>8.2f}  {stats.statuses[route]}")
+
+    book_attempts = len(stats.latencies['book'])
+    booked = stats.statuses['book'].get(200, 0)
+    print(f"\noutcomes: {dict(sorted(stats.outcomes.items()))}")
+    if book_attempts:
+        print(f"booking conflict rate: {stats.statuses['book'].get(409, 0) / book_attempts:.1%}, "
+              f"rejected (429/503): {(stats.statuses['book'].get(429, 0) + stats.statuses['book'].get(503, 0)) / book_attempts:.1%}, "
+              f"success: {booked / book_attempts:.1%}")
+    print(f"schedule lag p99: {percentile(scheduler.late, 99) * 1000:.1f}ms "
+          f"(high means --workers is the bottleneck, not the app)")
+    capacity_report(app_module, before, wall)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--owners', type=int, default=50)
+    parser.add_argument('--slots', type=int, default=2000)
+    parser.add_argument('--arrivals', type=float, default=600,
+                        help='mean driver arrivals per simulated hour, over all lots')
+    parser.add_argument('--profile', choices=('diurnal', 'poisson'), default='diurnal')
+    parser.add_argument('--hours', type=float, default=24, help='simulated hours')
+    parser.add_argument('--stay-hours', type=float, default=1.5, help='median stay')
+    parser.add_argument('--speedup', type=float, default=1440,
+                        help='simulated seconds per wall-clock second')
+    parser.add_argument('--workers', type=int, default=32)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--rate-limit', action='store_true', help='keep per-user/per-lot rate limiting on')
+    parser.add_argument('--backend', choices=BACKENDS, default='dynamodb')
+    parser.add_argument('--live', action='store_true',
+                        help='run against real DynamoDB instead of moto')
+    args = parser.parse_args()
+    if args.rate_limit:
+        os.environ['RATE_LIMIT_ENABLED'] = '1'
+    select_backend(args.backend)
+
+    with dynamodb_standin(args.live):
+        run(args)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""Parking charges.
+
+A Tariff is a base hourly rate plus optional later tiers and a grace
+period. Owners carry it as costPerHour, graceMinutes and tiers (a list of
+{'fromHours', 'costPerHour'} maps: from that many hours into a stay the
+tier's rate applies instead). Bookings carry a copy of the same keys in
+their tariff attribute.
+
+compute_charge bills one stay with Decimal arithmetic. accrued_charges
+bills many open stays at once; it works in integer seconds and scaled
+integer rates so its results match compute_charge to the paisa, and uses
+NumPy when it is installed.
+"""
+from datetime import date, datetime, time
+from decimal import Decimal, ROUND_HALF_UP
+
+PAISA = Decimal('0.01')
+RATE_SCALE = 10000  # rates are held to 4 decimal places for batch math
+
+
+class BillingError(ValueError):
+    pass
+
+
+class Tariff:
+    def __init__(self, cost_per_hour, grace_minutes=0, tiers=None):
+        self.grace_seconds = int(grace_minutes or 0) * 60
+        # [(start_second, rate)] sorted, the first band always starts at 0
+        bands = {0: _rate(cost_per_hour)}
+        for tier in tiers or []:
+            bands[int(Decimal(str(tier['fromHours'])) * 3600)] = _rate(tier['costPerHour'])
+        self.bands = sorted(bands.items())
+
+    @property
+    def cost_per_hour(self):
+        return self.bands[0][1]
+
+
+def _rate(value):
+    return Decimal(str(value)).quantize(Decimal(1) / RATE_SCALE, rounding=ROUND_HALF_UP)
+
+
+def tariff_from_owner(owner):
+    """Build a Tariff from an owner record or a booking's tariff snapshot."""
+    return Tariff(owner.get('costPerHour', 0), owner.get('graceMinutes', 0), owner.get('tiers'))
+
+
+def tariff_snapshot(owner):
+    """Return the owner's tariff settings as a map to store on a booking.
+
+    Bills are computed from the snapshot, so a price change mid-stay does
+    not affect bookings already made.
+    """
+    snapshot = {'costPerHour': owner.get('costPerHour', 0)}
+    if owner.get('graceMinutes'):
+        snapshot['graceMinutes'] = owner['graceMinutes']
+    if owner.get('tiers'):
+        snapshot['tiers'] = owner['tiers']
+    return snapshot
+
+
+def booking_start(slot):
+    """Return the check-in datetime of a booked slot.
+
+    Raises ValueError or TypeError if bookingDate/checkinTime are missing or
+    malformed.
+    """
+    return datetime.combine(
+        date.fromisoformat(slot.get('bookingDate')),
+        time.fromisoformat(slot.get('checkinTime'))
+    )
+
+
+def compute_charge(tariff, start, end):
+    """Return the charge for a stay from start to end, rounded to the paisa."""
+    seconds = int((end - start).total_seconds())
+    if seconds < 0:
+        raise BillingError('Invalid booking time')
+    if seconds <= tariff.grace_seconds:
+        return Decimal('0.00')
+    amount = Decimal(0)
+    for index, (band_start, rate) in enumerate(tariff.bands):
+        band_end = tariff.bands[index + 1][0] if index + 1 < len(tariff.bands) else None
+        covered = min(seconds, band_end) - band_start if band_end is not None else seconds - band_start
+        if covered > 0:
+            amount += rate * covered
+    return (amount / 3600).quantize(PAISA, rounding=ROUND_HALF_UP)
+
+
+def accrued_charges(tariff, starts, now):
+    """Return the charge so far for each stay in starts, as a list of Decimals.
+
+    Stays that start after now are charged nothing.
+    """
+    try:
+        import numpy as np  # only the sweeper bills in batches, so keep it off cold starts
+    except ImportError:  # pragma: no cover - NumPy is optional
+        np = None
+    if np is None:
+        return [compute_charge(tariff, start, now) if start <= now else Decimal('0.00')
+                for start in starts]
+    if not starts:
+        return []
+    # Same wall-clock arithmetic as compute_charge, so a stay that crosses a
+    # DST change bills the same either way
+    seconds = np.fromiter(((now - start).total_seconds() for start in starts),
+                          dtype=np.float64, count=len(starts))
+    seconds = np.maximum(np.floor(seconds), 0).astype(np.int64)
+
+    # Sum rate * seconds over the bands in units of 1/(3600 * RATE_SCALE) rupee
+    numerator = np.zeros(len(starts), dtype=np.int64)
+    for index, (band_start, rate) in enumerate(tariff.bands):
+        band_end = tariff.bands[index + 1][0] if index + 1 < len(tariff.bands) else None
+        upper = seconds if band_end is None else np.minimum(seconds, band_end)
+        covered = np.maximum(upper - band_start, 0)
+        numerator += covered * int(rate * RATE_SCALE)
+    numerator[seconds <= tariff.grace_seconds] = 0
+
+    # Round half up to the paisa with integer arithmetic only
+    denominator = 3600 * RATE_SCALE
+    paise = (numerator * 100 + denominator // 2) // denominator
+    return [Decimal(int(p)).scaleb(-2) for p in paise]
@@ -0,0 +1,161 @@
+"""Small read-through caches used in front of DynamoDB lookups.
+
+TTLCache is a bounded in-process LRU with per-entry expiry. RedisCache has
+the same interface and is used when a shared cache URL is configured, so
+several workers see each other's invalidations; it stores values as JSON,
+with Decimals kept exact, so only plain data can be cached. VersionStamps
+and RedisVersionStamps do the same for the version counters that key
+cached listing pages and their ETags.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from storage import dumps, loads
+
+
+class TTLCache:
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class RedisCache:
+    def __init__(self, url, prefix='cache:', ttl=300):
+        import redis  # optional dependency, only needed for a shared cache
+        self.prefix = prefix
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        raw = self._client.get(self.prefix + key)
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return loads(raw)
+
+    def set(self, key, value):
+        self._client.setex(self.prefix + key, self.ttl, dumps(value))
+
+    def delete(self, key):
+        self._client.delete(self.prefix + key)
+
+    def clear(self):
+        for key in self._client.scan_iter(match=self.prefix + '*'):
+            self._client.delete(key)
+
+
+def make_cache(name, maxsize=1024, ttl=300, url=None):
+    """Return a shared RedisCache when url is set, else an in-process TTLCache."""
+    if url:
+        return RedisCache(url, prefix=f'{name}:', ttl=ttl)
+    return TTLCache(maxsize=maxsize, ttl=ttl)
+
+
+class VersionStamps:
+    """Per-key version counters, bumped on writes to version cached views.
+
+    Stamps are local to the process. They carry a random token so they never
+    collide with another worker's or an earlier run's, and they roll over
+    every ttl seconds so writes made by other workers show up within that
+    window.
+    """
+
+    def __init__(self, ttl=30):
+        self.ttl = ttl
+        self._token = os.urandom(4).hex()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def _stamp(self, key):
+        return f'{self._token}.{int(time.monotonic() // self.ttl)}.{self._versions.get(key, 0)}'
+
+    def get(self, key):
+        with self._lock:
+            return self._stamp(key)
+
+    def get_many(self, keys):
+        with self._lock:
+            return [self._stamp(key) for key in keys]
+
+    def bump(self, key):
+        with self._lock:
+            self._versions[key] = self._versions.get(key, 0) + 1
+
+
+class RedisVersionStamps:
+    """VersionStamps kept in Redis, so every worker sees every bump."""
+
+    def __init__(self, url, prefix='version:'):
+        import redis  # optional dependency, only needed for a shared cache
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        return self.get_many([key])[0]
+
+    def get_many(self, keys):
+        names = [self.prefix + key for key in keys]
+        values = self._client.mget(names) if names else []
+        missing = [name for name, value in zip(names, values) if value is None]
+        if missing:
+            # Seed from the clock so a flushed Redis doesn't reissue old stamps
+            seed = time.time_ns()
+            pipe = self._client.pipeline()
+            for name in missing:
+                pipe.set(name, seed, nx=True)
+            pipe.execute()
+            values = self._client.mget(names)
+        return [value.decode() for value in values]
+
+    def bump(self, key):
+        name = self.prefix + key
+        pipe = self._client.pipeline()
+        pipe.set(name, time.time_ns(), nx=True)
+        pipe.incr(name)
+        pipe.execute()
+
+
+def make_versions(name, ttl=30, url=None):
+    """Return shared RedisVersionStamps when url is set, else VersionStamps."""
+    if url:
+        return RedisVersionStamps(url, prefix=f'{name}:')
+    return VersionStamps(ttl=ttl)
@@ -0,0 +1,124 @@
+"""In-process pub/sub for live slot updates.
+
+Each lot (owner email) is a channel. Request handlers publish slot deltas
+with ``broker.publish(owner_email, event)`` and the SSE endpoint holds a
+subscription queue per connected browser. With a single worker the local
+fan-out is all that is needed; for several workers, RedisFanout relays
+every publish through Redis so each process delivers it to its own
+subscribers.
+"""
+import json
+import logging
+import queue
+import random
+import threading
+import time
+
+log = logging.getLogger('parking.events')
+
+RECONNECT_BASE_DELAY = 0.5
+RECONNECT_MAX_DELAY = 30.0
+
+
+class EventBroker:
+    def __init__(self, max_queue=100):
+        self.max_queue = max_queue
+        self.fanout = None
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel):
+        subscription = queue.Queue(maxsize=self.max_queue)
+        with self._lock:
+            self._channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, channel, subscription):
+        with self._lock:
+            subscribers = self._channels.get(channel)
+            if subscribers:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._channels[channel]
+
+    def subscriber_count(self, channel=None):
+        with self._lock:
+            if channel is not None:
+                return len(self._channels.get(channel, ()))
+            return sum(len(subscribers) for subscribers in self._channels.values())
+
+    def publish(self, channel, event):
+        if self.fanout is not None:
+            self.fanout.publish(channel, event)
+        else:
+            self.deliver(channel, event)
+
+    def deliver(self, channel, event):
+        # Never block a request on a slow browser: drop the oldest event
+        # for subscribers whose queue is full; the client resyncs on reconnect.
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.put_nowait(event)
+            except queue.Full:
+                try:
+                    subscription.get_nowait()
+                except queue.Empty:
+                    pass
+                try:
+                    subscription.put_nowait(event)
+                except queue.Full:
+                    pass
+
+
+class RedisFanout:
+    """Relay publishes through Redis pub/sub to every worker process."""
+
+    def __init__(self, broker, url, prefix='slots:'):
+        import redis  # optional dependency, only needed for multi-worker fan-out
+        self.broker = broker
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+        self._pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.psubscribe(self.prefix + '*')
+        self._thread = threading.Thread(target=self._listen, name='slot-events-fanout', daemon=True)
+        self._thread.start()
+
+    def publish(self, channel, event):
+        self._client.publish(self.prefix + channel, json.dumps(event, default=str))
+
+    def _listen(self):
+        # Losing Redis must not leave this worker's subscribers silent until
+        # a restart, so resubscribe with jittered exponential backoff
+        failures = 0
+        while True:
+            try:
+                if self._pubsub is None:
+                    self._pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+                    self._pubsub.psubscribe(self.prefix + '*')
+                    log.info("Resubscribed to slot events")
+                for message in self._pubsub.listen():
+                    failures = 0
+                    channel = message['channel']
+                    if isinstance(channel, bytes):
+                        channel = channel.decode()
+                    self.broker.deliver(channel[len(self.prefix):], json.loads(message['data']))
+            except Exception as e:
+                failures += 1
+                delay = min(RECONNECT_MAX_DELAY, RECONNECT_BASE_DELAY * 2 ** (failures - 1))
+                log.error("Slot event relay lost (%s), reconnecting in up to %.1fs", e, delay)
+                try:
+                    self._pubsub.close()
+                except Exception:
+                    pass
+                self._pubsub = None
+                time.sleep(random.uniform(delay / 2, delay))
+
+
+def make_broker(url=None):
+    """Return a broker, relaying through Redis when url is set."""
+    broker = EventBroker()
+    if url:
+        broker.fanout = RedisFanout(broker, url)
+    return broker
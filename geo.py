@@ -0,0 +1,120 @@
+"""Geohash indexing and nearest-lot search.
+
+Owners with coordinates carry a precision-9 geohash (about 5 m). Lots in
+the same cell share a geohash prefix, so "lots near here" is a handful of
+prefix range reads on an index: the cell holding the point plus its eight
+neighbours, starting small and widening until enough lots are found.
+
+Every lot within min(cell width, cell height) of the point lies inside
+that 3x3 block, so results within that radius are exactly the nearest.
+The widest block searched is at SEARCH_PRECISIONS[-1] (about 20 km at
+precision 4); lots past it are not found.
+"""
+import math
+
+GEOHASH_PRECISION = 9
+# Precision of the index partition key; prefixes shorter than this can't be queried
+PARTITION_PRECISION = 4
+SEARCH_PRECISIONS = (6, 5, 4)
+EARTH_RADIUS_KM = 6371.0088
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+_DECODE = {c: i for i, c in enumerate(_BASE32)}
+
+
+def encode(lat, lon, precision=GEOHASH_PRECISION):
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, coord = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        value <<= 1
+        if coord >= mid:
+            value |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def bounds(geohash):
+    """Return (min_lat, min_lon, max_lat, max_lon) of a geohash cell."""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = _DECODE[char]
+        for shift in range(4, -1, -1):
+            rng = lon_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if value >> shift & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+    return lat_range[0], lon_range[0], lat_range[1], lon_range[1]
+
+
+def block(lat, lon, precision):
+    """Return the cell holding (lat, lon) and its neighbours, center first."""
+    min_lat, min_lon, max_lat, max_lon = bounds(encode(lat, lon, precision))
+    height, width = max_lat - min_lat, max_lon - min_lon
+    center_lat, center_lon = (min_lat + max_lat) / 2, (min_lon + max_lon) / 2
+    cells = []
+    for dlat, dlon in ((0, 0), (1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1)):
+        cell_lat = center_lat + dlat * height
+        if not -90 < cell_lat < 90:
+            continue
+        cell_lon = (center_lon + dlon * width + 180) % 360 - 180
+        cell = encode(cell_lat, cell_lon, precision)
+        if cell not in cells:
+            cells.append(cell)
+    return cells
+
+
+def exact_radius_km(lat, lon, precision):
+    """Radius around (lat, lon) inside which block() finds every lot."""
+    min_lat, min_lon, max_lat, max_lon = bounds(encode(lat, lon, precision))
+    km_per_degree = math.pi * EARTH_RADIUS_KM / 180
+    return min((max_lat - min_lat) * km_per_degree,
+               (max_lon - min_lon) * km_per_degree * math.cos(math.radians(min(abs(lat), 89.9))))
+
+
+def distance_km(lat1, lon1, lat2, lon2):
+    """Great-circle (haversine) distance."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def nearby(find_by_prefix, lat, lon, limit, accept=None, max_distance_km=None):
+    """Return up to limit (distance_km, item) pairs, nearest first.
+
+    find_by_prefix(prefix) returns the items whose geohash starts with
+    prefix. accept(items), if given, returns the subset of newly found items
+    to keep, so filters that need a lookup run once per candidate.
+    """
+    found = {}
+    for precision in SEARCH_PRECISIONS:
+        new = []
+        for cell in block(lat, lon, precision):
+            for item in find_by_prefix(cell):
+                if item['email'] not in found:
+                    found[item['email']] = None
+                    new.append(item)
+        for item in (accept(new) if accept else new):
+            found[item['email']] = (distance_km(lat, lon, float(item['lat']), float(item['lon'])), item)
+        ranked = sorted((hit for hit in found.values() if hit), key=lambda hit: hit[0])
+        if max_distance_km is not None:
+            ranked = [hit for hit in ranked if hit[0] <= max_distance_km]
+        radius = exact_radius_km(lat, lon, precision)
+        if max_distance_km is not None and max_distance_km <= radius:
+            return ranked[:limit]
+        if len([hit for hit in ranked if hit[0] <= radius]) >= limit:
+            return ranked[:limit]
+    return ranked[:limit]
@@ -0,0 +1,232 @@
+"""Minimal Prometheus-style metrics for request and DynamoDB timings.
+
+Counters and histograms are plain dicts behind a lock, so recording a
+sample is a couple of dict operations. Registry.render() produces the
+Prometheus text exposition format served at /metrics.
+
+instrument_app() times every Flask request. DynamoDBMetrics.attach() hooks
+botocore's event system on a DynamoDB client to count calls, time them,
+and collect consumed capacity and throttles.
+"""
+import threading
+from bisect import bisect_left
+from time import perf_counter
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Error codes DynamoDB answers with when a table or account is out of capacity
+THROTTLE_CODES = {
+    'ProvisionedThroughputExceededException',
+    'ThrottlingException',
+    'RequestLimitExceeded',
+}
+
+# Operations that accept ReturnConsumedCapacity
+CAPACITY_OPERATIONS = {
+    'GetItem', 'PutItem', 'UpdateItem', 'DeleteItem', 'Query', 'Scan',
+    'BatchGetItem', 'BatchWriteItem', 'TransactGetItems', 'TransactWriteItems',
+}
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        return self._values.get(label_values, 0)
+
+    def values(self):
+        """Return {label values: count} for every series."""
+        with self._lock:
+            return dict(self._values)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for label_values, value in items:
+            yield self.name + _format_labels(self.labels, label_values), value
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(k, list(v[0]), v[1], v[2]) for k, v in self._series.items()]
+        for label_values, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                yield (self.name + '_bucket'
+                       + _format_labels(self.labels, label_values, f'le="{bound}"'), cumulative)
+            yield self.name + '_sum' + _format_labels(self.labels, label_values), total
+            yield self.name + '_count' + _format_labels(self.labels, label_values), count
+
+
+class Gauge:
+    """A value read from a callback at scrape time."""
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, read, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._read = read
+
+    def samples(self):
+        value = self._read()
+        if isinstance(value, dict):
+            for label_values, v in value.items():
+                yield self.name + _format_labels(self.labels, label_values), v
+        else:
+            yield self.name, value
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self.register(Counter(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def gauge(self, name, help_text, read, labels=()):
+        return self.register(Gauge(name, help_text, read, labels))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for sample, value in metric.samples():
+                lines.append(f'{sample} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+class RequestMetrics:
+    def __init__(self, registry):
+        self.latency = registry.histogram(
+            'http_request_duration_seconds', 'Flask request latency by endpoint.', ('endpoint',))
+        self.requests = registry.counter(
+            'http_requests_total', 'Flask requests by endpoint, method and status.',
+            ('endpoint', 'method', 'status'))
+
+
+def instrument_app(app, registry):
+    from flask import g, request
+
+    request_metrics = RequestMetrics(registry)
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_started = perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        started = g.pop('metrics_started', None)
+        if started is not None:
+            endpoint = request.endpoint or 'unmatched'
+            request_metrics.latency.observe(perf_counter() - started, endpoint)
+            request_metrics.requests.inc(endpoint, request.method, str(response.status_code))
+        return response
+
+    return request_metrics
+
+
+class DynamoDBMetrics:
+    def __init__(self, registry, consumed_capacity=True):
+        self.consumed_capacity = consumed_capacity
+        self.calls = registry.counter(
+            'dynamodb_calls_total', 'DynamoDB API calls by operation.', ('operation',))
+        self.latency = registry.histogram(
+            'dynamodb_call_duration_seconds', 'DynamoDB call latency including retries.', ('operation',))
+        self.capacity = registry.counter(
+            'dynamodb_consumed_capacity_units_total', 'Capacity units consumed by operation and table.',
+            ('operation', 'table'))
+        self.throttles = registry.counter(
+            'dynamodb_throttles_total', 'Throttled DynamoDB attempts by operation.', ('operation',))
+        self.errors = registry.counter(
+            'dynamodb_errors_total', 'Failed DynamoDB calls by operation and error code.',
+            ('operation', 'code'))
+
+    def request_capacity(self, params, model, **kwargs):
+        if model.name in CAPACITY_OPERATIONS and 'ReturnConsumedCapacity' not in params:
+            params['ReturnConsumedCapacity'] = 'TOTAL'
+
+    def before_call(self, model, context, **kwargs):
+        context['metrics_started'] = perf_counter()
+
+    def after_call(self, model, parsed, context, **kwargs):
+        operation = model.name
+        started = context.get('metrics_started')
+        if started is not None:
+            self.latency.observe(perf_counter() - started, operation)
+        self.calls.inc(operation)
+        code = (parsed.get('Error') or {}).get('Code')
+        if code:
+            self.errors.inc(operation, code)
+        consumed = parsed.get('ConsumedCapacity')
+        if isinstance(consumed, dict):
+            consumed = [consumed]
+        for entry in consumed or []:
+            self.capacity.inc(operation, entry.get('TableName', ''), amount=entry.get('CapacityUnits', 0))
+
+    def needs_retry(self, response=None, operation=None, **kwargs):
+        # Called once per attempt; count throttled attempts, never decide retries
+        if response and operation is not None:
+            code = (response[1].get('Error') or {}).get('Code')
+            if code in THROTTLE_CODES:
+                self.throttles.inc(operation.name)
+
+    def attach(self, client):
+        events = client.meta.events
+        if self.consumed_capacity:
+            events.register('before-parameter-build.dynamodb', self.request_capacity)
+        events.register('before-call.dynamodb', self.before_call)
+        events.register('after-call.dynamodb', self.after_call)
+        events.register('needs-retry.dynamodb', self.needs_retry)
@@ -0,0 +1,84 @@
+"""Token-bucket rate limiting for the booking routes.
+
+Each key (a user, a lot) has a bucket of up to burst tokens that refills at
+rate tokens per second. A request takes one token, or is refused with the
+number of seconds until one is available, which becomes the 429's
+Retry-After.
+
+TokenBuckets keeps the buckets in process, so with several workers each
+one admits its own share. RedisTokenBuckets keeps them in Redis and takes
+tokens with a Lua script, so every worker draws from the same bucket.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class TokenBuckets:
+    def __init__(self, rate, burst, maxsize=10000):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, cost=1):
+        """Take cost tokens from key's bucket; return 0, or seconds to wait."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= cost:
+                tokens -= cost
+                wait = 0.0
+            else:
+                wait = (cost - tokens) / self.rate
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            # The least recently used bucket has refilled the longest, so
+            # dropping it (back to a full bucket) costs the least accuracy
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+            return wait
+
+
+# KEYS[1] = bucket; ARGV = rate, burst, cost. Uses the Redis clock so workers
+# with skewed clocks agree. Returns the wait in milliseconds, 0 if admitted.
+_TAKE_SCRIPT = """
+local rate, burst, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    wait = math.ceil((cost - tokens) / rate * 1000)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return wait
+"""
+
+
+class RedisTokenBuckets:
+    def __init__(self, url, rate, burst, prefix='ratelimit:'):
+        import redis  # optional dependency, only needed for shared limits
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+        self._take = self._client.register_script(_TAKE_SCRIPT)
+
+    def take(self, key, cost=1):
+        return self._take(keys=[self.prefix + key], args=[self.rate, self.burst, cost]) / 1000.0
+
+
+def make_limiter(name, rate, burst, url=None):
+    """Return shared RedisTokenBuckets when url is set, else TokenBuckets."""
+    if url:
+        return RedisTokenBuckets(url, rate, burst, prefix=f'{name}:')
+    return TokenBuckets(rate, burst)
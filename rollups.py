@@ -0,0 +1,112 @@
+"""Occupancy and revenue rollups for owner dashboards.
+
+Rows are keyed per lot by bucket '<granularity>#<period>#<scope>':
+
+    HOUR#2024-05-01T14#TOTAL     DAY#2024-05-01#FLOOR#2
+
+so every row of a month, at either granularity and for the lot and all of
+its floors, shares a prefix ('DAY#2024-05') and is one range read. Each row
+holds occupiedMinutes, bookings and revenue.
+
+Rows are updated incrementally from the same booking history entries that
+backfill() replays, so both paths always agree:
+    - 'booked' adds a booking to the check-in hour and day
+    - 'checkout' spreads the stay's minutes over the hours and days it
+      covered and adds the bill to the checkout hour and day
+"""
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+METRICS = ('occupiedMinutes', 'bookings', 'revenue')
+GRANULARITIES = {'HOUR': 13, 'DAY': 10}   # period = ISO time cut to this length
+MINUTE = Decimal('0.01')
+
+
+def bucket(granularity, instant, scope):
+    return f'{granularity}#{instant.isoformat()[:GRANULARITIES[granularity]]}#{scope}'
+
+
+def split_bucket(key):
+    """Return (granularity, period, scope) of a bucket key."""
+    granularity, period, scope = key.split('#', 2)
+    return granularity, period, scope
+
+
+def _scopes(entry):
+    floor = entry.get('floorNumber')
+    return ('TOTAL',) if floor is None else ('TOTAL', f'FLOOR#{floor}')
+
+
+def _add(deltas, instant, scopes, metric, amount):
+    for granularity in GRANULARITIES:
+        for scope in scopes:
+            row = deltas.setdefault(bucket(granularity, instant, scope), {})
+            row[metric] = row.get(metric, 0) + amount
+
+
+def _hours(start, end):
+    # Yield (hour start, minutes of [start, end) inside that hour)
+    hour = start.replace(minute=0, second=0, microsecond=0)
+    while hour < end:
+        following = hour + timedelta(hours=1)
+        overlap = min(end, following) - max(start, hour)
+        yield hour, Decimal(overlap.total_seconds()) / 60
+        hour = following
+
+
+def entry_deltas(entry):
+    """Return {bucket: {metric: amount}} contributed by one history entry."""
+    deltas = {}
+    scopes = _scopes(entry)
+    if entry['event'] == 'booked':
+        _add(deltas, datetime.fromisoformat(f"{entry['bookingDate']}T{entry['checkinTime']}"), scopes, 'bookings', 1)
+    elif entry['event'] == 'checkout':
+        checkout = datetime.fromisoformat(entry['at'])
+        if entry.get('bookingDate') and entry.get('checkinTime'):
+            checkin = datetime.fromisoformat(f"{entry['bookingDate']}T{entry['checkinTime']}")
+            for hour, minutes in _hours(checkin, checkout):
+                _add(deltas, hour, scopes, 'occupiedMinutes', minutes)
+        if entry.get('bill') is not None:
+            _add(deltas, checkout, scopes, 'revenue', Decimal(entry['bill']))
+    for row in deltas.values():
+        if 'occupiedMinutes' in row:
+            row['occupiedMinutes'] = row['occupiedMinutes'].quantize(MINUTE)
+    return deltas
+
+
+def merge(into, deltas):
+    for key, row in deltas.items():
+        target = into.setdefault(key, {})
+        for metric, amount in row.items():
+            target[metric] = target.get(metric, 0) + amount
+    return into
+
+
+def backfill(entries):
+    """Return the rollup rows {bucket: metrics} for a lot's history entries."""
+    rows = {}
+    for entry in entries:
+        try:
+            merge(rows, entry_deltas(entry))
+        except (KeyError, TypeError, ValueError):
+            continue  # entries with incomplete booking details add nothing
+    return rows
+
+
+def summarize(rows, granularity):
+    """Shape rollup rows for the dashboard API, periods in order."""
+    periods = {}
+    totals = dict.fromkeys(METRICS, 0)
+    for row in rows:
+        row_granularity, period, scope = split_bucket(row['bucket'])
+        if row_granularity != granularity:
+            continue
+        metrics = {metric: row.get(metric, 0) for metric in METRICS}
+        summary = periods.setdefault(period, {'period': period, 'total': dict.fromkeys(METRICS, 0), 'floors': {}})
+        if scope == 'TOTAL':
+            summary['total'] = metrics
+            for metric in METRICS:
+                totals[metric] += metrics[metric]
+        elif scope.startswith('FLOOR#'):
+            summary['floors'][scope[len('FLOOR#'):]] = metrics
+    return {'totals': totals, 'periods': [periods[period] for period in sorted(periods)]}
@@ -0,0 +1,399 @@
+"""Storage backends for users, lots (owners), slots, reservations and history.
+
+Every backend implements the Repository interface below. app.py talks to
+exactly one of them, picked by make_repository():
+
+    STORAGE_BACKEND=dynamodb   DynamoDBRepository (default)
+    STORAGE_BACKEND=memory     MemoryRepository, process-local and thread-safe
+    STORAGE_BACKEND=sqlite     SQLiteRepository at SQLITE_PATH (default parking.db)
+
+Items are plain dicts with the same attribute names in every backend.
+Numbers that DynamoDB would hand back as Decimal are Decimals everywhere.
+
+Reservations hold a slot for a future window. Times are local ISO strings
+('2024-05-01T14:00:00'), which sort in time order. Windows on one slot never
+overlap, and none is longer than RESERVATION_MAX_HOURS, so every backend
+finds the reservations overlapping a window with one range lookup on start,
+per slot or per lot, instead of looking at every booking.
+
+Booking history is append-only: one entry per booking and per checkout,
+ordered by eventKey ('<at>#<slotId>#<event>') within the lot and within the
+user, so a user's past bookings or a lot's audit trail for a period is one
+range read. Entries with expiresAt (epoch seconds) are dropped after it.
+
+Rollups are per-lot rows of summed metrics keyed by bucket; see rollups.py
+for the bucket layout. Backends only add to rows, read them by bucket
+prefix and replace a lot's rows wholesale for backfills.
+"""
+import base64
+import json
+import os
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+
+class SlotConflict(Exception):
+    """Raised when a conditional slot update loses.
+
+    ``slot`` holds the item as it was when the condition failed, or None
+    if the slot does not exist.
+    """
+    def __init__(self, slot):
+        super().__init__('Slot condition check failed')
+        self.slot = slot
+
+
+class ReservationConflict(Exception):
+    """Raised when a reservation or booking overlaps someone's reservation.
+
+    ``reservation`` is the reservation in the way, or None if concurrent
+    writers kept the check from settling.
+    """
+    def __init__(self, reservation):
+        super().__init__('Reservation overlaps another')
+        self.reservation = reservation
+
+
+class Throttled(Exception):
+    """Raised when the store kept refusing a call for lack of capacity.
+
+    Backends retry throttled calls before giving up, so this means the
+    store is overloaded, not that an item is missing. ``retry_after`` is a
+    suggested wait in seconds.
+    """
+    def __init__(self, operation, code, attempts, retry_after=1.0):
+        super().__init__(f'{operation} throttled ({code}) after {attempts} attempts')
+        self.operation = operation
+        self.code = code
+        self.attempts = attempts
+        self.retry_after = retry_after
+
+
+# Attributes that describe the current booking of a slot; release clears them.
+# tariff and orgName are the owner's rate and display name as they were when
+# the slot was booked, so billing never needs a second read. holdUntil is the
+# start of the slot's next reservation, or None if the stay is open-ended.
+# overstayAt is set by the overstay sweeper once the stay ran past its expiry.
+BOOKING_FIELDS = ('bookingDate', 'checkinTime', 'tariff', 'orgName', 'holdUntil', 'overstayAt')
+
+RESERVATION_MAX_HOURS = int(os.environ.get('RESERVATION_MAX_HOURS', '24'))
+
+BATCH_WRITE_SIZE = 25
+
+
+def encode_cursor(last_key):
+    """Return an opaque continuation token for a backend's last-seen key."""
+    if not last_key:
+        return None
+    raw = json.dumps(last_key, sort_keys=True, default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        last_key = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+    if not isinstance(last_key, dict):
+        raise ValueError('Invalid cursor')
+    return last_key
+
+
+def _encode_value(value):
+    # Keep Decimals exact, the way DynamoDB hands them back
+    if isinstance(value, Decimal):
+        return {'$decimal': str(value)}
+    raise TypeError(f'Cannot store {type(value).__name__}')
+
+
+def _decode_object(obj):
+    if len(obj) == 1 and '$decimal' in obj:
+        return Decimal(obj['$decimal'])
+    return obj
+
+
+def dumps(item):
+    """Serialize an item to compact JSON, Decimals included (see loads)."""
+    return json.dumps(item, default=_encode_value, separators=(',', ':'))
+
+
+def loads(data):
+    return json.loads(data, object_hook=_decode_object) if data is not None else None
+
+
+def project(item, fields):
+    if item is None or not fields:
+        return item
+    return {k: v for k, v in item.items() if k in fields}
+
+
+def is_free(slot):
+    return not slot.get('status')
+
+
+def shift_time(instant, **delta):
+    """Return the ISO time instant moved by timedelta(**delta)."""
+    return (datetime.fromisoformat(instant) + timedelta(**delta)).isoformat(timespec='seconds')
+
+
+def earliest_overlapping_start(start):
+    # Nothing longer than RESERVATION_MAX_HOURS, so older starts end before start
+    return shift_time(start, hours=-RESERVATION_MAX_HOURS)
+
+
+def overlaps(reservation, start, end):
+    return reservation['start'] < end and reservation['end'] > start
+
+
+def booking_instant(booking):
+    return f"{booking['bookingDate']}T{booking['checkinTime']}"[:19]
+
+
+def stay_blocks(slot, start):
+    """True if the slot's current booking may still be running at start."""
+    if is_free(slot):
+        return False
+    return not slot.get('holdUntil') or slot['holdUntil'] > start
+
+
+def stay_token(slot):
+    """Identify one stay of a slot; a new booking of the slot gets a new token."""
+    return slot.get('status'), slot.get('bookingDate'), slot.get('checkinTime')
+
+
+def history_key(entry):
+    return f"{entry['at']}#{entry['slotId']}#{entry['event']}"
+
+
+def history_expired(entry, now):
+    return bool(entry.get('expiresAt')) and entry['expiresAt'] <= now
+
+
+def owner_matches(owner, org_type=None, max_price=None):
+    if org_type and owner.get('orgType') != org_type:
+        return False
+    return max_price is None or owner.get('costPerHour') is not None and owner['costPerHour'] <= max_price
+
+
+def summarize_counters(owner_email, rows):
+    """Build an availability summary from (scope, free, occupied) rows.
+
+    The lot total may be split over 'TOTAL' and 'TOTAL#<n>' shard rows,
+    which are summed.
+    """
+    summary = {'ownerEmail': owner_email, 'free': 0, 'occupied': 0, 'floors': {}}
+    for scope, free, occupied in rows:
+        counts = {'free': int(free or 0), 'occupied': int(occupied or 0)}
+        if scope == 'TOTAL' or scope.startswith('TOTAL#'):
+            summary['free'] += counts['free']
+            summary['occupied'] += counts['occupied']
+        elif scope.startswith('FLOOR#'):
+            summary['floors'][scope[len('FLOOR#'):]] = counts
+    return summary
+
+
+def count_slots(slots):
+    """Return {floorNumber: {'free', 'occupied'}} for the given slots."""
+    counts = {}
+    for slot in slots:
+        floor = counts.setdefault(slot.get('floorNumber'), {'free': 0, 'occupied': 0})
+        floor['free' if is_free(slot) else 'occupied'] += 1
+    return counts
+
+
+class Repository:
+    """Interface shared by all storage backends.
+
+    Lookups return None (or an empty result) when nothing matches and raise
+    on backend failures; callers decide how to report errors.
+    """
+    name = None
+
+    def init_schema(self):
+        """Create whatever tables/indexes the backend needs. Returns True on success."""
+        raise NotImplementedError
+
+    # Users
+    def find_user_by_email(self, email):
+        raise NotImplementedError
+
+    def find_user_by_username(self, username):
+        raise NotImplementedError
+
+    def save_user(self, user):
+        raise NotImplementedError
+
+    # Owners
+    def find_owner_by_email(self, email):
+        raise NotImplementedError
+
+    def save_owner(self, owner):
+        raise NotImplementedError
+
+    def find_owners_page(self, limit, cursor=None, fields=None):
+        """Return (owners, next_cursor); next_cursor is None on the last page."""
+        raise NotImplementedError
+
+    def iter_owners(self, segments=None):
+        """Yield every owner, streaming where the backend allows it."""
+        raise NotImplementedError
+
+    def find_owners_by_geohash(self, prefix, org_type=None, max_price=None):
+        """Return owners whose geohash starts with prefix (see geo.py).
+
+        Only owners with coordinates are indexed. org_type and max_price
+        (costPerHour at most) filter the result.
+        """
+        raise NotImplementedError
+
+    # Slots
+    def find_slot_by_id(self, slot_id):
+        raise NotImplementedError
+
+    def find_slot_meta(self, slot_id):
+        """Return the immutable {'ownerEmail', 'floorNumber'} of a slot, or None."""
+        raise NotImplementedError
+
+    def find_slots_by_owner_email(self, owner_email):
+        raise NotImplementedError
+
+    def find_slots_page(self, owner_email, limit, cursor=None, floor_number=None, fields=None):
+        """Return (slots, next_cursor) for one lot, optionally one floor only."""
+        raise NotImplementedError
+
+    def save_slot(self, slot):
+        """Overwrite a slot as-is, without touching the counters."""
+        raise NotImplementedError
+
+    def create_slot(self, slot):
+        """Insert a new free slot and count it, atomically."""
+        raise NotImplementedError
+
+    def batch_create_slots(self, slots):
+        """Insert many free slots; yield a progress dict per batch.
+
+        Progress dicts have batch, written, failed and attempts keys.
+        """
+        raise NotImplementedError
+
+    def claim_slot(self, slot_id, email, booking):
+        """Book a free slot for email, setting the booking fields.
+
+        The slot and its counters change atomically. holdUntil is set to the
+        start of the slot's next reservation. Returns the booked slot, raises
+        SlotConflict if the slot is missing or already held and
+        ReservationConflict if someone else has it reserved right now, or
+        with None if concurrent writers kept the update from settling.
+        """
+        raise NotImplementedError
+
+    def release_slot(self, slot_id, email):
+        """Free a slot held by email; return it as it was before release.
+
+        Raises SlotConflict if the slot is missing, held by someone else or
+        has incomplete booking details, and ReservationConflict(None) if
+        concurrent writers kept the update from settling.
+        """
+        raise NotImplementedError
+
+    def flag_overstay(self, slot, flagged_at):
+        """Set overstayAt on slot's stay unless it ended, changed or is flagged.
+
+        slot is the slot as read; its status, bookingDate and checkinTime
+        identify the stay. Returns True if the flag was set.
+        """
+        raise NotImplementedError
+
+    # Reservations
+    def find_slot_reservations(self, slot_id, start, end):
+        """Return the slot's reservations overlapping [start, end), by start."""
+        raise NotImplementedError
+
+    def find_owner_reservations(self, owner_email, start, end):
+        """Return a lot's reservations overlapping [start, end), by start."""
+        raise NotImplementedError
+
+    def create_reservation(self, reservation):
+        """Insert a reservation unless its window is taken, atomically.
+
+        Raises ReservationConflict if it overlaps another reservation, and
+        SlotConflict if the slot is missing or its current stay may still be
+        running at the start of the window.
+        """
+        raise NotImplementedError
+
+    def cancel_reservation(self, slot_id, start, email):
+        """Delete email's reservation of slot_id starting at start; return it.
+
+        If the slot's current stay is held until start, holdUntil moves to
+        the start of the next reservation (or None) in the same write.
+        Raises ReservationConflict with the stored reservation (or None) if
+        there is no such reservation or it belongs to someone else.
+        """
+        raise NotImplementedError
+
+    # History
+    def append_history(self, entry):
+        """Add a booking or checkout entry; existing entries are never changed.
+
+        The backend sets eventKey from at, slotId and event.
+        """
+        raise NotImplementedError
+
+    def find_user_history(self, email, start=None, end=None, limit=50, cursor=None):
+        """Return (entries, next_cursor) for a user, newest first.
+
+        start and end are ISO times bounding at, end exclusive; either may
+        be None.
+        """
+        raise NotImplementedError
+
+    def find_owner_history(self, owner_email, start=None, end=None, limit=50, cursor=None):
+        """Return (entries, next_cursor) for a lot, newest first."""
+        raise NotImplementedError
+
+    # Rollups
+    def add_rollups(self, owner_email, deltas, token=None):
+        """Add {bucket: {metric: amount}} to a lot's rollup rows, atomically.
+
+        token identifies the event, so a retried call is applied once where
+        the backend can retry on its own.
+        """
+        raise NotImplementedError
+
+    def find_rollups(self, owner_email, prefix):
+        """Return a lot's rollup rows whose bucket starts with prefix, in order."""
+        raise NotImplementedError
+
+    def replace_rollups(self, owner_email, rows):
+        """Replace all of a lot's rollup rows with {bucket: metrics}."""
+        raise NotImplementedError
+
+    # Counters
+    def find_availability(self, owner_email):
+        raise NotImplementedError
+
+    def find_availability_for_owners(self, owner_emails):
+        """Return {ownerEmail: {'free', 'occupied'}} for the given lots."""
+        raise NotImplementedError
+
+    def rebuild_slot_counters(self, owner_email):
+        """Recount a lot's counters from its slots; return per-floor counts."""
+        raise NotImplementedError
+
+
+def make_repository(backend=None, **options):
+    backend = (backend or os.environ.get('STORAGE_BACKEND', 'dynamodb')).lower()
+    if backend == 'dynamodb':
+        from .dynamodb import DynamoDBRepository
+        return DynamoDBRepository(**options)
+    if backend == 'memory':
+        from .memory import MemoryRepository
+        return MemoryRepository()
+    if backend == 'sqlite':
+        from .sqlite import SQLiteRepository
+        return SQLiteRepository(options.get('path') or os.environ.get('SQLITE_PATH', 'parking.db'))
+    raise ValueError(f'Unknown storage backend: {backend}')
@@ -0,0 +1,1316 @@
+"""DynamoDB backend, the production store.
+
+Tables:
+    Userdata      email, GSI UsernameIndex on username
+    Owners        email, GSI GeoIndex on geoPartition + geohash (owners with coordinates)
+    SlotDetails   id, GSI OwnerEmailIndex on ownerEmail
+    SlotCounters  ownerEmail + scope ('TOTAL', 'TOTAL#<n>' or 'FLOOR#<n>'),
+                  freeSlots/occupiedSlots
+    Reservations  slotId + start, GSI OwnerStartIndex on ownerEmail + start
+    BookingHistory  ownerEmail + eventKey, GSI UserHistoryIndex on email + eventKey,
+                    TTL on expiresAt
+    Rollups       ownerEmail + bucket, summed metrics (see rollups.py)
+
+Client settings (see client_config):
+    DYNAMODB_MAX_POOL_CONNECTIONS  pooled HTTP connections per client, 50
+    DYNAMODB_CONNECT_TIMEOUT       seconds, 2
+    DYNAMODB_READ_TIMEOUT          seconds, 5
+    DYNAMODB_TCP_KEEPALIVE         1 to keep idle connections alive, 1
+    DYNAMODB_RETRY_MODE            legacy or standard, standard
+    DYNAMODB_MAX_ATTEMPTS          attempts per call including the first, 5
+    DYNAMODB_CLIENT_SCOPE          thread (a resource per thread) or process
+
+Throttled calls are retried by ThrottleRetry alone, which has its own
+settings. botocore's adaptive mode would add client-side rate limiting on
+top of that backoff, so it is replaced by standard.
+
+Capacity (see table_definition), applied by init-tables to new and existing
+tables:
+    DYNAMODB_CAPACITY_MODE         provisioned or on-demand, provisioned
+    DYNAMODB_CAPACITY              read/write units per table or index, e.g.
+                                   'SlotDetails=20/10,SlotDetails.OwnerEmailIndex=10/5';
+                                   indexes default to their table's size and
+                                   tables to '*', 5/5
+"""
+import hashlib
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from time import sleep
+
+import boto3
+from boto3.dynamodb.conditions import Attr, Key
+from boto3.dynamodb.types import TypeDeserializer
+
+from cache import make_cache
+from geo import PARTITION_PRECISION
+from metrics import THROTTLE_CODES
+from . import (BATCH_WRITE_SIZE, BOOKING_FIELDS, Repository,
+               ReservationConflict, SlotConflict, Throttled, booking_instant, count_slots,
+               decode_cursor, earliest_overlapping_start, encode_cursor,
+               history_key, overlaps, shift_time, stay_blocks,
+               summarize_counters)
+
+log = logging.getLogger('parking.storage')
+
+BATCH_WRITE_MAX_ATTEMPTS = 8
+RESERVATION_MAX_ATTEMPTS = 3
+TRANSACTION_CONFLICT_ATTEMPTS = 3
+# Every booking in a lot moves its total, so the total is spread over this
+# many counter items ('TOTAL', 'TOTAL#1', ...) and readers sum them
+COUNTER_SHARDS = max(1, int(os.environ.get('DYNAMODB_COUNTER_SHARDS', '4')))
+SCAN_SEGMENTS = int(os.environ.get('SCAN_SEGMENTS', '8'))
+
+TABLE_SCHEMAS = {
+    'Userdata': {
+        'KeySchema': [{'AttributeName': 'email', 'KeyType': 'HASH'}],
+        'AttributeDefinitions': [
+            {'AttributeName': 'email', 'AttributeType': 'S'},
+            {'AttributeName': 'username', 'AttributeType': 'S'},
+        ],
+        'GlobalSecondaryIndexes': [{
+            'IndexName': 'UsernameIndex',
+            'KeySchema': [{'AttributeName': 'username', 'KeyType': 'HASH'}],
+            'Projection': {'ProjectionType': 'ALL'},
+        }],
+    },
+    'Owners': {
+        'KeySchema': [{'AttributeName': 'email', 'KeyType': 'HASH'}],
+        'AttributeDefinitions': [
+            {'AttributeName': 'email', 'AttributeType': 'S'},
+            {'AttributeName': 'geoPartition', 'AttributeType': 'S'},
+            {'AttributeName': 'geohash', 'AttributeType': 'S'},
+        ],
+        # Sparse: only owners with coordinates have geoPartition
+        'GlobalSecondaryIndexes': [{
+            'IndexName': 'GeoIndex',
+            'KeySchema': [
+                {'AttributeName': 'geoPartition', 'KeyType': 'HASH'},
+                {'AttributeName': 'geohash', 'KeyType': 'RANGE'},
+            ],
+            'Projection': {
+                'ProjectionType': 'INCLUDE',
+                'NonKeyAttributes': ['orgName', 'orgType', 'costPerHour', 'lat', 'lon'],
+            },
+        }],
+    },
+    'SlotDetails': {
+        'KeySchema': [{'AttributeName': 'id', 'KeyType': 'HASH'}],
+        'AttributeDefinitions': [
+            {'AttributeName': 'id', 'AttributeType': 'S'},
+            {'AttributeName': 'ownerEmail', 'AttributeType': 'S'},
+        ],
+        'GlobalSecondaryIndexes': [{
+            'IndexName': 'OwnerEmailIndex',
+            'KeySchema': [{'AttributeName': 'ownerEmail', 'KeyType': 'HASH'}],
+            'Projection': {'ProjectionType': 'ALL'},
+        }],
+    },
+    # Per owner, COUNTER_SHARDS items for the whole lot (scope TOTAL, TOTAL#1, ...)
+    # and one per floor
+    'SlotCounters': {
+        'KeySchema': [
+            {'AttributeName': 'ownerEmail', 'KeyType': 'HASH'},
+            {'AttributeName': 'scope', 'KeyType': 'RANGE'},
+        ],
+        'AttributeDefinitions': [
+            {'AttributeName': 'ownerEmail', 'AttributeType': 'S'},
+            {'AttributeName': 'scope', 'AttributeType': 'S'},
+        ],
+    },
+    # Windows never overlap per slot, so slotId + start is unique
+    'Reservations': {
+        'KeySchema': [
+            {'AttributeName': 'slotId', 'KeyType': 'HASH'},
+            {'AttributeName': 'start', 'KeyType': 'RANGE'},
+        ],
+        'AttributeDefinitions': [
+            {'AttributeName': 'slotId', 'AttributeType': 'S'},
+            {'AttributeName': 'start', 'AttributeType': 'S'},
+            {'AttributeName': 'ownerEmail', 'AttributeType': 'S'},
+        ],
+        'GlobalSecondaryIndexes': [{
+            'IndexName': 'OwnerStartIndex',
+            'KeySchema': [
+                {'AttributeName': 'ownerEmail', 'KeyType': 'HASH'},
+                {'AttributeName': 'start', 'KeyType': 'RANGE'},
+            ],
+            'Projection': {'ProjectionType': 'ALL'},
+        }],
+    },
+    # One row of summed metrics per lot and bucket (see rollups.py)
+    'Rollups': {
+        'KeySchema': [
+            {'AttributeName': 'ownerEmail', 'KeyType': 'HASH'},
+            {'AttributeName': 'bucket', 'KeyType': 'RANGE'},
+        ],
+        'AttributeDefinitions': [
+            {'AttributeName': 'ownerEmail', 'AttributeType': 'S'},
+            {'AttributeName': 'bucket', 'AttributeType': 'S'},
+        ],
+    },
+    # Append-only; eventKey starts with the event time so ranges are time ranges
+    'BookingHistory': {
+        'KeySchema': [
+            {'AttributeName': 'ownerEmail', 'KeyType': 'HASH'},
+            {'AttributeName': 'eventKey', 'KeyType': 'RANGE'},
+        ],
+        'AttributeDefinitions': [
+            {'AttributeName': 'ownerEmail', 'AttributeType': 'S'},
+            {'AttributeName': 'eventKey', 'AttributeType': 'S'},
+            {'AttributeName': 'email', 'AttributeType': 'S'},
+        ],
+        'GlobalSecondaryIndexes': [{
+            'IndexName': 'UserHistoryIndex',
+            'KeySchema': [
+                {'AttributeName': 'email', 'KeyType': 'HASH'},
+                {'AttributeName': 'eventKey', 'KeyType': 'RANGE'},
+            ],
+            'Projection': {'ProjectionType': 'ALL'},
+        }],
+    },
+}
+
+TRANSACT_MAX_ITEMS = 100
+
+# Tables whose items DynamoDB deletes once the named epoch-seconds attribute passes
+TABLE_TTL = {'BookingHistory': 'expiresAt'}
+
+CAPACITY_MODES = {'provisioned': 'PROVISIONED', 'on-demand': 'PAY_PER_REQUEST'}
+DEFAULT_CAPACITY = '5/5'
+
+
+def parse_capacity(spec):
+    """Parse 'SlotDetails=20/10,SlotDetails.OwnerEmailIndex=10/5,*=5/5'.
+
+    Returns {name: (read, write)}; a name is a table, 'Table.Index' or '*'.
+    """
+    sizes = {}
+    for entry in filter(None, (part.strip() for part in (spec or '').split(','))):
+        name, _, size = entry.partition('=')
+        read, _, write = size.partition('/')
+        try:
+            sizes[name.strip()] = (int(read), int(write or read))
+        except ValueError:
+            raise ValueError(f'Invalid capacity {entry!r}, expected Name=read/write') from None
+    return sizes
+
+
+def capacity_settings():
+    mode = os.environ.get('DYNAMODB_CAPACITY_MODE', 'provisioned')
+    if mode not in CAPACITY_MODES:
+        raise ValueError(f'DYNAMODB_CAPACITY_MODE must be one of {", ".join(CAPACITY_MODES)}')
+    sizes = parse_capacity('*=' + DEFAULT_CAPACITY)
+    sizes.update(parse_capacity(os.environ.get('DYNAMODB_CAPACITY')))
+    return mode, sizes
+
+
+def _throughput(sizes, name, table_name=None):
+    # An index without its own size falls back to its table's, then to '*'
+    read, write = sizes.get(name) or sizes.get(table_name) or sizes['*']
+    return {'ReadCapacityUnits': read, 'WriteCapacityUnits': write}
+
+
+def table_definition(table_name, mode=None, sizes=None):
+    """Return the create_table arguments for table_name in the configured capacity mode."""
+    if mode is None:
+        mode, sizes = capacity_settings()
+    definition = {**TABLE_SCHEMAS[table_name], 'BillingMode': CAPACITY_MODES[mode]}
+    if mode == 'provisioned':
+        definition['ProvisionedThroughput'] = _throughput(sizes, table_name)
+        if 'GlobalSecondaryIndexes' in definition:
+            definition['GlobalSecondaryIndexes'] = [
+                {**index, 'ProvisionedThroughput': _throughput(sizes, f"{table_name}.{index['IndexName']}", table_name)}
+                for index in definition['GlobalSecondaryIndexes']
+            ]
+    return definition
+
+
+def client_config():
+    from botocore.config import Config
+    mode = os.environ.get('DYNAMODB_RETRY_MODE', 'standard')
+    if mode == 'adaptive':
+        log.warning("DYNAMODB_RETRY_MODE=adaptive is not supported, ThrottleRetry owns throttles; using standard")
+        mode = 'standard'
+    return Config(
+        max_pool_connections=int(os.environ.get('DYNAMODB_MAX_POOL_CONNECTIONS', '50')),
+        connect_timeout=float(os.environ.get('DYNAMODB_CONNECT_TIMEOUT', '2')),
+        read_timeout=float(os.environ.get('DYNAMODB_READ_TIMEOUT', '5')),
+        tcp_keepalive=os.environ.get('DYNAMODB_TCP_KEEPALIVE', '1') != '0',
+        retries={
+            'mode': mode,
+            'total_max_attempts': int(os.environ.get('DYNAMODB_MAX_ATTEMPTS', '5')),
+        },
+    )
+
+
+class RetryBudget:
+    """Caps throttle retries at a share of calls, plus a small floor.
+
+    Every call deposits ratio tokens and every retry spends one, so when
+    the table is saturated retries can't multiply the load on it. The
+    floor refills min_per_second tokens so a quiet worker can still retry.
+    """
+
+    def __init__(self, ratio=0.2, min_per_second=5, maxsize=50):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.maxsize = maxsize
+        self._tokens = float(maxsize)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, amount):
+        now = time.monotonic()
+        self._tokens = min(self.maxsize, self._tokens + amount + (now - self._updated) * self.min_per_second)
+        self._updated = now
+
+    def deposit(self):
+        with self._lock:
+            self._refill(self.ratio)
+
+    def withdraw(self):
+        with self._lock:
+            self._refill(0)
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class ThrottleRetry:
+    """Retries throttled calls with full-jitter exponential backoff.
+
+    Hooked into every client's needs-retry event ahead of botocore's own
+    retry handler, which still handles every other retryable error. A call
+    that is still throttled after max_attempts, or when the retry budget is
+    spent, raises storage.Throttled instead of a generic ClientError, after
+    at most max_total_delay() seconds of backoff (3.55s with the defaults).
+    Transactions cancelled only because an item was throttled count as
+    throttled too; botocore doesn't retry those at all.
+
+    Settings:
+        DYNAMODB_THROTTLE_MAX_ATTEMPTS  attempts per call including the first, 8
+        DYNAMODB_THROTTLE_BASE_DELAY    seconds before the first retry at most, 0.05
+        DYNAMODB_THROTTLE_MAX_DELAY     seconds between retries at most, 1
+        DYNAMODB_RETRY_BUDGET_RATIO     retries allowed per call, 0.2
+    """
+
+    def __init__(self, max_attempts=None, base_delay=None, max_delay=None, budget=None):
+        self.max_attempts = max_attempts or int(os.environ.get('DYNAMODB_THROTTLE_MAX_ATTEMPTS', '8'))
+        self.base_delay = base_delay or float(os.environ.get('DYNAMODB_THROTTLE_BASE_DELAY', '0.05'))
+        self.max_delay = max_delay or float(os.environ.get('DYNAMODB_THROTTLE_MAX_DELAY', '1'))
+        self.budget = budget or RetryBudget(ratio=float(os.environ.get('DYNAMODB_RETRY_BUDGET_RATIO', '0.2')))
+
+    def delay(self, attempts):
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempts - 1)))
+
+    def max_total_delay(self):
+        """Longest a call can spend backing off before it raises Throttled."""
+        return sum(min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+                   for attempts in range(1, self.max_attempts))
+
+    @staticmethod
+    def throttle_code(response):
+        error = (response[1].get('Error') or {}) if response else {}
+        code = error.get('Code')
+        if code in THROTTLE_CODES:
+            return code
+        if code == 'TransactionCanceledException':
+            reasons = {reason.get('Code') for reason in response[1].get('CancellationReasons') or ()}
+            if 'ThrottlingError' in reasons and reasons <= {'ThrottlingError', 'None', None}:
+                return 'ThrottlingError'
+        return None
+
+    def needs_retry(self, response=None, attempts=None, operation=None, request_dict=None, **kwargs):
+        if attempts == 1:
+            self.budget.deposit()
+        code = self.throttle_code(response)
+        if code is None:
+            return None
+        if attempts >= self.max_attempts or not self.budget.withdraw():
+            log.warning("%s still throttled after %d attempts", operation.name, attempts)
+            # Stop botocore retrying too; raise_throttled raises once the
+            # other needs-retry handlers (metrics among them) have seen it
+            request_dict['context']['throttled'] = Throttled(operation.name, code, attempts,
+                                                             retry_after=self.max_delay)
+            return False
+        return self.delay(attempts)
+
+    def raise_throttled(self, request_dict=None, **kwargs):
+        error = request_dict['context'].pop('throttled', None)
+        if error is not None:
+            raise error
+
+    def attach(self, client):
+        # The first non-None answer decides, so this must come before botocore's handler
+        client.meta.events.register_first('needs-retry.dynamodb', self.needs_retry)
+        client.meta.events.register_last('needs-retry.dynamodb', self.raise_throttled)
+
+
+def _default_scope():
+    # Under gevent every greenlet looks like its own thread. One shared client
+    # is safe there (its connection pool is cooperative once patched) and
+    # avoids building a resource per greenlet.
+    if 'gevent' in sys.modules:
+        from gevent import monkey
+        if monkey.is_module_patched('threading'):
+            return 'process'
+    return 'thread'
+
+
+class _Handles:
+    def __init__(self, resource):
+        self.resource = resource
+        self.tables = {}
+
+
+class ClientFactory:
+    """Hands out DynamoDB resources and table handles.
+
+    boto3 resources are not thread-safe, so by default every thread gets its
+    own, built lazily from one shared session. Session use is serialized,
+    and after the first resource the service models come from the session's
+    cache, so a new thread pays a few milliseconds once. With scope
+    'process' all threads share a single resource.
+    """
+
+    def __init__(self, config=None, scope=None, resource=None):
+        self.config = config or client_config()
+        self.scope = 'process' if resource else (
+            scope or os.environ.get('DYNAMODB_CLIENT_SCOPE') or _default_scope())
+        self._session = None
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._shared = _Handles(resource) if resource else None
+        self._clients = weakref.WeakSet()
+        self._hooks = []
+        self.throttle_retry = ThrottleRetry()
+        if resource:
+            self.throttle_retry.attach(resource.meta.client)
+            self._clients.add(resource.meta.client)
+
+    def _create(self):
+        with self._lock:
+            if self._session is None:
+                self._session = boto3.session.Session()
+            resource = self._session.resource('dynamodb', config=self.config)
+            self.throttle_retry.attach(resource.meta.client)
+            self._clients.add(resource.meta.client)
+            hooks = list(self._hooks)
+        for hook in hooks:
+            hook(resource.meta.client)
+        return _Handles(resource)
+
+    def _handles(self):
+        if self.scope == 'process':
+            if self._shared is None:
+                with self._lock:
+                    if self._shared is None:
+                        self._shared = self._create()
+            return self._shared
+        handles = getattr(self._local, 'handles', None)
+        if handles is None:
+            handles = self._local.handles = self._create()
+        return handles
+
+    def resource(self):
+        return self._handles().resource
+
+    def client(self):
+        return self._handles().resource.meta.client
+
+    def table(self, table_name):
+        # Building a Table makes no network call; handles are memoized per scope
+        handles = self._handles()
+        table = handles.tables.get(table_name)
+        if table is None:
+            table = handles.tables.setdefault(table_name, handles.resource.Table(table_name))
+        return table
+
+    def add_client_hook(self, hook):
+        """Call hook(client) for every client, existing and future, e.g. to attach metrics."""
+        with self._lock:
+            self._hooks.append(hook)
+            clients = list(self._clients)
+        for client in clients:
+            hook(client)
+
+
+def _total_scope(shard):
+    return f'TOTAL#{shard}' if shard else 'TOTAL'
+
+
+def _projection(fields):
+    names = {f'#f{i}': name for i, name in enumerate(fields)}
+    return ', '.join(names), names
+
+
+class DynamoDBRepository(Repository):
+    name = 'dynamodb'
+
+    def __init__(self, resource=None, clients=None):
+        # Nothing here touches DynamoDB; resources and table handles are built
+        # on first use and schema checks live in init_schema().
+        self.clients = clients or ClientFactory(resource=resource)
+        self._deserializer = TypeDeserializer()
+        # A slot never changes owner or floor, so those are cached for a long
+        # time to key the counter updates that ride along with every booking.
+        self.slot_meta_cache = make_cache(
+            'slotmeta',
+            maxsize=int(os.environ.get('SLOT_META_CACHE_SIZE', '10000')),
+            ttl=int(os.environ.get('SLOT_META_CACHE_TTL', '86400')),
+            url=os.environ.get('CACHE_URL'),
+        )
+
+    @property
+    def resource(self):
+        return self.clients.resource()
+
+    @property
+    def client(self):
+        return self.clients.client()
+
+    def table(self, table_name):
+        return self.clients.table(table_name)
+
+    @property
+    def users(self):
+        return self.table('Userdata')
+
+    @property
+    def owners(self):
+        return self.table('Owners')
+
+    @property
+    def slots(self):
+        return self.table('SlotDetails')
+
+    @property
+    def counters(self):
+        return self.table('SlotCounters')
+
+    @property
+    def reservations(self):
+        return self.table('Reservations')
+
+    @property
+    def history(self):
+        return self.table('BookingHistory')
+
+    @property
+    def rollups(self):
+        return self.table('Rollups')
+
+    # Schema
+    def setup_table(self, table_name):
+        try:
+            # Try to get the table first
+            table = self.resource.Table(table_name)
+            table.table_status  # This will raise an exception if table doesn't exist
+            if not self.ensure_indexes(table):
+                self.ensure_capacity(table)
+            return table
+        except self.client.exceptions.ResourceNotFoundException:
+            table = self.resource.create_table(TableName=table_name, **table_definition(table_name))
+            # Wait until the table exists
+            self.client.get_waiter('table_exists').wait(TableName=table_name)
+            return table
+        except Exception as e:
+            log.error("Error setting up %s table: %s", table_name, e)
+            return None
+
+    def ensure_indexes(self, table):
+        """Start building any GSI in TABLE_SCHEMAS that an existing table lacks.
+
+        DynamoDB backfills the index in the background; queries on it fail
+        until it is ACTIVE. Returns True if an index was started.
+        """
+        schema = table_definition(table.name, *self._table_capacity(table))
+        existing = {index['IndexName'] for index in table.global_secondary_indexes or []}
+        for index in schema.get('GlobalSecondaryIndexes', []):
+            if index['IndexName'] in existing:
+                continue
+            log.warning("Adding index %s to %s", index['IndexName'], table.name)
+            self.client.update_table(
+                TableName=table.name,
+                AttributeDefinitions=schema['AttributeDefinitions'],
+                GlobalSecondaryIndexUpdates=[{'Create': index}],
+            )
+            return True  # one index per update; the next init-tables adds the rest
+        return False
+
+    @staticmethod
+    def _table_capacity(table):
+        # New indexes must match the table's current mode, not the configured one
+        mode = (table.billing_mode_summary or {}).get('BillingMode', 'PROVISIONED')
+        _, sizes = capacity_settings()
+        return ('on-demand' if mode == 'PAY_PER_REQUEST' else 'provisioned'), sizes
+
+    def ensure_capacity(self, table):
+        """Bring an existing table and its GSIs to the configured capacity.
+
+        DynamoDB allows a switch to on-demand once a day and a few decreases
+        of provisioned capacity a day, so this only updates what differs.
+        Returns True if an update was started.
+        """
+        if table.table_status != 'ACTIVE' or any(
+                index.get('IndexStatus') != 'ACTIVE' for index in table.global_secondary_indexes or []):
+            log.info("%s is being updated; its capacity is checked on the next init-tables", table.name)
+            return False
+        mode, sizes = capacity_settings()
+        current_mode = (table.billing_mode_summary or {}).get('BillingMode', 'PROVISIONED')
+        update = {}
+        if CAPACITY_MODES[mode] != current_mode:
+            update['BillingMode'] = CAPACITY_MODES[mode]
+        if mode == 'provisioned':
+            wanted = _throughput(sizes, table.name)
+            current = table.provisioned_throughput or {}
+            if update or any(current.get(unit) != value for unit, value in wanted.items()):
+                update['ProvisionedThroughput'] = wanted
+            index_updates = []
+            for index in table.global_secondary_indexes or []:
+                wanted = _throughput(sizes, f"{table.name}.{index['IndexName']}", table.name)
+                current = index.get('ProvisionedThroughput') or {}
+                if update.get('BillingMode') or any(current.get(unit) != value for unit, value in wanted.items()):
+                    index_updates.append({'Update': {'IndexName': index['IndexName'], 'ProvisionedThroughput': wanted}})
+            if index_updates:
+                update['GlobalSecondaryIndexUpdates'] = index_updates
+        if not update:
+            return False
+        log.warning("Updating capacity of %s", table.name, extra={'data': {'update': update}})
+        self.client.update_table(TableName=table.name, **update)
+        return True
+
+    def verify_tables(self):
+        try:
+            existing_tables = self.client.list_tables()['TableNames']
+            log.info("Existing DynamoDB tables: %s", existing_tables)
+            for table_name in TABLE_SCHEMAS:
+                if table_name not in existing_tables:
+                    log.warning("%s table does not exist!", table_name)
+        except Exception as e:
+            log.error("Error verifying tables: %s", e)
+
+    def enable_ttl(self, table_name, attribute):
+        try:
+            status = self.client.describe_time_to_live(TableName=table_name)['TimeToLiveDescription']
+            if status.get('TimeToLiveStatus') in ('ENABLED', 'ENABLING'):
+                return True
+            self.client.update_time_to_live(
+                TableName=table_name,
+                TimeToLiveSpecification={'Enabled': True, 'AttributeName': attribute},
+            )
+            return True
+        except Exception as e:
+            log.error("Error enabling TTL on %s: %s", table_name, e)
+            return False
+
+    def init_schema(self):
+        log.info("Initializing DynamoDB tables...")
+        self.verify_tables()
+        tables = {table_name: self.setup_table(table_name) for table_name in TABLE_SCHEMAS}
+        for table_name, attribute in TABLE_TTL.items():
+            if tables[table_name] is not None and not self.enable_ttl(table_name, attribute):
+                tables[table_name] = None
+        log.info("Tables initialized", extra={'data': {name: table is not None for name, table in tables.items()}})
+        return all(table is not None for table in tables.values())
+
+    # Users
+    def find_user_by_email(self, email):
+        return self.users.get_item(Key={'email': email}).get('Item')
+
+    def find_user_by_username(self, username):
+        response = self.users.query(
+            IndexName='UsernameIndex',
+            KeyConditionExpression=Key('username').eq(username)
+        )
+        items = response.get('Items', [])
+        return items[0] if items else None
+
+    def save_user(self, user):
+        return self.users.put_item(Item=user)
+
+    # Owners
+    def find_owner_by_email(self, email):
+        return self.owners.get_item(Key={'email': email}).get('Item')
+
+    def save_owner(self, owner):
+        return self.owners.put_item(Item=owner)
+
+    def find_owners_page(self, limit, cursor=None, fields=None):
+        scan_kwargs = {'Limit': limit}
+        if fields:
+            scan_kwargs['ProjectionExpression'], scan_kwargs['ExpressionAttributeNames'] = _projection(fields)
+        start_key = decode_cursor(cursor)
+        if start_key:
+            scan_kwargs['ExclusiveStartKey'] = start_key
+        response = self.owners.scan(**scan_kwargs)
+        return response.get('Items', []), encode_cursor(response.get('LastEvaluatedKey'))
+
+    def find_owners_by_geohash(self, prefix, org_type=None, max_price=None):
+        if len(prefix) < PARTITION_PRECISION:
+            raise ValueError(f'Geohash prefixes need at least {PARTITION_PRECISION} characters')
+        query_kwargs = {
+            'IndexName': 'GeoIndex',
+            'KeyConditionExpression': Key('geoPartition').eq(prefix[:PARTITION_PRECISION])
+                                      & Key('geohash').begins_with(prefix),
+        }
+        filters = []
+        if org_type:
+            filters.append(Attr('orgType').eq(org_type))
+        if max_price is not None:
+            filters.append(Attr('costPerHour').lte(max_price))
+        if filters:
+            query_kwargs['FilterExpression'] = filters[0] if len(filters) == 1 else filters[0] & filters[1]
+        items = []
+        while True:
+            response = self.owners.query(**query_kwargs)
+            items.extend(response.get('Items', []))
+            if 'LastEvaluatedKey' not in response:
+                return items
+            query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    def _scan_segment(self, table_name, segment, total_segments, pages, stop):
+        # Runs on a worker thread with that thread's own client. The
+        # resource's client already deserializes items to Python types.
+        scan_kwargs = {'TableName': table_name, 'Segment': segment, 'TotalSegments': total_segments}
+        while not stop.is_set():
+            response = self.client.scan(**scan_kwargs)
+            # pages is bounded, so a slow consumer holds the scan back
+            while True:
+                try:
+                    pages.put(response.get('Items', []), timeout=0.05)
+                    break
+                except queue.Full:
+                    if stop.is_set():
+                        return
+            if 'LastEvaluatedKey' not in response:
+                return
+            scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    def iter_owners(self, segments=None):
+        """Yield every owner using a parallel segmented scan.
+
+        Each segment is paginated on its own thread and items are yielded as
+        pages arrive. At most one page per segment is buffered, so callers
+        can stream the whole catalogue without holding it in memory, and
+        closing the generator early stops the scan.
+        """
+        segments = segments or SCAN_SEGMENTS
+        pages = queue.Queue(maxsize=segments)
+        stop = threading.Event()
+        pool = ThreadPoolExecutor(max_workers=segments)
+        try:
+            futures = [pool.submit(self._scan_segment, self.owners.name, n, segments, pages, stop)
+                       for n in range(segments)]
+            pending = set(futures)
+            while pending or not pages.empty():
+                try:
+                    yield from pages.get(timeout=0.05)
+                except queue.Empty:
+                    pass
+                for future in [f for f in pending if f.done()]:
+                    pending.discard(future)
+                    future.result()  # re-raise scan errors in the caller
+        finally:
+            # Workers finish the page they are reading, then see stop and exit
+            stop.set()
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    # Slots
+    def find_slot_by_id(self, slot_id):
+        return self.slots.get_item(Key={'id': slot_id}).get('Item')
+
+    def find_slots_by_owner_email(self, owner_email):
+        query_kwargs = {
+            'IndexName': 'OwnerEmailIndex',
+            'KeyConditionExpression': Key('ownerEmail').eq(owner_email),
+        }
+        items = []
+        while True:
+            response = self.slots.query(**query_kwargs)
+            items.extend(response.get('Items', []))
+            if 'LastEvaluatedKey' not in response:
+                break
+            query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        for item in items:
+            self.remember_slot_meta(item)
+        return items
+
+    def find_slots_page(self, owner_email, limit, cursor=None, floor_number=None, fields=None):
+        query_kwargs = {
+            'IndexName': 'OwnerEmailIndex',
+            'KeyConditionExpression': Key('ownerEmail').eq(owner_email),
+        }
+        names = {}
+        if fields:
+            query_kwargs['ProjectionExpression'], names = _projection(fields)
+        if floor_number is not None:
+            query_kwargs['FilterExpression'] = '#floor = :floor'
+            names = {**names, '#floor': 'floorNumber'}
+            query_kwargs['ExpressionAttributeValues'] = {':floor': floor_number}
+        if names:
+            query_kwargs['ExpressionAttributeNames'] = names
+        start_key = decode_cursor(cursor)
+        items = []
+        # A filter can leave a page short, so keep reading until it is full
+        while True:
+            if start_key:
+                query_kwargs['ExclusiveStartKey'] = start_key
+            query_kwargs['Limit'] = limit - len(items)
+            response = self.slots.query(**query_kwargs)
+            items.extend(response.get('Items', []))
+            start_key = response.get('LastEvaluatedKey')
+            if not start_key or len(items) >= limit:
+                return items, encode_cursor(start_key)
+
+    def save_slot(self, slot):
+        return self.slots.put_item(Item=slot)
+
+    def remember_slot_meta(self, slot):
+        if slot and slot.get('id'):
+            self.slot_meta_cache.set(slot['id'], {
+                'ownerEmail': slot.get('ownerEmail'),
+                'floorNumber': slot.get('floorNumber'),
+            })
+
+    def find_slot_meta(self, slot_id):
+        """Return the immutable ownerEmail/floorNumber of a slot, or None."""
+        meta = self.slot_meta_cache.get(slot_id)
+        if meta is not None:
+            return meta
+        slot = self.slots.get_item(
+            Key={'id': slot_id},
+            ProjectionExpression='id, ownerEmail, floorNumber'
+        ).get('Item')
+        if not slot:
+            return None
+        self.remember_slot_meta(slot)
+        return {'ownerEmail': slot.get('ownerEmail'), 'floorNumber': slot.get('floorNumber')}
+
+    def _counter_updates(self, owner_email, floor_number, free_delta, occupied_delta):
+        # TransactWriteItems entries that move the lot and floor counters; the
+        # lot total goes to a random shard
+        return [{
+            'Update': {
+                'TableName': self.counters.name,
+                'Key': {'ownerEmail': owner_email, 'scope': scope},
+                'UpdateExpression': 'ADD freeSlots :free, occupiedSlots :occupied',
+                'ExpressionAttributeValues': {':free': free_delta, ':occupied': occupied_delta},
+            }
+        } for scope in (_total_scope(random.randrange(COUNTER_SHARDS)), f'FLOOR#{floor_number}')]
+
+    def adjust_slot_counters(self, owner_email, floor_number, free_delta, occupied_delta):
+        self.client.transact_write_items(
+            TransactItems=self._counter_updates(owner_email, floor_number, free_delta, occupied_delta)
+        )
+
+    def create_slot(self, slot):
+        self.client.transact_write_items(TransactItems=[
+            {
+                'Put': {
+                    'TableName': self.slots.name,
+                    'Item': slot,
+                    'ConditionExpression': 'attribute_not_exists(id)',
+                }
+            },
+            *self._counter_updates(slot['ownerEmail'], slot['floorNumber'], 1, 0),
+        ])
+        self.remember_slot_meta(slot)
+
+    def batch_create_slots(self, slots):
+        """Write slots with BatchWriteItem and yield a progress dict per batch.
+
+        Unprocessed items are retried with jittered exponential backoff; items
+        still unprocessed after BATCH_WRITE_MAX_ATTEMPTS are counted as failed.
+        """
+        table_name = self.slots.name
+        for start in range(0, len(slots), BATCH_WRITE_SIZE):
+            batch = slots[start:start + BATCH_WRITE_SIZE]
+            request_items = {table_name: [{'PutRequest': {'Item': slot}} for slot in batch]}
+            attempts = 0
+            error = None
+            while request_items and attempts < BATCH_WRITE_MAX_ATTEMPTS:
+                if attempts:
+                    sleep(random.uniform(0, min(2.0, 0.05 * 2 ** attempts)))
+                attempts += 1
+                try:
+                    response = self.client.batch_write_item(RequestItems=request_items)
+                except Exception as e:
+                    log.error("Error in batch write: %s", e)
+                    error = str(e)
+                    continue
+                request_items = response.get('UnprocessedItems') or {}
+            failed = sum(len(requests) for requests in request_items.values())
+            unprocessed = {r['PutRequest']['Item']['id'] for requests in request_items.values() for r in requests}
+            written_per_floor = {}
+            for slot in batch:
+                if slot['id'] not in unprocessed:
+                    key = (slot['ownerEmail'], slot['floorNumber'])
+                    written_per_floor[key] = written_per_floor.get(key, 0) + 1
+                    self.remember_slot_meta(slot)
+            for (owner_email, floor_number), count in written_per_floor.items():
+                try:
+                    self.adjust_slot_counters(owner_email, floor_number, count, 0)
+                except Exception as e:
+                    log.error("Error updating slot counters: %s", e)
+            progress = {
+                'batch': start // BATCH_WRITE_SIZE + 1,
+                'written': len(batch) - failed,
+                'failed': failed,
+                'attempts': attempts,
+            }
+            if failed and error:
+                progress['error'] = error
+            yield progress
+
+    def _slot_transaction(self, operation, items):
+        """Run a transaction whose first item is a conditional slot update.
+
+        Only a failed condition on the slot is a SlotConflict, raised with the
+        slot as it was. The other items are counters shared by the whole lot,
+        so a TransactionConflict there is retried a few times before giving
+        up with ReservationConflict(None), and throttling raises Throttled.
+        """
+        for attempt in range(1, TRANSACTION_CONFLICT_ATTEMPTS + 1):
+            try:
+                self.client.transact_write_items(TransactItems=items)
+                return
+            except self.client.exceptions.TransactionCanceledException as e:
+                error = e
+            reasons = error.response.get('CancellationReasons') or [{}]
+            codes = [reason.get('Code') for reason in reasons]
+            if codes[0] == 'ConditionalCheckFailed':
+                item = reasons[0].get('Item')
+                raise SlotConflict({k: self._deserializer.deserialize(v) for k, v in item.items()}
+                                   if item else None)
+            if 'ThrottlingError' in codes:
+                raise Throttled(operation, 'ThrottlingError', attempt)
+            if 'TransactionConflict' not in codes:
+                raise error
+            log.debug("%s of a slot conflicted with another transaction, attempt %d", operation, attempt)
+            sleep(random.uniform(0, 0.01 * 2 ** attempt))
+        raise ReservationConflict(None)
+
+    def claim_slot(self, slot_id, email, booking):
+        """Book a free slot in a single conditional transaction.
+
+        The owner and floor come from the slot meta cache, and the first
+        attempt assumes the slot has never been reserved, so a warm booking
+        is one round trip. Reserving a slot stamps it with reservationVersion;
+        for those slots the reservation index is read and the booking is
+        conditioned on the stamp being unchanged.
+        """
+        meta = self.find_slot_meta(slot_id)
+        if not meta:
+            raise SlotConflict(None)
+        now = booking_instant(booking)
+        version = None
+        booking = {**booking, 'holdUntil': None}
+        for attempt in range(RESERVATION_MAX_ATTEMPTS):
+            try:
+                self._claim(slot_id, email, meta, booking, version)
+                return {'id': slot_id, 'ownerEmail': meta['ownerEmail'], 'floorNumber': meta['floorNumber'],
+                        **booking, 'status': email}
+            except SlotConflict as e:
+                slot = e.slot
+            if not slot or slot.get('status') or 'reservationVersion' not in slot:
+                raise SlotConflict(slot)
+            version = slot['reservationVersion']
+            for reservation in self.find_slot_reservations(slot_id, now, shift_time(now, seconds=1), True):
+                if reservation['email'] != email:
+                    raise ReservationConflict(reservation)
+            following = self.reservations.query(
+                KeyConditionExpression=Key('slotId').eq(slot_id) & Key('start').gt(now),
+                ProjectionExpression='#start', ExpressionAttributeNames={'#start': 'start'},
+                Limit=1, ConsistentRead=True,
+            ).get('Items', [])
+            booking['holdUntil'] = following[0]['start'] if following else None
+        raise ReservationConflict(None)
+
+    def _claim(self, slot_id, email, meta, booking, version):
+        names = {'#status': 'status', '#rv': 'reservationVersion'}
+        values = {':email': email, ':owner': meta['ownerEmail'], ':null_type': 'NULL'}
+        assignments = ['#status = :email']
+        for i, (field, value) in enumerate(booking.items()):
+            names[f'#b{i}'] = field
+            values[f':b{i}'] = value
+            assignments.append(f'#b{i} = :b{i}')
+        if version is None:
+            reserved = 'attribute_not_exists(#rv)'
+        else:
+            reserved = '#rv = :rv'
+            values[':rv'] = version
+        self._slot_transaction('ClaimSlot', [
+            {
+                'Update': {
+                    'TableName': self.slots.name,
+                    'Key': {'id': slot_id},
+                    'UpdateExpression': 'SET ' + ', '.join(assignments),
+                    'ConditionExpression': 'attribute_exists(id) AND ownerEmail = :owner'
+                                           ' AND (attribute_not_exists(#status) OR attribute_type(#status, :null_type))'
+                                           f' AND {reserved}',
+                    'ExpressionAttributeNames': names,
+                    'ExpressionAttributeValues': values,
+                    'ReturnValuesOnConditionCheckFailure': 'ALL_OLD',
+                }
+            },
+            *self._counter_updates(meta['ownerEmail'], meta['floorNumber'], -1, 1),
+        ])
+
+    def release_slot(self, slot_id, email):
+        """Read the booking once, then clear it and move the counters in one
+        transaction conditioned on the booking being unchanged.
+
+        TransactWriteItems returns nothing on success, so the booking to
+        bill has to be read first: a release is one strongly consistent
+        GetItem (1 RCU) plus the transaction (2 WCUs for each of its three
+        items), where claim_slot is the transaction alone.
+        benchmarks/booking_contention.py reports the calls and capacity
+        units each release uses.
+        """
+        slot = self.slots.get_item(Key={'id': slot_id}, ConsistentRead=True).get('Item')
+        if (not slot or slot.get('status') != email
+                or not isinstance(slot.get('bookingDate'), str)
+                or not isinstance(slot.get('checkinTime'), str)):
+            raise SlotConflict(slot)
+        names = {'#status': 'status'}
+        values = {':null': None, ':email': email}
+        assignments = ['#status = :null']
+        conditions = ['#status = :email']
+        for i, field in enumerate(BOOKING_FIELDS):
+            names[f'#b{i}'] = field
+            assignments.append(f'#b{i} = :null')
+            # Scalar fields identify the booking; the tariff map just goes with it
+            if isinstance(slot.get(field), str):
+                values[f':b{i}'] = slot[field]
+                conditions.append(f'#b{i} = :b{i}')
+        self._slot_transaction('ReleaseSlot', [
+            {
+                'Update': {
+                    'TableName': self.slots.name,
+                    'Key': {'id': slot_id},
+                    'UpdateExpression': 'SET ' + ', '.join(assignments),
+                    'ConditionExpression': ' AND '.join(conditions),
+                    'ExpressionAttributeNames': names,
+                    'ExpressionAttributeValues': values,
+                    'ReturnValuesOnConditionCheckFailure': 'ALL_OLD',
+                }
+            },
+            *self._counter_updates(slot['ownerEmail'], slot['floorNumber'], 1, -1),
+        ])
+        return slot
+
+    def flag_overstay(self, slot, flagged_at):
+        try:
+            self.slots.update_item(
+                Key={'id': slot['id']},
+                UpdateExpression='SET overstayAt = :at',
+                ConditionExpression='#status = :email AND bookingDate = :date AND checkinTime = :checkin'
+                                    ' AND (attribute_not_exists(overstayAt) OR attribute_type(overstayAt, :null_type))',
+                ExpressionAttributeNames={'#status': 'status'},
+                ExpressionAttributeValues={':at': flagged_at, ':email': slot['status'], ':date': slot['bookingDate'],
+                                           ':checkin': slot['checkinTime'], ':null_type': 'NULL'},
+            )
+        except self.client.exceptions.ConditionalCheckFailedException:
+            return False
+        return True
+
+    # Reservations
+    def _query_overlapping(self, start, end, **query_kwargs):
+        items = []
+        while True:
+            response = self.reservations.query(**query_kwargs)
+            items.extend(item for item in response.get('Items', []) if overlaps(item, start, end))
+            if 'LastEvaluatedKey' not in response:
+                return items
+            query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    def find_slot_reservations(self, slot_id, start, end, consistent=False):
+        return self._query_overlapping(
+            start, end,
+            KeyConditionExpression=Key('slotId').eq(slot_id)
+                                   & Key('start').between(earliest_overlapping_start(start), end),
+            ConsistentRead=consistent,
+        )
+
+    def find_owner_reservations(self, owner_email, start, end):
+        return self._query_overlapping(
+            start, end,
+            IndexName='OwnerStartIndex',
+            KeyConditionExpression=Key('ownerEmail').eq(owner_email)
+                                   & Key('start').between(earliest_overlapping_start(start), end),
+        )
+
+    def create_reservation(self, reservation):
+        """Check the slot and its neighbouring reservations, then write the
+        reservation and bump the slot's reservationVersion in one transaction
+        conditioned on the version read. A concurrent reservation or booking
+        changes the slot, so the loser re-checks.
+        """
+        slot_id, start = reservation['slotId'], reservation['start']
+        for attempt in range(RESERVATION_MAX_ATTEMPTS):
+            slot = self.slots.get_item(Key={'id': slot_id}, ConsistentRead=True).get('Item')
+            if not slot or stay_blocks(slot, start):
+                raise SlotConflict(slot)
+            existing = self.find_slot_reservations(slot_id, start, reservation['end'], True)
+            if existing:
+                raise ReservationConflict(existing[0])
+            names = {'#rv': 'reservationVersion', '#status': 'status', '#hold': 'holdUntil'}
+            values = {':one': 1, ':null_type': 'NULL', ':start': start}
+            if 'reservationVersion' in slot:
+                version_condition = '#rv = :rv'
+                values[':rv'] = slot['reservationVersion']
+            else:
+                version_condition = 'attribute_not_exists(#rv)'
+            try:
+                self.client.transact_write_items(TransactItems=[
+                    {
+                        'Update': {
+                            'TableName': self.slots.name,
+                            'Key': {'id': slot_id},
+                            'UpdateExpression': 'ADD #rv :one',
+                            'ConditionExpression': f'attribute_exists(id) AND {version_condition}'
+                                                   ' AND (attribute_not_exists(#status) OR attribute_type(#status, :null_type)'
+                                                   ' OR #hold <= :start)',
+                            'ExpressionAttributeNames': names,
+                            'ExpressionAttributeValues': values,
+                        }
+                    },
+                    {
+                        'Put': {
+                            'TableName': self.reservations.name,
+                            'Item': reservation,
+                            'ConditionExpression': 'attribute_not_exists(slotId)',
+                        }
+                    },
+                ])
+                return reservation
+            except self.client.exceptions.TransactionCanceledException:
+                log.debug("Reservation of %s lost a race, attempt %d", slot_id, attempt + 1)
+        raise ReservationConflict(None)
+
+    def cancel_reservation(self, slot_id, start, email):
+        """Delete the reservation and bump the slot's reservationVersion in one
+        transaction, so a concurrent booking re-reads the index. A stay held
+        until this reservation's start is held until the next one instead.
+        """
+        key = {'slotId': slot_id, 'start': start}
+        for attempt in range(RESERVATION_MAX_ATTEMPTS):
+            reservation = self.reservations.get_item(Key=key, ConsistentRead=True).get('Item')
+            if not reservation or reservation['email'] != email:
+                raise ReservationConflict(reservation)
+            slot = self.slots.get_item(Key={'id': slot_id}, ConsistentRead=True).get('Item')
+            delete = {
+                'Delete': {
+                    'TableName': self.reservations.name,
+                    'Key': key,
+                    'ConditionExpression': 'email = :email',
+                    'ExpressionAttributeValues': {':email': email},
+                }
+            }
+            if not slot:
+                self.client.transact_write_items(TransactItems=[delete])
+                return reservation
+            names = {'#rv': 'reservationVersion'}
+            values = {':one': 1}
+            update = 'ADD #rv :one'
+            if 'reservationVersion' in slot:
+                condition = '#rv = :rv'
+                values[':rv'] = slot['reservationVersion']
+            else:
+                condition = 'attribute_not_exists(#rv)'
+            if slot.get('status') and slot.get('holdUntil') == start:
+                following = self.reservations.query(
+                    KeyConditionExpression=Key('slotId').eq(slot_id) & Key('start').gt(start),
+                    ProjectionExpression='#start', ExpressionAttributeNames={'#start': 'start'},
+                    Limit=1, ConsistentRead=True,
+                ).get('Items', [])
+                names['#hold'] = 'holdUntil'
+                values[':hold'] = following[0]['start'] if following else None
+                update = 'SET #hold = :hold ' + update
+            try:
+                self.client.transact_write_items(TransactItems=[
+                    {
+                        'Update': {
+                            'TableName': self.slots.name,
+                            'Key': {'id': slot_id},
+                            'UpdateExpression': update,
+                            'ConditionExpression': f'attribute_exists(id) AND {condition}',
+                            'ExpressionAttributeNames': names,
+                            'ExpressionAttributeValues': values,
+                        }
+                    },
+                    delete,
+                ])
+                return reservation
+            except self.client.exceptions.TransactionCanceledException:
+                log.debug("Cancelling reservation of %s lost a race, attempt %d", slot_id, attempt + 1)
+        raise ReservationConflict(None)
+
+    # History
+    def append_history(self, entry):
+        entry = {**entry, 'eventKey': history_key(entry)}
+        self.history.put_item(Item=entry, ConditionExpression='attribute_not_exists(eventKey)')
+        return entry
+
+    def _history_page(self, key_condition, start, end, limit, cursor, **query_kwargs):
+        if start and end:
+            key_condition &= Key('eventKey').between(start, end)
+        elif start:
+            key_condition &= Key('eventKey').gte(start)
+        elif end:
+            key_condition &= Key('eventKey').lt(end)
+        query_kwargs.update(
+            KeyConditionExpression=key_condition,
+            ScanIndexForward=False,
+            # TTL deletes lag behind expiry, so hide entries that are due
+            FilterExpression='attribute_not_exists(expiresAt) OR expiresAt > :now',
+            ExpressionAttributeValues={':now': int(time.time())},
+        )
+        start_key = decode_cursor(cursor)
+        items = []
+        while True:
+            if start_key:
+                query_kwargs['ExclusiveStartKey'] = start_key
+            query_kwargs['Limit'] = limit - len(items)
+            response = self.history.query(**query_kwargs)
+            # between() includes end; an entry keyed exactly at end is outside the range
+            items.extend(item for item in response.get('Items', []) if not end or item['eventKey'] < end)
+            start_key = response.get('LastEvaluatedKey')
+            if not start_key or len(items) >= limit:
+                return items, encode_cursor(start_key)
+
+    def find_user_history(self, email, start=None, end=None, limit=50, cursor=None):
+        return self._history_page(Key('email').eq(email), start, end, limit, cursor,
+                                  IndexName='UserHistoryIndex')
+
+    def find_owner_history(self, owner_email, start=None, end=None, limit=50, cursor=None):
+        return self._history_page(Key('ownerEmail').eq(owner_email), start, end, limit, cursor)
+
+    # Rollups
+    def add_rollups(self, owner_email, deltas, token=None):
+        """ADD every delta in one transaction per 100 rows.
+
+        With a token the transaction is idempotent for ten minutes, so the
+        SDK's retries of a timed-out call never count an event twice.
+        """
+        updates = []
+        for key, metrics in sorted(deltas.items()):
+            names = {f'#m{i}': metric for i, metric in enumerate(metrics)}
+            values = {f':m{i}': amount for i, amount in enumerate(metrics.values())}
+            updates.append({
+                'Update': {
+                    'TableName': self.rollups.name,
+                    'Key': {'ownerEmail': owner_email, 'bucket': key},
+                    'UpdateExpression': 'ADD ' + ', '.join(f'{name} {value}' for name, value in zip(names, values)),
+                    'ExpressionAttributeNames': names,
+                    'ExpressionAttributeValues': values,
+                }
+            })
+        for start in range(0, len(updates), TRANSACT_MAX_ITEMS):
+            request = {'TransactItems': updates[start:start + TRANSACT_MAX_ITEMS]}
+            if token:
+                request['ClientRequestToken'] = hashlib.sha1(f'{token}#{start}'.encode()).hexdigest()[:36]
+            self.client.transact_write_items(**request)
+
+    def find_rollups(self, owner_email, prefix):
+        query_kwargs = {
+            'KeyConditionExpression': Key('ownerEmail').eq(owner_email) & Key('bucket').begins_with(prefix),
+        }
+        items = []
+        while True:
+            response = self.rollups.query(**query_kwargs)
+            items.extend(response.get('Items', []))
+            if 'LastEvaluatedKey' not in response:
+                return items
+            query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    def replace_rollups(self, owner_email, rows):
+        # Not atomic; backfills run offline while nothing else writes the lot
+        stale = set()
+        query_kwargs = {
+            'KeyConditionExpression': Key('ownerEmail').eq(owner_email),
+            'ProjectionExpression': '#bucket',
+            'ExpressionAttributeNames': {'#bucket': 'bucket'},
+        }
+        while True:
+            response = self.rollups.query(**query_kwargs)
+            stale.update(item['bucket'] for item in response.get('Items', []))
+            if 'LastEvaluatedKey' not in response:
+                break
+            query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        with self.rollups.batch_writer(overwrite_by_pkeys=['ownerEmail', 'bucket']) as batch:
+            for key in stale - set(rows):
+                batch.delete_item(Key={'ownerEmail': owner_email, 'bucket': key})
+            for key, metrics in rows.items():
+                batch.put_item(Item={**metrics, 'ownerEmail': owner_email, 'bucket': key})
+
+    # Counters
+    def find_availability(self, owner_email):
+        response = self.counters.query(KeyConditionExpression=Key('ownerEmail').eq(owner_email))
+        return summarize_counters(owner_email, [
+            (item['scope'], item.get('freeSlots'), item.get('occupiedSlots'))
+            for item in response.get('Items', [])
+        ])
+
+    def find_availability_for_owners(self, owner_emails):
+        """Read and sum the lots' TOTAL counter shards, 100 keys per BatchGetItem."""
+        table_name = self.counters.name
+        keys = [{'ownerEmail': email, 'scope': _total_scope(shard)}
+                for email in dict.fromkeys(owner_emails) for shard in range(COUNTER_SHARDS)]
+        availability = {}
+        for start in range(0, len(keys), 100):
+            request_items = {table_name: {
+                'Keys': keys[start:start + 100],
+                'ProjectionExpression': 'ownerEmail, freeSlots, occupiedSlots',
+            }}
+            while request_items:
+                response = self.resource.batch_get_item(RequestItems=request_items)
+                for item in response.get('Responses', {}).get(table_name, []):
+                    counts = availability.setdefault(item['ownerEmail'], {'free': 0, 'occupied': 0})
+                    counts['free'] += int(item.get('freeSlots', 0))
+                    counts['occupied'] += int(item.get('occupiedSlots', 0))
+                request_items = response.get('UnprocessedKeys') or {}
+        return availability
+
+    def write_slot_counters(self, owner_email, counts):
+        # The whole total goes to the first shard; shards left over from a
+        # larger COUNTER_SHARDS are deleted
+        scopes = {item['scope'] for item in self.counters.query(
+            KeyConditionExpression=Key('ownerEmail').eq(owner_email),
+            ProjectionExpression='#scope', ExpressionAttributeNames={'#scope': 'scope'},
+        ).get('Items', [])}
+        with self.counters.batch_writer(overwrite_by_pkeys=['ownerEmail', 'scope']) as batch:
+            batch.put_item(Item={
+                'ownerEmail': owner_email,
+                'scope': 'TOTAL',
+                'freeSlots': sum(c['free'] for c in counts.values()),
+                'occupiedSlots': sum(c['occupied'] for c in counts.values()),
+            })
+            for shard in range(1, COUNTER_SHARDS):
+                batch.put_item(Item={'ownerEmail': owner_email, 'scope': _total_scope(shard),
+                                     'freeSlots': 0, 'occupiedSlots': 0})
+            keep = {_total_scope(shard) for shard in range(COUNTER_SHARDS)}
+            keep.update(f'FLOOR#{floor_number}' for floor_number in counts)
+            for scope in scopes - keep:
+                batch.delete_item(Key={'ownerEmail': owner_email, 'scope': scope})
+            for floor_number, c in counts.items():
+                batch.put_item(Item={
+                    'ownerEmail': owner_email,
+                    'scope': f'FLOOR#{floor_number}',
+                    'freeSlots': c['free'],
+                    'occupiedSlots': c['occupied'],
+                })
+
+    def rebuild_slot_counters(self, owner_email):
+        counts = count_slots(self.find_slots_by_owner_email(owner_email))
+        self.write_slot_counters(owner_email, counts)
+        return counts
@@ -0,0 +1,345 @@
+"""In-process backend for single-site deployments, tests and benchmarks.
+
+Everything lives in dicts behind one re-entrant lock, so conditional
+updates are atomic across threads. Items are copied on the way in and out
+so callers can never mutate stored state. Nothing survives a restart.
+"""
+import copy
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+
+from . import (BATCH_WRITE_SIZE, BOOKING_FIELDS, Repository,
+               ReservationConflict, SlotConflict, booking_instant, count_slots,
+               decode_cursor, earliest_overlapping_start, encode_cursor,
+               history_expired, history_key, is_free, overlaps, owner_matches,
+               project, shift_time, stay_blocks, stay_token, summarize_counters)
+
+
+class MemoryRepository(Repository):
+    name = 'memory'
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._users = {}
+        self._usernames = {}           # username -> email
+        self._owners = {}
+        self._owner_keys = []          # sorted emails, for keyset pagination
+        self._owner_geo = []           # sorted (geohash, email)
+        self._slots = {}
+        self._slots_by_owner = {}      # ownerEmail -> sorted slot ids
+        self._counters = {}            # (ownerEmail, scope) -> [free, occupied]
+        self._reservations = {}        # slotId -> {start: reservation}
+        self._reservation_starts = {}  # slotId -> sorted starts
+        self._owner_reservations = {}  # ownerEmail -> sorted (start, slotId)
+        self._history = {}             # (ownerEmail, eventKey) -> entry
+        self._owner_history = {}       # ownerEmail -> sorted (eventKey, ownerEmail)
+        self._user_history = {}        # email -> sorted (eventKey, ownerEmail)
+        self._rollups = {}             # ownerEmail -> {bucket: metrics}
+        self._rollup_keys = {}         # ownerEmail -> sorted buckets
+
+    def init_schema(self):
+        return True
+
+    # Users
+    def find_user_by_email(self, email):
+        with self._lock:
+            return copy.deepcopy(self._users.get(email))
+
+    def find_user_by_username(self, username):
+        with self._lock:
+            return copy.deepcopy(self._users.get(self._usernames.get(username)))
+
+    def save_user(self, user):
+        with self._lock:
+            previous = self._users.get(user['email'])
+            if previous and self._usernames.get(previous.get('username')) == user['email']:
+                del self._usernames[previous['username']]
+            self._users[user['email']] = copy.deepcopy(user)
+            if user.get('username'):
+                self._usernames[user['username']] = user['email']
+
+    # Owners
+    def find_owner_by_email(self, email):
+        with self._lock:
+            return copy.deepcopy(self._owners.get(email))
+
+    def save_owner(self, owner):
+        with self._lock:
+            previous = self._owners.get(owner['email'])
+            if previous is None:
+                insort(self._owner_keys, owner['email'])
+            elif previous.get('geohash'):
+                self._owner_geo.remove((previous['geohash'], owner['email']))
+            if owner.get('geohash'):
+                insort(self._owner_geo, (owner['geohash'], owner['email']))
+            self._owners[owner['email']] = copy.deepcopy(owner)
+
+    def find_owners_page(self, limit, cursor=None, fields=None):
+        start_key = decode_cursor(cursor)
+        with self._lock:
+            start = bisect_right(self._owner_keys, start_key['email']) if start_key else 0
+            emails = self._owner_keys[start:start + limit]
+            items = [project(copy.deepcopy(self._owners[email]), fields) for email in emails]
+            more = start + limit < len(self._owner_keys)
+        return items, encode_cursor({'email': emails[-1]}) if more and emails else None
+
+    def find_owners_by_geohash(self, prefix, org_type=None, max_price=None):
+        with self._lock:
+            index = bisect_left(self._owner_geo, (prefix,))
+            owners = []
+            while index < len(self._owner_geo) and self._owner_geo[index][0].startswith(prefix):
+                owner = self._owners[self._owner_geo[index][1]]
+                if owner_matches(owner, org_type, max_price):
+                    owners.append(copy.deepcopy(owner))
+                index += 1
+            return owners
+
+    def iter_owners(self, segments=None):
+        with self._lock:
+            owners = copy.deepcopy(list(self._owners.values()))
+        yield from owners
+
+    # Slots
+    def find_slot_by_id(self, slot_id):
+        with self._lock:
+            return copy.deepcopy(self._slots.get(slot_id))
+
+    def find_slot_meta(self, slot_id):
+        with self._lock:
+            slot = self._slots.get(slot_id)
+            if slot is None:
+                return None
+            return {'ownerEmail': slot['ownerEmail'], 'floorNumber': slot.get('floorNumber')}
+
+    def find_slots_by_owner_email(self, owner_email):
+        with self._lock:
+            return [copy.deepcopy(self._slots[slot_id])
+                    for slot_id in self._slots_by_owner.get(owner_email, [])]
+
+    def find_slots_page(self, owner_email, limit, cursor=None, floor_number=None, fields=None):
+        start_key = decode_cursor(cursor)
+        items = []
+        with self._lock:
+            slot_ids = self._slots_by_owner.get(owner_email, [])
+            index = bisect_right(slot_ids, start_key['id']) if start_key else 0
+            while index < len(slot_ids) and len(items) < limit:
+                slot = self._slots[slot_ids[index]]
+                index += 1
+                if floor_number is None or slot.get('floorNumber') == floor_number:
+                    items.append(project(copy.deepcopy(slot), fields))
+            more = index < len(slot_ids)
+        return items, encode_cursor({'id': slot_ids[index - 1]}) if more else None
+
+    def _put_slot(self, slot):
+        if slot['id'] not in self._slots:
+            insort(self._slots_by_owner.setdefault(slot['ownerEmail'], []), slot['id'])
+        self._slots[slot['id']] = copy.deepcopy(slot)
+
+    def save_slot(self, slot):
+        with self._lock:
+            self._put_slot(slot)
+
+    def _adjust_counters(self, owner_email, floor_number, free_delta, occupied_delta):
+        for scope in ('TOTAL', f'FLOOR#{floor_number}'):
+            counts = self._counters.setdefault((owner_email, scope), [0, 0])
+            counts[0] += free_delta
+            counts[1] += occupied_delta
+
+    def create_slot(self, slot):
+        with self._lock:
+            if slot['id'] in self._slots:
+                raise SlotConflict(copy.deepcopy(self._slots[slot['id']]))
+            self._put_slot(slot)
+            self._adjust_counters(slot['ownerEmail'], slot['floorNumber'], 1, 0)
+
+    def batch_create_slots(self, slots):
+        for start in range(0, len(slots), BATCH_WRITE_SIZE):
+            batch = slots[start:start + BATCH_WRITE_SIZE]
+            with self._lock:
+                for slot in batch:
+                    if slot['id'] not in self._slots:
+                        self._adjust_counters(slot['ownerEmail'], slot['floorNumber'], 1, 0)
+                    self._put_slot(slot)
+            yield {'batch': start // BATCH_WRITE_SIZE + 1, 'written': len(batch), 'failed': 0, 'attempts': 1}
+
+    def claim_slot(self, slot_id, email, booking):
+        with self._lock:
+            slot = self._slots.get(slot_id)
+            if slot is None or not is_free(slot):
+                raise SlotConflict(copy.deepcopy(slot))
+            now = booking_instant(booking)
+            for reservation in self._slot_overlaps(slot_id, now, shift_time(now, seconds=1)):
+                if reservation['email'] != email:
+                    raise ReservationConflict(reservation)
+            starts = self._reservation_starts.get(slot_id, [])
+            index = bisect_right(starts, now)
+            slot.update(copy.deepcopy(booking))
+            slot['holdUntil'] = starts[index] if index < len(starts) else None
+            slot['status'] = email
+            self._adjust_counters(slot['ownerEmail'], slot['floorNumber'], -1, 1)
+            return copy.deepcopy(slot)
+
+    def release_slot(self, slot_id, email):
+        with self._lock:
+            slot = self._slots.get(slot_id)
+            if (not slot or slot.get('status') != email
+                    or not isinstance(slot.get('bookingDate'), str)
+                    or not isinstance(slot.get('checkinTime'), str)):
+                raise SlotConflict(copy.deepcopy(slot))
+            released = copy.deepcopy(slot)
+            for field in BOOKING_FIELDS:
+                slot[field] = None
+            slot['status'] = None
+            self._adjust_counters(slot['ownerEmail'], slot['floorNumber'], 1, -1)
+            return released
+
+    def flag_overstay(self, slot, flagged_at):
+        with self._lock:
+            current = self._slots.get(slot['id'])
+            if (not current or not current.get('status') or current.get('overstayAt')
+                    or stay_token(current) != stay_token(slot)):
+                return False
+            current['overstayAt'] = flagged_at
+            return True
+
+    # Reservations
+    def _slot_overlaps(self, slot_id, start, end):
+        starts = self._reservation_starts.get(slot_id, [])
+        by_start = self._reservations.get(slot_id, {})
+        lo = bisect_left(starts, earliest_overlapping_start(start))
+        hi = bisect_left(starts, end)
+        return [copy.deepcopy(by_start[s]) for s in starts[lo:hi] if by_start[s]['end'] > start]
+
+    def find_slot_reservations(self, slot_id, start, end):
+        with self._lock:
+            return self._slot_overlaps(slot_id, start, end)
+
+    def find_owner_reservations(self, owner_email, start, end):
+        with self._lock:
+            keys = self._owner_reservations.get(owner_email, [])
+            lo = bisect_left(keys, (earliest_overlapping_start(start),))
+            hi = bisect_left(keys, (end,))
+            found = [self._reservations[slot_id][s] for s, slot_id in keys[lo:hi]]
+            return [copy.deepcopy(r) for r in found if overlaps(r, start, end)]
+
+    def create_reservation(self, reservation):
+        slot_id, start = reservation['slotId'], reservation['start']
+        with self._lock:
+            slot = self._slots.get(slot_id)
+            if slot is None or stay_blocks(slot, start):
+                raise SlotConflict(copy.deepcopy(slot))
+            existing = self._slot_overlaps(slot_id, start, reservation['end'])
+            if existing:
+                raise ReservationConflict(existing[0])
+            self._reservations.setdefault(slot_id, {})[start] = copy.deepcopy(reservation)
+            insort(self._reservation_starts.setdefault(slot_id, []), start)
+            insort(self._owner_reservations.setdefault(reservation['ownerEmail'], []), (start, slot_id))
+            return copy.deepcopy(reservation)
+
+    def cancel_reservation(self, slot_id, start, email):
+        with self._lock:
+            reservation = self._reservations.get(slot_id, {}).get(start)
+            if not reservation or reservation['email'] != email:
+                raise ReservationConflict(copy.deepcopy(reservation))
+            del self._reservations[slot_id][start]
+            starts = self._reservation_starts[slot_id]
+            starts.remove(start)
+            self._owner_reservations[reservation['ownerEmail']].remove((start, slot_id))
+            slot = self._slots.get(slot_id)
+            if slot and not is_free(slot) and slot.get('holdUntil') == start:
+                index = bisect_right(starts, start)
+                slot['holdUntil'] = starts[index] if index < len(starts) else None
+            return reservation
+
+    # History
+    def append_history(self, entry):
+        entry = {**copy.deepcopy(entry), 'eventKey': history_key(entry)}
+        key = (entry['ownerEmail'], entry['eventKey'])
+        with self._lock:
+            if key in self._history:
+                raise ValueError(f'History entry {key} already exists')
+            self._history[key] = entry
+            insort(self._owner_history.setdefault(entry['ownerEmail'], []), key[::-1])
+            insort(self._user_history.setdefault(entry['email'], []), key[::-1])
+        return entry
+
+    def _history_page(self, keys, start, end, limit, cursor):
+        # keys are sorted (eventKey, ownerEmail); walk them newest first
+        start_key = decode_cursor(cursor)
+        hi = bisect_left(keys, (end,)) if end else len(keys)
+        if start_key:
+            hi = min(hi, bisect_left(keys, (start_key['eventKey'],)))
+        lo = bisect_left(keys, (start,)) if start else 0
+        now = time.time()
+        items = []
+        index = hi
+        while index > lo and len(items) < limit:
+            index -= 1
+            entry = self._history[keys[index][::-1]]
+            if not history_expired(entry, now):
+                items.append(copy.deepcopy(entry))
+        more = index > lo and bool(items)
+        return items, encode_cursor({'eventKey': items[-1]['eventKey']}) if more else None
+
+    def find_user_history(self, email, start=None, end=None, limit=50, cursor=None):
+        with self._lock:
+            return self._history_page(self._user_history.get(email, []), start, end, limit, cursor)
+
+    def find_owner_history(self, owner_email, start=None, end=None, limit=50, cursor=None):
+        with self._lock:
+            return self._history_page(self._owner_history.get(owner_email, []), start, end, limit, cursor)
+
+    # Rollups
+    def add_rollups(self, owner_email, deltas, token=None):
+        with self._lock:
+            rows = self._rollups.setdefault(owner_email, {})
+            for key, metrics in deltas.items():
+                if key not in rows:
+                    rows[key] = {'ownerEmail': owner_email, 'bucket': key}
+                    insort(self._rollup_keys.setdefault(owner_email, []), key)
+                for metric, amount in metrics.items():
+                    rows[key][metric] = rows[key].get(metric, 0) + amount
+
+    def find_rollups(self, owner_email, prefix):
+        with self._lock:
+            keys = self._rollup_keys.get(owner_email, [])
+            index = bisect_left(keys, prefix)
+            rows = []
+            while index < len(keys) and keys[index].startswith(prefix):
+                rows.append(copy.deepcopy(self._rollups[owner_email][keys[index]]))
+                index += 1
+            return rows
+
+    def replace_rollups(self, owner_email, rows):
+        with self._lock:
+            self._rollups[owner_email] = {key: {**copy.deepcopy(metrics), 'ownerEmail': owner_email, 'bucket': key}
+                                          for key, metrics in rows.items()}
+            self._rollup_keys[owner_email] = sorted(rows)
+
+    # Counters
+    def find_availability(self, owner_email):
+        with self._lock:
+            rows = [(scope, free, occupied)
+                    for (email, scope), (free, occupied) in self._counters.items() if email == owner_email]
+        return summarize_counters(owner_email, rows)
+
+    def find_availability_for_owners(self, owner_emails):
+        availability = {}
+        with self._lock:
+            for email in owner_emails:
+                counts = self._counters.get((email, 'TOTAL'))
+                if counts:
+                    availability[email] = {'free': counts[0], 'occupied': counts[1]}
+        return availability
+
+    def rebuild_slot_counters(self, owner_email):
+        with self._lock:
+            counts = count_slots(self._slots[slot_id] for slot_id in self._slots_by_owner.get(owner_email, []))
+            for key in [key for key in self._counters if key[0] == owner_email]:
+                del self._counters[key]
+            self._counters[(owner_email, 'TOTAL')] = [sum(c['free'] for c in counts.values()),
+                                                      sum(c['occupied'] for c in counts.values())]
+            for floor_number, c in counts.items():
+                self._counters[(owner_email, f'FLOOR#{floor_number}')] = [c['free'], c['occupied']]
+        return counts
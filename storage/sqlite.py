@@ -0,0 +1,421 @@
+"""SQLite backend for single-site deployments that want data on disk.
+
+Lookup columns (email, username, ownerEmail, floorNumber, status) are real
+indexed columns; the full item is kept as JSON next to them. One
+connection is shared behind a lock, which also makes the conditional slot
+updates atomic without holding a database write lock between statements.
+"""
+import sqlite3
+import threading
+import time
+
+from . import (BATCH_WRITE_SIZE, BOOKING_FIELDS, Repository,
+               ReservationConflict, SlotConflict, booking_instant, count_slots,
+               decode_cursor, dumps, earliest_overlapping_start, encode_cursor,
+               history_key, loads, owner_matches, project, shift_time, stay_blocks,
+               stay_token, summarize_counters)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    email TEXT PRIMARY KEY,
+    username TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS users_username ON users (username);
+
+CREATE TABLE IF NOT EXISTS owners (
+    email TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS owner_geo (
+    email TEXT PRIMARY KEY,
+    geohash TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS owner_geo_geohash ON owner_geo (geohash);
+
+CREATE TABLE IF NOT EXISTS slots (
+    id TEXT PRIMARY KEY,
+    ownerEmail TEXT NOT NULL,
+    floorNumber TEXT,
+    status TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS slots_owner ON slots (ownerEmail, id);
+CREATE INDEX IF NOT EXISTS slots_owner_floor ON slots (ownerEmail, floorNumber, id);
+
+CREATE TABLE IF NOT EXISTS slot_counters (
+    ownerEmail TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    freeSlots INTEGER NOT NULL DEFAULT 0,
+    occupiedSlots INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (ownerEmail, scope)
+);
+
+CREATE TABLE IF NOT EXISTS reservations (
+    slotId TEXT NOT NULL,
+    "start" TEXT NOT NULL,
+    "end" TEXT NOT NULL,
+    ownerEmail TEXT NOT NULL,
+    email TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (slotId, "start")
+);
+CREATE INDEX IF NOT EXISTS reservations_owner ON reservations (ownerEmail, "start");
+
+CREATE TABLE IF NOT EXISTS booking_history (
+    ownerEmail TEXT NOT NULL,
+    eventKey TEXT NOT NULL,
+    email TEXT NOT NULL,
+    expiresAt INTEGER,
+    data TEXT NOT NULL,
+    PRIMARY KEY (ownerEmail, eventKey)
+);
+CREATE INDEX IF NOT EXISTS booking_history_user ON booking_history (email, eventKey);
+CREATE INDEX IF NOT EXISTS booking_history_expiry ON booking_history (expiresAt) WHERE expiresAt IS NOT NULL;
+
+CREATE TABLE IF NOT EXISTS rollups (
+    ownerEmail TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (ownerEmail, bucket)
+);
+"""
+
+_OVERLAPPING = '"start" > ? AND "start" < ? AND "end" > ? ORDER BY "start"'
+
+
+class SQLiteRepository(Repository):
+    name = 'sqlite'
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self.init_schema()
+
+    def init_schema(self):
+        with self._lock:
+            self._db.executescript(SCHEMA)
+        return True
+
+    def _one(self, sql, params):
+        with self._lock:
+            row = self._db.execute(sql, params).fetchone()
+        return loads(row[0]) if row else None
+
+    def _all(self, sql, params):
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        return [loads(row[0]) for row in rows]
+
+    def _transaction(self):
+        return _Transaction(self)
+
+    # Users
+    def find_user_by_email(self, email):
+        return self._one('SELECT data FROM users WHERE email = ?', (email,))
+
+    def find_user_by_username(self, username):
+        return self._one('SELECT data FROM users WHERE username = ? LIMIT 1', (username,))
+
+    def save_user(self, user):
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO users (email, username, data) VALUES (?, ?, ?)',
+                             (user['email'], user.get('username'), dumps(user)))
+
+    # Owners
+    def find_owner_by_email(self, email):
+        return self._one('SELECT data FROM owners WHERE email = ?', (email,))
+
+    def save_owner(self, owner):
+        with self._transaction():
+            self._db.execute('INSERT OR REPLACE INTO owners (email, data) VALUES (?, ?)',
+                             (owner['email'], dumps(owner)))
+            self._db.execute('DELETE FROM owner_geo WHERE email = ?', (owner['email'],))
+            if owner.get('geohash'):
+                self._db.execute('INSERT INTO owner_geo (email, geohash) VALUES (?, ?)',
+                                 (owner['email'], owner['geohash']))
+
+    def find_owners_page(self, limit, cursor=None, fields=None):
+        start_key = decode_cursor(cursor)
+        items = self._all('SELECT data FROM owners WHERE email > ? ORDER BY email LIMIT ?',
+                          (start_key['email'] if start_key else '', limit + 1))
+        more = len(items) > limit
+        items = items[:limit]
+        next_cursor = encode_cursor({'email': items[-1]['email']}) if more else None
+        return [project(item, fields) for item in items], next_cursor
+
+    def find_owners_by_geohash(self, prefix, org_type=None, max_price=None):
+        owners = self._all('SELECT o.data FROM owner_geo g JOIN owners o ON o.email = g.email'
+                           ' WHERE g.geohash >= ? AND g.geohash < ?', (prefix, prefix + '\uffff'))
+        return [owner for owner in owners if owner_matches(owner, org_type, max_price)]
+
+    def iter_owners(self, segments=None):
+        yield from self._all('SELECT data FROM owners ORDER BY email', ())
+
+    # Slots
+    def find_slot_by_id(self, slot_id):
+        return self._one('SELECT data FROM slots WHERE id = ?', (slot_id,))
+
+    def find_slot_meta(self, slot_id):
+        with self._lock:
+            row = self._db.execute('SELECT ownerEmail, floorNumber FROM slots WHERE id = ?', (slot_id,)).fetchone()
+        return {'ownerEmail': row[0], 'floorNumber': row[1]} if row else None
+
+    def find_slots_by_owner_email(self, owner_email):
+        return self._all('SELECT data FROM slots WHERE ownerEmail = ? ORDER BY id', (owner_email,))
+
+    def find_slots_page(self, owner_email, limit, cursor=None, floor_number=None, fields=None):
+        start_key = decode_cursor(cursor)
+        sql = 'SELECT data FROM slots WHERE ownerEmail = ? AND id > ?'
+        params = [owner_email, start_key['id'] if start_key else '']
+        if floor_number is not None:
+            sql += ' AND floorNumber = ?'
+            params.append(floor_number)
+        items = self._all(sql + ' ORDER BY id LIMIT ?', (*params, limit + 1))
+        more = len(items) > limit
+        items = items[:limit]
+        next_cursor = encode_cursor({'id': items[-1]['id']}) if more else None
+        return [project(item, fields) for item in items], next_cursor
+
+    def _put_slot(self, slot):
+        self._db.execute(
+            'INSERT OR REPLACE INTO slots (id, ownerEmail, floorNumber, status, data) VALUES (?, ?, ?, ?, ?)',
+            (slot['id'], slot['ownerEmail'], slot.get('floorNumber'), slot.get('status') or None, dumps(slot)))
+
+    def save_slot(self, slot):
+        with self._lock:
+            self._put_slot(slot)
+
+    def _adjust_counters(self, owner_email, floor_number, free_delta, occupied_delta):
+        for scope in ('TOTAL', f'FLOOR#{floor_number}'):
+            self._db.execute(
+                'INSERT INTO slot_counters (ownerEmail, scope, freeSlots, occupiedSlots) VALUES (?, ?, ?, ?)'
+                ' ON CONFLICT (ownerEmail, scope) DO UPDATE SET'
+                ' freeSlots = freeSlots + excluded.freeSlots, occupiedSlots = occupiedSlots + excluded.occupiedSlots',
+                (owner_email, scope, free_delta, occupied_delta))
+
+    def create_slot(self, slot):
+        with self._transaction():
+            existing = self._db.execute('SELECT data FROM slots WHERE id = ?', (slot['id'],)).fetchone()
+            if existing:
+                raise SlotConflict(loads(existing[0]))
+            self._put_slot(slot)
+            self._adjust_counters(slot['ownerEmail'], slot['floorNumber'], 1, 0)
+
+    def batch_create_slots(self, slots):
+        for start in range(0, len(slots), BATCH_WRITE_SIZE):
+            batch = slots[start:start + BATCH_WRITE_SIZE]
+            with self._transaction():
+                existing = {row[0] for row in self._db.execute(
+                    f"SELECT id FROM slots WHERE id IN ({', '.join('?' * len(batch))})",
+                    [slot['id'] for slot in batch])}
+                for slot in batch:
+                    if slot['id'] not in existing:
+                        self._adjust_counters(slot['ownerEmail'], slot['floorNumber'], 1, 0)
+                    self._put_slot(slot)
+            yield {'batch': start // BATCH_WRITE_SIZE + 1, 'written': len(batch), 'failed': 0, 'attempts': 1}
+
+    def claim_slot(self, slot_id, email, booking):
+        with self._transaction():
+            row = self._db.execute('SELECT data FROM slots WHERE id = ?', (slot_id,)).fetchone()
+            slot = loads(row[0]) if row else None
+            if slot is None or slot.get('status'):
+                raise SlotConflict(slot)
+            now = booking_instant(booking)
+            for reservation in self.find_slot_reservations(slot_id, now, shift_time(now, seconds=1)):
+                if reservation['email'] != email:
+                    raise ReservationConflict(reservation)
+            following = self._db.execute(
+                'SELECT "start" FROM reservations WHERE slotId = ? AND "start" > ? ORDER BY "start" LIMIT 1',
+                (slot_id, now)).fetchone()
+            slot.update(booking)
+            slot['holdUntil'] = following[0] if following else None
+            slot['status'] = email
+            updated = self._db.execute('UPDATE slots SET status = ?, data = ? WHERE id = ? AND status IS NULL',
+                                       (email, dumps(slot), slot_id))
+            if updated.rowcount != 1:
+                raise SlotConflict(self.find_slot_by_id(slot_id))
+            self._adjust_counters(slot['ownerEmail'], slot['floorNumber'], -1, 1)
+        return slot
+
+    def release_slot(self, slot_id, email):
+        with self._transaction():
+            row = self._db.execute('SELECT data FROM slots WHERE id = ?', (slot_id,)).fetchone()
+            slot = loads(row[0]) if row else None
+            if (not slot or slot.get('status') != email
+                    or not isinstance(slot.get('bookingDate'), str)
+                    or not isinstance(slot.get('checkinTime'), str)):
+                raise SlotConflict(slot)
+            released = {**slot, **{field: None for field in BOOKING_FIELDS}, 'status': None}
+            updated = self._db.execute('UPDATE slots SET status = NULL, data = ? WHERE id = ? AND status = ?',
+                                       (dumps(released), slot_id, email))
+            if updated.rowcount != 1:
+                raise SlotConflict(self.find_slot_by_id(slot_id))
+            self._adjust_counters(slot['ownerEmail'], slot['floorNumber'], 1, -1)
+        return slot
+
+    def flag_overstay(self, slot, flagged_at):
+        with self._transaction():
+            current = self.find_slot_by_id(slot['id'])
+            if (not current or not current.get('status') or current.get('overstayAt')
+                    or stay_token(current) != stay_token(slot)):
+                return False
+            self._db.execute('UPDATE slots SET data = ? WHERE id = ?',
+                             (dumps({**current, 'overstayAt': flagged_at}), slot['id']))
+        return True
+
+    # Reservations
+    def find_slot_reservations(self, slot_id, start, end):
+        return self._all('SELECT data FROM reservations WHERE slotId = ? AND ' + _OVERLAPPING,
+                         (slot_id, earliest_overlapping_start(start), end, start))
+
+    def find_owner_reservations(self, owner_email, start, end):
+        return self._all('SELECT data FROM reservations WHERE ownerEmail = ? AND ' + _OVERLAPPING,
+                         (owner_email, earliest_overlapping_start(start), end, start))
+
+    def create_reservation(self, reservation):
+        slot_id, start = reservation['slotId'], reservation['start']
+        with self._transaction():
+            slot = self.find_slot_by_id(slot_id)
+            if slot is None or stay_blocks(slot, start):
+                raise SlotConflict(slot)
+            existing = self.find_slot_reservations(slot_id, start, reservation['end'])
+            if existing:
+                raise ReservationConflict(existing[0])
+            self._db.execute(
+                'INSERT INTO reservations (slotId, "start", "end", ownerEmail, email, data) VALUES (?, ?, ?, ?, ?, ?)',
+                (slot_id, start, reservation['end'], reservation['ownerEmail'], reservation['email'],
+                 dumps(reservation)))
+        return reservation
+
+    def cancel_reservation(self, slot_id, start, email):
+        with self._transaction():
+            reservation = self._one('SELECT data FROM reservations WHERE slotId = ? AND "start" = ?',
+                                    (slot_id, start))
+            if not reservation or reservation['email'] != email:
+                raise ReservationConflict(reservation)
+            self._db.execute('DELETE FROM reservations WHERE slotId = ? AND "start" = ?', (slot_id, start))
+            slot = self.find_slot_by_id(slot_id)
+            if slot and slot.get('status') and slot.get('holdUntil') == start:
+                following = self._db.execute(
+                    'SELECT "start" FROM reservations WHERE slotId = ? AND "start" > ? ORDER BY "start" LIMIT 1',
+                    (slot_id, start)).fetchone()
+                slot['holdUntil'] = following[0] if following else None
+                self._db.execute('UPDATE slots SET data = ? WHERE id = ?', (dumps(slot), slot_id))
+        return reservation
+
+    # History
+    def append_history(self, entry):
+        entry = {**entry, 'eventKey': history_key(entry)}
+        with self._lock:
+            self._db.execute(
+                'INSERT INTO booking_history (ownerEmail, eventKey, email, expiresAt, data) VALUES (?, ?, ?, ?, ?)',
+                (entry['ownerEmail'], entry['eventKey'], entry['email'], entry.get('expiresAt'), dumps(entry)))
+            # Expiry is a cheap indexed delete, so it rides along with writes
+            self._db.execute('DELETE FROM booking_history WHERE expiresAt IS NOT NULL AND expiresAt <= ?',
+                             (int(time.time()),))
+        return entry
+
+    def _history_page(self, column, value, start, end, limit, cursor):
+        start_key = decode_cursor(cursor)
+        sql = f'SELECT data FROM booking_history WHERE {column} = ? AND (expiresAt IS NULL OR expiresAt > ?)'
+        params = [value, int(time.time())]
+        for condition, bound in (('eventKey >= ?', start), ('eventKey < ?', end),
+                                 ('eventKey < ?', start_key and start_key['eventKey'])):
+            if bound:
+                sql += f' AND {condition}'
+                params.append(bound)
+        items = self._all(sql + ' ORDER BY eventKey DESC LIMIT ?', (*params, limit + 1))
+        more = len(items) > limit
+        items = items[:limit]
+        return items, encode_cursor({'eventKey': items[-1]['eventKey']}) if more else None
+
+    def find_user_history(self, email, start=None, end=None, limit=50, cursor=None):
+        return self._history_page('email', email, start, end, limit, cursor)
+
+    def find_owner_history(self, owner_email, start=None, end=None, limit=50, cursor=None):
+        return self._history_page('ownerEmail', owner_email, start, end, limit, cursor)
+
+    # Rollups
+    def add_rollups(self, owner_email, deltas, token=None):
+        with self._transaction():
+            for key, metrics in deltas.items():
+                row = self._one('SELECT data FROM rollups WHERE ownerEmail = ? AND bucket = ?', (owner_email, key))
+                row = row or {'ownerEmail': owner_email, 'bucket': key}
+                for metric, amount in metrics.items():
+                    row[metric] = row.get(metric, 0) + amount
+                self._db.execute('INSERT OR REPLACE INTO rollups (ownerEmail, bucket, data) VALUES (?, ?, ?)',
+                                 (owner_email, key, dumps(row)))
+
+    def find_rollups(self, owner_email, prefix):
+        # bucket >= prefix AND bucket < prefix + U+FFFF is a prefix range on the key
+        return self._all('SELECT data FROM rollups WHERE ownerEmail = ? AND bucket >= ? AND bucket < ? ORDER BY bucket',
+                         (owner_email, prefix, prefix + '\uffff'))
+
+    def replace_rollups(self, owner_email, rows):
+        with self._transaction():
+            self._db.execute('DELETE FROM rollups WHERE ownerEmail = ?', (owner_email,))
+            self._db.executemany(
+                'INSERT INTO rollups (ownerEmail, bucket, data) VALUES (?, ?, ?)',
+                [(owner_email, key, dumps({**metrics, 'ownerEmail': owner_email, 'bucket': key}))
+                 for key, metrics in rows.items()])
+
+    # Counters
+    def find_availability(self, owner_email):
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT scope, freeSlots, occupiedSlots FROM slot_counters WHERE ownerEmail = ?',
+                (owner_email,)).fetchall()
+        return summarize_counters(owner_email, rows)
+
+    def find_availability_for_owners(self, owner_emails):
+        emails = list(dict.fromkeys(owner_emails))
+        if not emails:
+            return {}
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT ownerEmail, freeSlots, occupiedSlots FROM slot_counters'
+                f" WHERE scope = 'TOTAL' AND ownerEmail IN ({', '.join('?' * len(emails))})",
+                emails).fetchall()
+        return {email: {'free': free, 'occupied': occupied} for email, free, occupied in rows}
+
+    def rebuild_slot_counters(self, owner_email):
+        with self._transaction():
+            counts = count_slots(self.find_slots_by_owner_email(owner_email))
+            self._db.execute('DELETE FROM slot_counters WHERE ownerEmail = ?', (owner_email,))
+            self._set_counters(owner_email, 'TOTAL', sum(c['free'] for c in counts.values()),
+                               sum(c['occupied'] for c in counts.values()))
+            for floor_number, c in counts.items():
+                self._set_counters(owner_email, f'FLOOR#{floor_number}', c['free'], c['occupied'])
+        return counts
+
+    def _set_counters(self, owner_email, scope, free, occupied):
+        self._db.execute(
+            'INSERT OR REPLACE INTO slot_counters (ownerEmail, scope, freeSlots, occupiedSlots) VALUES (?, ?, ?, ?)',
+            (owner_email, scope, free, occupied))
+
+
+class _Transaction:
+    """Hold the repository lock and wrap the block in BEGIN/COMMIT."""
+
+    def __init__(self, repository):
+        self.repository = repository
+
+    def __enter__(self):
+        self.repository._lock.acquire()
+        try:
+            self.repository._db.execute('BEGIN IMMEDIATE')
+        except Exception:
+            self.repository._lock.release()
+            raise
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.repository._db.execute('ROLLBACK' if exc_type else 'COMMIT')
+        finally:
+            self.repository._lock.release()
+        return False
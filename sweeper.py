@@ -0,0 +1,89 @@
+"""Overstay sweeping for open bookings.
+
+A stay expires STAY_MAX_HOURS after check-in, or earlier when the slot's
+next reservation starts first (holdUntil). The sweeper runs in
+its own process (`flask sweep-overstays`), never on a request, and keeps
+the known stays in an ExpiryHeap ordered by expiry, so each tick only looks
+at the stays that are due.
+
+The heap is filled by reconciliation: every tick reads one page of lots,
+skips the ones whose counters show nothing occupied, and pages through the
+slots of the rest. A full pass over the lots takes as many ticks as there
+are pages, and no tick reads more than one page of them. Due stays are
+re-read before anything is done to them, so a stay that ended or changed
+since it was seen is left alone.
+"""
+import heapq
+import itertools
+import threading
+from datetime import datetime, timedelta
+
+from billing import booking_start
+
+
+def stay_expiry(slot, max_hours=0):
+    """Return when slot's stay expires as a naive datetime, or None if it never does."""
+    expiries = []
+    if slot.get('holdUntil'):
+        expiries.append(datetime.fromisoformat(slot['holdUntil']))
+    if max_hours:
+        expiries.append(booking_start(slot) + timedelta(hours=max_hours))
+    return min(expiries, default=None)
+
+
+class ExpiryHeap:
+    """Min-heap of stays by expiry, one entry per slot.
+
+    Re-adding a slot replaces its entry; replaced and discarded entries are
+    dropped lazily when they reach the top.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._entries = {}
+        self._order = itertools.count()  # breaks expiry ties without comparing tokens
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, slot_id):
+        return slot_id in self._entries
+
+    def add(self, slot_id, expiry, token):
+        if self._entries.get(slot_id) == (expiry, token):
+            return
+        self._entries[slot_id] = (expiry, token)
+        heapq.heappush(self._heap, (expiry, next(self._order), slot_id, token))
+
+    def discard(self, slot_id):
+        self._entries.pop(slot_id, None)
+
+    def pop_due(self, now):
+        """Remove and return [(slot_id, token)] of every stay expired by now."""
+        due = []
+        while self._drop_stale() and self._heap[0][0] <= now:
+            expiry, _, slot_id, token = heapq.heappop(self._heap)
+            del self._entries[slot_id]
+            due.append((slot_id, token))
+        return due
+
+    def _drop_stale(self):
+        while self._heap:
+            expiry, _, slot_id, token = self._heap[0]
+            if self._entries.get(slot_id) == (expiry, token):
+                return True
+            heapq.heappop(self._heap)
+        return False
+
+
+def run(tick, interval, stop=None, log=None):
+    """Call tick() every interval seconds until stop is set."""
+    stop = stop or threading.Event()
+    while not stop.is_set():
+        try:
+            tick()
+        except Exception as e:
+            if log is None:
+                raise
+            log.error("Overstay sweep failed: %s", e)
+        stop.wait(interval)
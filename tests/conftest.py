@@ -0,0 +1,51 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+
+
+@pytest.fixture
+def dynamodb_repository():
+    """A DynamoDBRepository on moto with every table created."""
+    from moto import mock_aws
+
+    from storage.dynamodb import DynamoDBRepository
+
+    with mock_aws():
+        repository = DynamoDBRepository()
+        assert repository.init_schema()
+        yield repository
+
+
+def free_slot(slot_id, owner_email='lot@example.com', floor_number='1'):
+    return {'id': slot_id, 'ownerEmail': owner_email, 'slotNumber': '1', 'floorNumber': floor_number,
+            'bookingDate': None, 'checkinTime': None, 'status': None}
+
+
+def logged_in(app_module, email):
+    """A test client whose session belongs to email."""
+    client = app_module.app.test_client()
+    with client.session_transaction() as session:
+        session['logged_in_email'] = email
+    return client
+
+
+@pytest.fixture
+def app_module(monkeypatch):
+    """The app on a fresh in-memory repository."""
+    os.environ['STORAGE_BACKEND'] = 'memory'
+    os.environ.setdefault('LOG_LEVEL', 'ERROR')
+    import app
+
+    from storage.memory import MemoryRepository
+
+    monkeypatch.setattr(app, 'repository', MemoryRepository())
+    for cache in (app.owner_cache, app.fragment_cache):
+        cache.clear()
+    app.app.config['TESTING'] = True
+    return app
@@ -0,0 +1,54 @@
+"""Structured logging: redacted, filtered on the caller, written off-thread."""
+import io
+import json
+import logging
+import queue
+
+from applog import REDACTED, DroppingQueueHandler, RouteLevelFilter, SamplingFilter, redact, setup_logging
+
+
+def record(level, data=None):
+    entry = logging.LogRecord('parking', level, __file__, 1, 'message %s', ('here',), None)
+    if data is not None:
+        entry.data = data
+    return entry
+
+
+def test_redact_masks_sensitive_keys_at_any_depth():
+    value = {'email': 'a@example.com', 'Password': 'x', 'items': [{'token': 't', 'slot': 's1'}]}
+
+    assert redact(value) == {'email': 'a@example.com', 'Password': REDACTED,
+                             'items': [{'token': REDACTED, 'slot': 's1'}]}
+
+
+def test_route_level_filter_uses_the_default_outside_requests():
+    level_filter = RouteLevelFilter(logging.INFO, {'book_slot': logging.DEBUG})
+
+    assert not level_filter.filter(record(logging.DEBUG))
+    assert level_filter.filter(record(logging.INFO))
+
+
+def test_sampling_never_drops_warnings():
+    assert SamplingFilter(0.0).filter(record(logging.WARNING))
+    assert not SamplingFilter(0.0).filter(record(logging.DEBUG))
+
+
+def test_full_queue_drops_instead_of_blocking():
+    handler = DroppingQueueHandler(queue.Queue(maxsize=1))
+
+    handler.emit(record(logging.INFO))
+    handler.emit(record(logging.INFO))
+
+    assert handler.dropped == 1
+
+
+def test_records_are_written_as_redacted_json_lines():
+    stream = io.StringIO()
+    logger = setup_logging('parking.test-applog', stream=stream)
+    logger.info('Saving owner', extra={'data': {'email': 'a@example.com', 'password': 'x'}})
+    logger.queue_handler.queue.join()
+
+    entry = json.loads(stream.getvalue())
+    assert entry['message'] == 'Saving owner'
+    assert entry['level'] == 'INFO'
+    assert entry['data'] == {'email': 'a@example.com', 'password': REDACTED}
@@ -0,0 +1,78 @@
+"""Built assets are fingerprinted, precompressed and served immutable."""
+import gzip
+import json
+import os
+
+import pytest
+from flask import Flask, render_template_string
+
+from assets import Assets, VENDOR_ASSETS, build_assets
+
+CSS = 'body { background: url("../img/bg.png?v=1"); } ' * 20
+
+
+@pytest.fixture
+def static_dir(tmp_path):
+    static = tmp_path / 'static'
+    (static / 'css').mkdir(parents=True)
+    (static / 'img').mkdir()
+    (static / 'css' / 'style.css').write_text(CSS)
+    (static / 'img' / 'bg.png').write_bytes(b'not really a png')
+    return static
+
+
+def built_app(static_dir):
+    build_assets(str(static_dir), log=lambda message: None)
+    app = Flask(__name__, static_folder=str(static_dir))
+    return app, Assets(app)
+
+
+def test_build_fingerprints_files_and_rewrites_css(static_dir):
+    manifest = build_assets(str(static_dir), log=lambda message: None)
+
+    css, image = manifest['files']['css/style.css'], manifest['files']['img/bg.png']
+    assert css.startswith('css/style.') and image.startswith('img/bg.') and image != 'img/bg.png'
+    built_css = (static_dir / 'dist' / css).read_text()
+    assert f'url("../{image}?v=1")' in built_css
+    assert gzip.decompress((static_dir / 'dist' / (css + '.gz')).read_bytes()).decode() == built_css
+    assert json.loads((static_dir / 'dist' / 'manifest.json').read_text()) == manifest
+
+
+def test_asset_url_resolves_through_the_manifest(static_dir):
+    app, assets = built_app(static_dir)
+
+    with app.test_request_context():
+        assert assets.asset_url('css/style.css') == '/assets/' + assets.manifest['files']['css/style.css']
+        assert assets.asset_url('js/missing.js') == '/static/js/missing.js'
+        vendored = 'vendor/jquery-3.5.1/jquery.slim.min.js'
+        assert assets.asset_url(vendored) == VENDOR_ASSETS[vendored]
+
+
+def test_built_files_are_served_precompressed_and_immutable(static_dir):
+    app, assets = built_app(static_dir)
+    url = '/assets/' + assets.manifest['files']['css/style.css']
+
+    response = app.test_client().get(url, headers={'Accept-Encoding': 'gzip'})
+
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    assert 'immutable' in response.headers['Cache-Control']
+    assert gzip.decompress(response.data).decode().startswith('body')
+
+
+def test_templates_fall_back_to_static_without_a_build(static_dir):
+    app = Flask(__name__, static_folder=str(static_dir))
+    Assets(app)
+
+    with app.test_request_context():
+        html = render_template_string("{{ asset_picture('img/bg.png', 'Background', lazy=True) }}")
+    assert html == '<img src="/static/img/bg.png" alt="Background" loading="lazy" decoding="async">'
+
+
+def test_vercel_build_vendors_then_builds_and_ships_static():
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'vercel.json')) as f:
+        config = json.load(f)
+
+    steps = config['buildCommand'].split(' && ')
+    assert [step.rsplit(' ', 1)[1] for step in steps] == ['vendor-assets', 'build-assets']
+    assert config['functions']['app.py']['includeFiles'] == 'static/**'
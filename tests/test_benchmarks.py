@@ -0,0 +1,49 @@
+"""The route benchmark runs end to end and gates on p99 regressions."""
+import json
+import os
+import subprocess
+import sys
+
+BENCHMARKS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks')
+sys.path.insert(0, BENCHMARKS)
+
+from common import percentile  # noqa: E402
+from routes import compare  # noqa: E402
+
+
+def test_percentile_picks_the_nearest_rank():
+    samples = list(range(1, 101))
+
+    assert percentile(samples, 50) == 51
+    assert percentile(samples, 99) == 99
+    assert percentile([], 99) == 0.0
+
+
+def test_compare_flags_only_routes_past_the_tolerance():
+    baseline = {'book': {'p99': 0.010}, 'cancel': {'p99': 0.010}}
+    results = {'book': {'p99': 0.016}, 'cancel': {'p99': 0.014}, 'login': {'p99': 1.0}}
+
+    regressions = compare(results, baseline, 1.5)
+
+    assert len(regressions) == 1 and regressions[0].startswith('book:')
+
+
+def test_routes_benchmark_saves_a_baseline(tmp_path):
+    baseline = tmp_path / 'baseline.json'
+    subprocess.run([sys.executable, os.path.join(BENCHMARKS, 'routes.py'), '--owners', '3', '--slots', '20',
+                    '--drivers', '2', '--iterations', '4', '--baseline', str(baseline), '--save-baseline'],
+                   check=True, capture_output=True)
+
+    results = json.loads(baseline.read_text())
+    assert set(results) == {'login', 'owners', 'slots', 'book', 'get_bill', 'cancel'}
+    assert all(route['p99'] > 0 for route in results.values())
+
+
+def test_booking_contention_books_against_a_seeded_lot():
+    result = subprocess.run([sys.executable, os.path.join(BENCHMARKS, 'booking_contention.py'),
+                             '--backend', 'memory', '--threads', '3', '--rounds', '2'],
+                            capture_output=True, text=True)
+
+    assert result.returncode == 0, result.stderr
+    assert 'rounds with more than one winner: 0' in result.stdout
+    assert 'not found' not in result.stdout + result.stderr
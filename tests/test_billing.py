@@ -0,0 +1,78 @@
+"""Tiered, grace-period billing; the batch path bills like the single one."""
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+from billing import BillingError, Tariff, accrued_charges, compute_charge
+
+START = datetime(2024, 5, 1, 10, 0, 0)
+TIERED = Tariff('20', grace_minutes=15, tiers=[{'fromHours': 2, 'costPerHour': '30'},
+                                               {'fromHours': '4.5', 'costPerHour': '12.5'}])
+
+
+def test_flat_rate_is_prorated_to_the_paisa():
+    assert compute_charge(Tariff('20'), START, START + timedelta(minutes=90)) == Decimal('30.00')
+    assert compute_charge(Tariff('20'), START, START + timedelta(seconds=100)) == Decimal('0.56')
+
+
+def test_stays_within_grace_are_free():
+    assert compute_charge(TIERED, START, START + timedelta(minutes=15)) == Decimal('0.00')
+    assert compute_charge(TIERED, START, START + timedelta(minutes=16)) == Decimal('5.33')
+
+
+def test_each_tier_bills_its_own_hours():
+    # 2h at 20, 2.5h at 30, 1.5h at 12.5
+    assert compute_charge(TIERED, START, START + timedelta(hours=6)) == Decimal('133.75')
+
+
+def test_negative_stay_is_an_error():
+    with pytest.raises(BillingError):
+        compute_charge(TIERED, START, START - timedelta(seconds=1))
+
+
+def stays():
+    return [START + timedelta(seconds=s) for s in (0, 59, 900, 901, 3599, 7200, 7201, 16199, 16200, 30000)]
+
+
+def test_batch_matches_single_stays():
+    now = START + timedelta(hours=9)
+
+    expected = [compute_charge(TIERED, start, now) for start in stays()]
+
+    assert accrued_charges(TIERED, stays(), now) == expected
+
+
+def test_future_stays_accrue_nothing():
+    assert accrued_charges(TIERED, [START + timedelta(hours=1)], START) == [Decimal('0.00')]
+
+
+def test_fallback_without_numpy_matches(monkeypatch):
+    now = START + timedelta(hours=9)
+    with_numpy = accrued_charges(TIERED, stays(), now)
+    monkeypatch.setitem(sys.modules, 'numpy', None)  # makes `import numpy` raise ImportError
+
+    assert accrued_charges(TIERED, stays(), now) == with_numpy
+
+
+@pytest.fixture
+def new_york(monkeypatch):
+    """Interpret naive datetimes in a zone with DST, as the servers' local time may."""
+    monkeypatch.setenv('TZ', 'America/New_York')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+@pytest.mark.parametrize('start, now', [
+    (datetime(2024, 3, 10, 0, 30), datetime(2024, 3, 10, 4, 0)),   # clocks go forward at 2:00
+    (datetime(2024, 11, 3, 0, 30), datetime(2024, 11, 3, 4, 0)),   # clocks go back at 2:00
+])
+def test_batch_matches_single_stays_across_dst(new_york, start, now):
+    expected = [compute_charge(TIERED, start, now)]
+
+    assert accrued_charges(TIERED, [start], now) == expected
+    assert expected == [compute_charge(TIERED, START, START + (now - start))]
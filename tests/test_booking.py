@@ -0,0 +1,54 @@
+"""/book and /cancel claim and release a slot with one conditional write."""
+import pytest
+
+from conftest import free_slot, logged_in
+
+
+@pytest.fixture
+def lot(app_module):
+    app_module.save_owner({'email': 'lot@example.com', 'password': 'x', 'orgType': 'mall',
+                           'orgName': 'Lot', 'costPerHour': 20})
+    app_module.save_slot(free_slot('s1'))
+    return app_module
+
+
+def test_book_claims_a_free_slot(lot):
+    response = logged_in(lot, 'driver@example.com').post('/book', data={'slotId': 's1'})
+
+    assert response.status_code == 200
+    slot = lot.find_slot_by_id('s1')
+    assert slot['status'] == 'driver@example.com'
+    assert slot['bookingDate'] and slot['checkinTime']
+
+
+def test_second_booking_conflicts(lot):
+    assert logged_in(lot, 'driver@example.com').post('/book', data={'slotId': 's1'}).status_code == 200
+
+    response = logged_in(lot, 'other@example.com').post('/book', data={'slotId': 's1'})
+
+    assert response.status_code == 409
+    assert lot.find_slot_by_id('s1')['status'] == 'driver@example.com'
+
+
+def test_booking_a_missing_slot_is_not_found(lot):
+    response = logged_in(lot, 'driver@example.com').post('/book', data={'slotId': 'nope'})
+
+    assert response.status_code == 404
+
+
+def test_only_the_holder_can_cancel(lot):
+    logged_in(lot, 'driver@example.com').post('/book', data={'slotId': 's1'})
+
+    response = logged_in(lot, 'other@example.com').post('/cancel', data={'slotId': 's1'})
+    assert response.status_code == 403
+    assert lot.find_slot_by_id('s1')['status'] == 'driver@example.com'
+
+    response = logged_in(lot, 'driver@example.com').post('/cancel', data={'slotId': 's1'})
+    assert response.status_code == 200
+    assert not lot.find_slot_by_id('s1')['status']
+
+
+def test_cancelling_a_free_slot_is_rejected(lot):
+    response = logged_in(lot, 'driver@example.com').post('/cancel', data={'slotId': 's1'})
+
+    assert response.status_code == 400
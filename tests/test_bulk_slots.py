@@ -0,0 +1,42 @@
+"""/addSlotsBulk writes slots in batches and streams progress per batch."""
+import io
+import json
+
+from conftest import logged_in
+
+
+def post_bulk(app_module, **data):
+    response = logged_in(app_module, 'lot@example.com').post(
+        '/addSlotsBulk', data=data, content_type='multipart/form-data')
+    return response.status_code, [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_ranges_are_written_in_batches(app_module):
+    status, lines = post_bulk(app_module, floorFrom='1', floorTo='2', slotFrom='1', slotTo='20')
+
+    assert status == 200
+    assert [line['batch'] for line in lines[:-1]] == [1, 2]
+    assert lines[-1] == {'status': 'success', 'total': 40, 'written': 40, 'failed': 0}
+    slots = app_module.find_slots_by_owner_email('lot@example.com')
+    assert sorted((s['floorNumber'], s['slotNumber']) for s in slots) == sorted(
+        (str(floor), str(slot)) for floor in (1, 2) for slot in range(1, 21))
+    assert all(not slot['status'] for slot in slots)
+
+
+def test_csv_upload_skips_header_and_duplicates(app_module):
+    upload = (io.BytesIO(b'floorNumber,slotNumber\n1,A1\n1,A2\n1,A1\n\n2,B1\n'), 'slots.csv')
+
+    status, lines = post_bulk(app_module, slotsCsv=upload)
+
+    assert status == 200
+    assert lines[-1]['written'] == 3
+    slots = app_module.find_slots_by_owner_email('lot@example.com')
+    assert sorted(s['slotNumber'] for s in slots) == ['A1', 'A2', 'B1']
+
+
+def test_requests_over_the_limit_are_refused(app_module):
+    status, lines = post_bulk(app_module, floorFrom='1', floorTo='100', slotFrom='1', slotTo='100')
+
+    assert status == 400
+    assert 'At most' in lines[0]['message']
+    assert app_module.find_slots_by_owner_email('lot@example.com') == []
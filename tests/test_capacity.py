@@ -0,0 +1,74 @@
+"""Capacity comes from the environment and throttled calls back off, then give up."""
+import pytest
+
+from storage import Throttled
+from storage.dynamodb import RetryBudget, ThrottleRetry, parse_capacity, table_definition
+
+
+class Operation:
+    name = 'GetItem'
+
+
+def throttled(code='ProvisionedThroughputExceededException'):
+    return (None, {'Error': {'Code': code}})
+
+
+def cancelled(*reasons):
+    return (None, {'Error': {'Code': 'TransactionCanceledException'},
+                   'CancellationReasons': [{'Code': reason} for reason in reasons]})
+
+
+def test_parse_capacity():
+    assert parse_capacity('SlotDetails=20/10, SlotDetails.OwnerEmailIndex=8,*=5/5') == {
+        'SlotDetails': (20, 10), 'SlotDetails.OwnerEmailIndex': (8, 8), '*': (5, 5)}
+    with pytest.raises(ValueError):
+        parse_capacity('SlotDetails=lots')
+
+
+def test_table_definition_sizes_tables_and_indexes(monkeypatch):
+    monkeypatch.setenv('DYNAMODB_CAPACITY', 'SlotDetails=20/10')
+    definition = table_definition('SlotDetails')
+
+    assert definition['BillingMode'] == 'PROVISIONED'
+    assert definition['ProvisionedThroughput'] == {'ReadCapacityUnits': 20, 'WriteCapacityUnits': 10}
+    assert all(index['ProvisionedThroughput'] == {'ReadCapacityUnits': 20, 'WriteCapacityUnits': 10}
+               for index in definition['GlobalSecondaryIndexes'])
+
+    monkeypatch.setenv('DYNAMODB_CAPACITY_MODE', 'on-demand')
+    definition = table_definition('SlotDetails')
+
+    assert definition['BillingMode'] == 'PAY_PER_REQUEST'
+    assert 'ProvisionedThroughput' not in definition
+    assert all('ProvisionedThroughput' not in index for index in definition['GlobalSecondaryIndexes'])
+
+
+def test_only_throttle_only_cancellations_count_as_throttled():
+    assert ThrottleRetry.throttle_code(throttled()) == 'ProvisionedThroughputExceededException'
+    assert ThrottleRetry.throttle_code(cancelled('ThrottlingError', 'None')) == 'ThrottlingError'
+    assert ThrottleRetry.throttle_code(cancelled('ThrottlingError', 'ConditionalCheckFailed')) is None
+    assert ThrottleRetry.throttle_code(throttled('ValidationException')) is None
+
+
+def test_retries_back_off_then_raise_throttled(monkeypatch):
+    monkeypatch.setattr('storage.dynamodb.random.uniform', lambda low, high: high)
+    retry = ThrottleRetry(max_attempts=3, base_delay=0.1, max_delay=0.15)
+    request_dict = {'context': {}}
+
+    delays = [retry.needs_retry(throttled(), attempts, Operation(), request_dict) for attempts in (1, 2, 3)]
+
+    assert delays == [0.1, 0.15, False]
+    with pytest.raises(Throttled) as raised:
+        retry.raise_throttled(request_dict)
+    assert raised.value.attempts == 3
+    assert retry.needs_retry((None, {}), 1, Operation(), {'context': {}}) is None
+
+
+def test_spent_budget_stops_retries(monkeypatch):
+    monkeypatch.setattr('storage.dynamodb.time.monotonic', lambda: 0.0)
+    budget = RetryBudget(ratio=0.5, min_per_second=0, maxsize=1)
+
+    assert budget.withdraw()
+    assert not budget.withdraw()
+    budget.deposit()
+    budget.deposit()
+    assert budget.withdraw()
@@ -0,0 +1,49 @@
+"""Importing the app is cheap: no DynamoDB calls until a table is used."""
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+PROBE = """
+import botocore.endpoint
+calls = []
+botocore.endpoint.Endpoint.make_request = lambda self, model, request: calls.append(model.name)
+import app
+print('CALLS', calls)
+print('STARTUP', app.STARTUP_SECONDS)
+"""
+
+
+HEAVY_MODULES = """
+import sys
+import app
+print('LOADED', sorted(name for name in ('boto3', 'botocore', 'numpy') if name in sys.modules))
+"""
+
+
+def probe(script=PROBE, **env):
+    output = subprocess.run([sys.executable, '-c', script], cwd=ROOT, capture_output=True, text=True,
+                            check=True, env={**os.environ, **env}).stdout
+    return dict(line.split(' ', 1) for line in output.splitlines()
+                if line.startswith(('CALLS', 'STARTUP', 'LOADED')))
+
+
+def test_import_makes_no_dynamodb_calls():
+    result = probe()
+
+    assert result['CALLS'] == '[]'
+    assert float(result['STARTUP']) > 0
+
+
+def test_memory_and_sqlite_starts_load_neither_boto3_nor_numpy(tmp_path):
+    assert probe(HEAVY_MODULES, STORAGE_BACKEND='memory')['LOADED'] == '[]'
+    assert probe(HEAVY_MODULES, STORAGE_BACKEND='sqlite',
+                 SQLITE_PATH=str(tmp_path / 'parking.db'))['LOADED'] == '[]'
+
+
+def test_init_tables_command_is_idempotent(app_module):
+    runner = app_module.app.test_cli_runner()
+
+    assert runner.invoke(args=['init-tables']).exit_code == 0
+    assert runner.invoke(args=['init-tables']).exit_code == 0
@@ -0,0 +1,50 @@
+"""DynamoDB resources are per thread by default and share one tuned config."""
+import threading
+
+from storage.dynamodb import ClientFactory, client_config
+
+
+def resource_in_thread(factory):
+    result = []
+    thread = threading.Thread(target=lambda: result.append(factory.resource()))
+    thread.start()
+    thread.join()
+    return result[0]
+
+
+def test_each_thread_gets_its_own_resource():
+    factory = ClientFactory(scope='thread')
+
+    assert factory.resource() is factory.resource()
+    assert factory.table('Owners') is factory.table('Owners')
+    assert resource_in_thread(factory) is not factory.resource()
+
+
+def test_process_scope_shares_one_resource():
+    factory = ClientFactory(scope='process')
+
+    assert resource_in_thread(factory) is factory.resource()
+
+
+def test_client_hooks_reach_existing_and_future_clients():
+    factory = ClientFactory(scope='thread')
+    hooked = []
+    existing = factory.client()
+
+    factory.add_client_hook(hooked.append)
+    future = resource_in_thread(factory).meta.client
+
+    assert hooked == [existing, future]
+
+
+def test_client_config_comes_from_the_environment(monkeypatch):
+    monkeypatch.setenv('DYNAMODB_MAX_POOL_CONNECTIONS', '8')
+    monkeypatch.setenv('DYNAMODB_READ_TIMEOUT', '1.5')
+    monkeypatch.setenv('DYNAMODB_MAX_ATTEMPTS', '3')
+
+    config = client_config()
+
+    assert config.max_pool_connections == 8
+    assert config.read_timeout == 1.5
+    assert config.retries['total_max_attempts'] == 3
+    assert ClientFactory(config=config).client().meta.config.max_pool_connections == 8
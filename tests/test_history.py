@@ -0,0 +1,63 @@
+"""Booking history is append-only and read newest first by user or lot."""
+import pytest
+
+from conftest import free_slot, logged_in
+from storage.memory import MemoryRepository
+from storage.sqlite import SQLiteRepository
+
+
+def entry(at, email='driver@example.com', owner_email='lot@example.com', event='booked', slot_id='s1'):
+    return {'ownerEmail': owner_email, 'email': email, 'slotId': slot_id, 'event': event,
+            'at': f'2024-05-{at}'}
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'dynamodb'])
+def repository(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryRepository()
+    if request.param == 'sqlite':
+        repository = SQLiteRepository(str(tmp_path / 'parking.db'))
+        repository.init_schema()
+        return repository
+    return request.getfixturevalue('dynamodb_repository')
+
+
+def test_user_history_is_paged_newest_first(repository):
+    for day in ('01T10:00:00', '02T10:00:00', '03T10:00:00', '04T10:00:00', '05T10:00:00'):
+        repository.append_history(entry(day))
+    repository.append_history(entry('03T11:00:00', email='other@example.com'))
+
+    first, cursor = repository.find_user_history('driver@example.com', limit=3)
+    rest, last = repository.find_user_history('driver@example.com', limit=3, cursor=cursor)
+
+    assert [e['at'][8:10] for e in first + rest] == ['05', '04', '03', '02', '01']
+    assert last is None
+
+
+def test_history_ranges_end_exclusive(repository):
+    for day in ('01T10:00:00', '02T10:00:00', '03T10:00:00'):
+        repository.append_history(entry(day))
+        repository.append_history(entry(day, email='other@example.com', event='checkout'))
+
+    entries, _ = repository.find_owner_history('lot@example.com', '2024-05-02', '2024-05-03')
+
+    assert sorted((e['email'], e['event']) for e in entries) == [('driver@example.com', 'booked'),
+                                                                ('other@example.com', 'checkout')]
+
+
+def test_routes_record_booking_and_checkout(app_module):
+    app_module.save_owner({'email': 'lot@example.com', 'password': 'x', 'orgType': 'mall',
+                           'orgName': 'Lot', 'costPerHour': 20})
+    app_module.create_slot(free_slot('s1'))
+    driver = logged_in(app_module, 'driver@example.com')
+    driver.post('/book', data={'slotId': 's1'})
+    driver.post('/cancel', data={'slotId': 's1'})
+
+    entries = driver.get('/api/history').get_json()['entries']
+    assert [e['event'] for e in entries] == ['checkout', 'booked']
+    assert entries[0]['bill'] == '0.00' and entries[0]['orgName'] == 'Lot'
+
+    audit = logged_in(app_module, 'lot@example.com').get('/api/owner/history').get_json()
+    assert [e['email'] for e in audit['entries']] == ['driver@example.com'] * 2
+    assert driver.get('/api/owner/history').status_code == 403
+    assert driver.get('/api/history', query_string={'from': 'yesterday'}).status_code == 400
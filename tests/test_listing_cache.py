@@ -0,0 +1,59 @@
+"""Listings carry ETags from version stamps and reuse cached fragments."""
+import pytest
+
+from cache import VersionStamps
+from conftest import free_slot, logged_in
+
+
+@pytest.fixture
+def lot(app_module):
+    app_module.save_owner({'email': 'lot@example.com', 'password': 'x', 'orgType': 'mall',
+                           'orgName': 'Lot', 'costPerHour': 20})
+    for n in range(3):
+        app_module.create_slot(free_slot(f's{n}'))
+    return app_module
+
+
+def test_version_stamps_change_only_when_bumped():
+    versions = VersionStamps(ttl=3600)
+    before = versions.get_many(['a', 'b'])
+
+    versions.bump('a')
+
+    after = versions.get_many(['a', 'b'])
+    assert after[0] != before[0] and after[1] == before[1]
+
+
+def test_unchanged_slot_grid_is_not_modified(lot):
+    client = logged_in(lot, 'driver@example.com')
+    first = client.get('/slots/lot@example.com')
+    assert first.status_code == 200 and first.headers['ETag']
+
+    repeat = client.get('/slots/lot@example.com', headers={'If-None-Match': first.headers['ETag']})
+    assert repeat.status_code == 304
+
+    lot.claim_slot('s1', 'other@example.com')
+    changed = client.get('/slots/lot@example.com', headers={'If-None-Match': first.headers['ETag']})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != first.headers['ETag']
+
+
+def test_drivers_without_a_booking_share_the_cached_grid(lot, monkeypatch):
+    assert logged_in(lot, 'driver@example.com').get('/slots/lot@example.com').status_code == 200
+    monkeypatch.setattr(lot.repository, 'find_slots_by_owner_email', lambda email: pytest.fail('grid re-read'))
+
+    response = logged_in(lot, 'other@example.com').get('/slots/lot@example.com')
+
+    assert response.status_code == 200
+    assert response.get_data(as_text=True).count('class="card available" data-slot-id=') == 3
+
+
+def test_owner_list_etag_follows_owner_writes(lot):
+    client = logged_in(lot, 'driver@example.com')
+    etag = client.get('/owners').headers['ETag']
+    assert client.get('/owners', headers={'If-None-Match': etag}).status_code == 304
+
+    lot.save_owner({'email': 'new@example.com', 'password': 'x', 'orgType': 'mall',
+                    'orgName': 'New', 'costPerHour': 20})
+
+    assert client.get('/owners', headers={'If-None-Match': etag}).status_code == 200
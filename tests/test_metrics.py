@@ -0,0 +1,54 @@
+"""Request and DynamoDB metrics in the Prometheus text format."""
+import boto3
+from moto import mock_aws
+
+from conftest import logged_in
+from metrics import DynamoDBMetrics, Registry
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    latency = registry.histogram('latency_seconds', 'Latency.', ('route',), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5):
+        latency.observe(value, 'book')
+
+    lines = registry.render().splitlines()
+
+    assert 'latency_seconds_bucket{route="book",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{route="book",le="1.0"} 2' in lines
+    assert 'latency_seconds_bucket{route="book",le="+Inf"} 3' in lines
+    assert 'latency_seconds_count{route="book"} 3' in lines
+
+
+def test_label_values_are_escaped():
+    registry = Registry()
+    registry.counter('calls_total', 'Calls.', ('name',)).inc('say "hi"\n')
+
+    assert 'calls_total{name="say \\"hi\\"\\n"} 1' in registry.render()
+
+
+def test_dynamodb_calls_and_capacity_are_counted():
+    with mock_aws():
+        client = boto3.client('dynamodb')
+        client.create_table(TableName='T', KeySchema=[{'AttributeName': 'id', 'KeyType': 'HASH'}],
+                            AttributeDefinitions=[{'AttributeName': 'id', 'AttributeType': 'S'}],
+                            BillingMode='PAY_PER_REQUEST')
+        dynamodb_metrics = DynamoDBMetrics(Registry())
+        dynamodb_metrics.attach(client)
+
+        client.put_item(TableName='T', Item={'id': {'S': 'a'}})
+        client.get_item(TableName='T', Key={'id': {'S': 'a'}})
+
+    assert dynamodb_metrics.calls.value('PutItem') == 1
+    assert dynamodb_metrics.calls.value('GetItem') == 1
+    assert dynamodb_metrics.capacity.value('GetItem', 'T') > 0
+
+
+def test_metrics_endpoint_reports_requests(app_module):
+    client = logged_in(app_module, 'driver@example.com')
+    client.get('/api/availability/lot@example.com')
+
+    body = client.get('/metrics').get_data(as_text=True)
+
+    assert 'http_requests_total{endpoint="get_availability",method="GET",status="200"}' in body
+    assert '# TYPE http_request_duration_seconds histogram' in body
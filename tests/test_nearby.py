@@ -0,0 +1,83 @@
+"""Nearby search reads geohash prefixes and ranks lots by distance."""
+from decimal import Decimal
+
+import pytest
+
+import geo
+from conftest import free_slot, logged_in
+from storage.memory import MemoryRepository
+from storage.sqlite import SQLiteRepository
+
+
+def owner(email, lat, lon, org_type='mall', cost='20'):
+    geohash = geo.encode(lat, lon)
+    return {'email': email, 'password': 'x', 'orgType': org_type, 'orgName': email.split('@')[0],
+            'costPerHour': Decimal(cost), 'lat': Decimal(str(lat)), 'lon': Decimal(str(lon)),
+            'geohash': geohash, 'geoPartition': geohash[:geo.PARTITION_PRECISION]}
+
+
+def test_encode_and_bounds_agree():
+    assert geo.encode(42.6, -5.6, 5) == 'ezs42'
+    min_lat, min_lon, max_lat, max_lon = geo.bounds('ezs42')
+    assert min_lat <= 42.6 <= max_lat and min_lon <= -5.6 <= max_lon
+
+
+def test_block_is_the_cell_and_its_neighbours():
+    cells = geo.block(48.8566, 2.3522, 6)
+
+    assert cells[0] == geo.encode(48.8566, 2.3522, 6)
+    assert len(cells) == 9 and len(set(cells)) == 9
+
+
+def test_distance_is_great_circle():
+    # Paris to London, about 344 km
+    assert geo.distance_km(48.8566, 2.3522, 51.5074, -0.1278) == pytest.approx(343.5, abs=1)
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'dynamodb'])
+def repository(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryRepository()
+    if request.param == 'sqlite':
+        repository = SQLiteRepository(str(tmp_path / 'parking.db'))
+        repository.init_schema()
+        return repository
+    return request.getfixturevalue('dynamodb_repository')
+
+
+def test_prefix_reads_filter_by_type_and_price(repository):
+    repository.save_owner(owner('near@example.com', 48.8566, 2.3522))
+    repository.save_owner(owner('dear@example.com', 48.8567, 2.3523, cost='50'))
+    repository.save_owner(owner('office@example.com', 48.8568, 2.3521, org_type='office'))
+    repository.save_owner(owner('far@example.com', 51.5074, -0.1278))
+    prefix = geo.encode(48.8566, 2.3522, 5)
+
+    found = {o['email'] for o in repository.find_owners_by_geohash(prefix)}
+    cheap_malls = {o['email'] for o in repository.find_owners_by_geohash(prefix, 'mall', Decimal('30'))}
+
+    assert found == {'near@example.com', 'dear@example.com', 'office@example.com'}
+    assert cheap_malls == {'near@example.com'}
+
+
+def test_nearby_ranks_lots_with_free_slots(app_module):
+    for email, lat, lon in (('a@example.com', 48.8570, 2.3522), ('b@example.com', 48.8600, 2.3522),
+                            ('full@example.com', 48.8567, 2.3522)):
+        app_module.save_owner({'email': email, 'password': 'x', 'orgType': 'mall', 'orgName': email,
+                               'costPerHour': 20, 'lat': lat, 'lon': lon})
+        app_module.create_slot(free_slot(f'{email}-1', owner_email=email))
+    driver = logged_in(app_module, 'driver@example.com')
+    driver.post('/book', data={'slotId': 'full@example.com-1'})
+
+    lots = driver.get('/api/lots/nearby?lat=48.8566&lon=2.3522').get_json()['lots']
+    everything = driver.get('/api/lots/nearby?lat=48.8566&lon=2.3522&available=0').get_json()['lots']
+
+    assert [lot['email'] for lot in lots] == ['a@example.com', 'b@example.com']
+    assert lots[0]['distanceKm'] < lots[1]['distanceKm']
+    assert everything[0]['email'] == 'full@example.com' and everything[0]['free'] == 0
+
+
+def test_nearby_rejects_bad_coordinates(app_module):
+    driver = logged_in(app_module, 'driver@example.com')
+
+    assert driver.get('/api/lots/nearby?lat=91&lon=0').status_code == 400
+    assert driver.get('/api/lots/nearby?lat=1').status_code == 400
@@ -0,0 +1,74 @@
+"""Cancelling the reservation a stay was held for must not make the stay overdue."""
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import free_slot
+from storage.memory import MemoryRepository
+from storage.sqlite import SQLiteRepository
+from sweeper import ExpiryHeap
+
+BOOKING = {'bookingDate': '2024-05-01', 'checkinTime': '10:00:00'}
+
+
+def reservation(start, end, email='other@example.com'):
+    return {'slotId': 's1', 'start': start, 'end': end, 'ownerEmail': 'lot@example.com', 'email': email}
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'dynamodb'])
+def repository(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryRepository()
+    if request.param == 'sqlite':
+        repository = SQLiteRepository(str(tmp_path / 'parking.db'))
+        repository.init_schema()
+        return repository
+    return request.getfixturevalue('dynamodb_repository')
+
+
+def test_cancel_moves_hold_to_next_reservation(repository):
+    repository.create_slot(free_slot('s1'))
+    repository.create_reservation(reservation('2024-05-01T12:00:00', '2024-05-01T13:00:00'))
+    repository.create_reservation(reservation('2024-05-01T15:00:00', '2024-05-01T16:00:00'))
+    assert repository.claim_slot('s1', 'driver@example.com', BOOKING)['holdUntil'] == '2024-05-01T12:00:00'
+
+    repository.cancel_reservation('s1', '2024-05-01T12:00:00', 'other@example.com')
+    assert repository.find_slot_by_id('s1')['holdUntil'] == '2024-05-01T15:00:00'
+
+    repository.cancel_reservation('s1', '2024-05-01T15:00:00', 'other@example.com')
+    slot = repository.find_slot_by_id('s1')
+    assert slot['holdUntil'] is None
+    assert slot['status'] == 'driver@example.com'
+
+
+def test_cancel_leaves_unrelated_hold(repository):
+    repository.create_slot(free_slot('s1'))
+    repository.create_reservation(reservation('2024-05-01T12:00:00', '2024-05-01T13:00:00'))
+    repository.create_reservation(reservation('2024-05-01T15:00:00', '2024-05-01T16:00:00'))
+    repository.claim_slot('s1', 'driver@example.com', BOOKING)
+
+    repository.cancel_reservation('s1', '2024-05-01T15:00:00', 'other@example.com')
+    assert repository.find_slot_by_id('s1')['holdUntil'] == '2024-05-01T12:00:00'
+
+
+def test_sweeper_leaves_stay_whose_reservation_was_cancelled(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, 'OVERSTAY_ACTION', 'release')
+    monkeypatch.setattr(app_module, 'STAY_MAX_HOURS', 24)
+    repository = app_module.repository
+    repository.save_owner({'email': 'lot@example.com', 'orgName': 'Lot', 'orgType': 'mall', 'costPerHour': 20})
+    repository.create_slot(free_slot('s1'))
+    checkin = datetime.now().replace(microsecond=0)
+    start = (checkin + timedelta(hours=1)).isoformat()
+    repository.create_reservation(reservation(start, (checkin + timedelta(hours=2)).isoformat()))
+    app_module.claim_slot('s1', 'driver@example.com')
+
+    heap = ExpiryHeap()
+    app_module.reconcile_stays(heap)
+    assert 's1' in heap
+    repository.cancel_reservation('s1', start, 'other@example.com')
+
+    assert app_module.settle_overstays(heap, now=checkin + timedelta(hours=3)) == 0
+    slot = repository.find_slot_by_id('s1')
+    assert slot['status'] == 'driver@example.com'
+    assert not slot.get('overstayAt')
+    assert 's1' in heap  # still tracked, now against STAY_MAX_HOURS
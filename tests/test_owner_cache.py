@@ -0,0 +1,71 @@
+"""Owner lookups read through a bounded TTL cache that writes invalidate."""
+from cache import TTLCache
+
+
+def owner(email, cost):
+    return {'email': email, 'password': 'x', 'orgType': 'mall', 'orgName': 'Lot', 'costPerHour': cost}
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+
+    assert (cache.get('a'), cache.get('b'), cache.get('c')) == (1, None, 3)
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('cache.time.monotonic', lambda: now[0])
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+
+    now[0] += 59
+    assert cache.get('a') == 1
+    now[0] += 2
+    assert cache.get('a') is None
+
+
+def test_lookup_reads_through_the_cache(app_module):
+    app_module.save_owner(owner('lot@example.com', 20))
+
+    assert app_module.find_owner_by_email('lot@example.com')['costPerHour'] == 20
+    assert app_module.owner_cache.get('lot@example.com')['costPerHour'] == 20
+
+
+def test_saving_an_owner_invalidates_it(app_module):
+    app_module.save_owner(owner('lot@example.com', 20))
+    app_module.find_owner_by_email('lot@example.com')
+
+    app_module.save_owner(owner('lot@example.com', 35))
+
+    assert app_module.find_owner_by_email('lot@example.com')['costPerHour'] == 35
+
+
+class FailingCache:
+    hits = misses = 0
+
+    def get(self, key):
+        raise ConnectionError('cache down')
+
+    set = delete = clear = get
+
+
+def test_failing_cache_falls_back_to_the_store(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, 'owner_cache', FailingCache())
+    app_module.save_owner(owner('lot@example.com', 20))
+
+    assert app_module.find_owner_by_email('lot@example.com')['costPerHour'] == 20
+
+
+def test_failing_cache_does_not_let_registration_overwrite_an_owner(app_module, monkeypatch):
+    app_module.save_owner(owner('lot@example.com', 20))
+    monkeypatch.setattr(app_module, 'owner_cache', FailingCache())
+
+    response = app_module.app.test_client().post('/ownregister', data={
+        'email': 'lot@example.com', 'password': 'y', 'orgType': 'mall', 'orgName': 'Other', 'costPerHour': '5'})
+
+    assert 'already registered' in response.get_data(as_text=True)
+    assert app_module.repository.find_owner_by_email('lot@example.com')['orgName'] == 'Lot'
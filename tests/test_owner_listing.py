@@ -0,0 +1,70 @@
+"""Owners are listed a page at a time and exported with a segmented scan."""
+import json
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def owners(app_module):
+    emails = [f'owner{n:02d}@example.com' for n in range(25)]
+    for email in emails:
+        app_module.save_owner({'email': email, 'password': 'secret', 'orgType': 'mall',
+                               'orgName': email.split('@')[0], 'costPerHour': 20})
+    return emails
+
+
+def test_pages_cover_every_owner_once(app_module, owners):
+    seen, cursor = [], None
+    while True:
+        page, cursor = app_module.find_owners_page(limit=10, cursor=cursor)
+        assert len(page) <= 10
+        seen.extend(owner['email'] for owner in page)
+        if cursor is None:
+            break
+
+    assert sorted(seen) == owners
+
+
+def test_pages_leave_out_credentials(app_module, owners):
+    page, _ = app_module.find_owners_page(limit=5)
+
+    assert page and all('password' not in owner for owner in page)
+
+
+def test_tampered_cursor_is_rejected(app_module, owners):
+    with pytest.raises(ValueError):
+        app_module.find_owners_page(limit=5, cursor='not a cursor')
+
+
+def test_export_streams_every_owner_without_passwords(app_module, owners):
+    result = app_module.app.test_cli_runner().invoke(args=['export-owners', '--segments', '3'])
+
+    assert result.exit_code == 0
+    exported = [json.loads(line) for line in result.output.splitlines()]
+    assert sorted(owner['email'] for owner in exported) == owners
+    assert all('password' not in owner for owner in exported)
+
+
+def test_closing_a_segmented_scan_stops_its_workers(dynamodb_repository):
+    for n in range(30):
+        dynamodb_repository.save_owner({'email': f'owner{n:02d}@example.com', 'orgName': 'Lot'})
+    scans = []
+
+    def one_item_pages(params, **kwargs):
+        params['Limit'] = 1
+        scans.append(params['Segment'])
+
+    dynamodb_repository.clients.add_client_hook(
+        lambda client: client.meta.events.register('provide-client-params.dynamodb.Scan', one_item_pages))
+    before = set(threading.enumerate())
+
+    owners = dynamodb_repository.iter_owners(segments=2)
+    next(owners)
+    owners.close()
+    for thread in set(threading.enumerate()) - before:
+        thread.join(timeout=5)
+
+    assert len(scans) < 10
+    assert sorted(owner['email'] for owner in dynamodb_repository.iter_owners(segments=2)) == [
+        f'owner{n:02d}@example.com' for n in range(30)]
@@ -0,0 +1,43 @@
+"""Admission control takes the user's token before resolving the slot's lot."""
+import pytest
+
+from conftest import free_slot
+from ratelimit import TokenBuckets
+
+
+@pytest.fixture
+def limited_app(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, 'RATE_LIMIT_ENABLED', True)
+    monkeypatch.setattr(app_module, 'user_limiter', TokenBuckets(rate=0.001, burst=3))
+    monkeypatch.setattr(app_module, 'lot_limiter', TokenBuckets(rate=0.001, burst=100))
+    app_module.repository.create_slot(free_slot('s1'))
+    lookups = []
+    find_slot_meta = app_module.repository.find_slot_meta
+    monkeypatch.setattr(app_module.repository, 'find_slot_meta',
+                        lambda slot_id: lookups.append(slot_id) or find_slot_meta(slot_id))
+    return app_module, lookups
+
+
+def admit(app_module, email, slot_id='s1'):
+    with app_module.app.test_request_context():
+        response = app_module.admit_booking_request(email, slot_id)
+        return response.status_code if response else 200
+
+
+def test_limited_user_costs_no_lot_lookup(limited_app):
+    app_module, lookups = limited_app
+
+    statuses = [admit(app_module, 'driver@example.com') for _ in range(10)]
+
+    assert statuses == [200] * 3 + [429] * 7
+    assert len(lookups) == 3
+
+
+def test_lot_bucket_applies_to_admitted_users(limited_app, monkeypatch):
+    app_module, lookups = limited_app
+    monkeypatch.setattr(app_module, 'lot_limiter', TokenBuckets(rate=0.001, burst=2))
+
+    statuses = [admit(app_module, f'driver{n}@example.com') for n in range(3)]
+
+    assert statuses == [200, 200, 429]
+    assert len(lookups) == 3
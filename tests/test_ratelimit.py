@@ -0,0 +1,49 @@
+"""Token buckets admit a burst, refill at their rate and answer 429 when empty."""
+import ratelimit
+from conftest import free_slot, logged_in
+from ratelimit import TokenBuckets
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_bucket_admits_burst_then_refills(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ratelimit.time, 'monotonic', clock)
+    buckets = TokenBuckets(rate=2, burst=3)
+
+    assert [buckets.take('u') for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert buckets.take('u') == 0.5
+    clock.now += 0.5
+    assert buckets.take('u') == 0.0
+    assert buckets.take('other') == 0.0
+
+
+def test_least_recently_used_bucket_is_dropped_full(monkeypatch):
+    monkeypatch.setattr(ratelimit.time, 'monotonic', Clock())
+    buckets = TokenBuckets(rate=1, burst=1, maxsize=2)
+    buckets.take('a')
+    buckets.take('b')
+    buckets.take('c')
+
+    assert buckets.take('a') == 0.0
+    assert buckets.take('c') == 1.0
+
+
+def test_book_answers_429_with_retry_after(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, 'RATE_LIMIT_ENABLED', True)
+    monkeypatch.setattr(app_module, 'user_limiter', TokenBuckets(rate=0.5, burst=1))
+    app_module.create_slot(free_slot('s1'))
+    driver = logged_in(app_module, 'driver@example.com')
+
+    assert driver.post('/book', data={'slotId': 's1'}).status_code == 200
+    limited = driver.post('/cancel', data={'slotId': 's1'})
+
+    assert limited.status_code == 429
+    assert limited.headers['Retry-After'] == '2'
+    assert limited.get_json()['retryAfter'] == 2
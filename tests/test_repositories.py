@@ -0,0 +1,107 @@
+"""Every storage backend behaves the same behind the Repository interface."""
+from decimal import Decimal
+
+import pytest
+
+from conftest import free_slot
+from storage import SlotConflict, dumps, loads, make_repository
+from storage.memory import MemoryRepository
+from storage.sqlite import SQLiteRepository
+
+BOOKING = {'bookingDate': '2024-05-01', 'checkinTime': '10:00:00'}
+
+
+def test_json_helpers_keep_decimals_exact():
+    item = {'costPerHour': Decimal('20.50'), 'tiers': [{'fromHours': Decimal('4.5')}], 'name': 'Lot'}
+
+    assert loads(dumps(item)) == item
+    assert str(loads(dumps(item))['costPerHour']) == '20.50'
+    assert loads(None) is None
+    with pytest.raises(TypeError):
+        dumps({'at': object()})
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'dynamodb'])
+def repository(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryRepository()
+    if request.param == 'sqlite':
+        repository = SQLiteRepository(str(tmp_path / 'parking.db'))
+        repository.init_schema()
+        return repository
+    return request.getfixturevalue('dynamodb_repository')
+
+
+def test_make_repository_picks_the_backend(tmp_path):
+    assert make_repository('memory').name == 'memory'
+    assert make_repository('sqlite', path=str(tmp_path / 'p.db')).name == 'sqlite'
+    with pytest.raises(ValueError):
+        make_repository('mongo')
+
+
+def test_users_are_found_by_email_and_username(repository):
+    repository.save_user({'email': 'a@example.com', 'username': 'a', 'password': 'x'})
+
+    assert repository.find_user_by_email('a@example.com')['username'] == 'a'
+    assert repository.find_user_by_username('a')['email'] == 'a@example.com'
+    assert repository.find_user_by_username('b') is None
+
+
+def test_owner_pages_are_projected_and_complete(repository):
+    for n in range(7):
+        repository.save_owner({'email': f'o{n}@example.com', 'password': 'x', 'orgType': 'mall',
+                               'orgName': f'O{n}', 'costPerHour': Decimal('20.5')})
+    seen, cursor = [], None
+    while True:
+        page, cursor = repository.find_owners_page(3, cursor, ['email', 'costPerHour'])
+        assert all(set(owner) == {'email', 'costPerHour'} for owner in page)
+        seen.extend(page)
+        if cursor is None:
+            break
+
+    assert sorted(owner['email'] for owner in seen) == [f'o{n}@example.com' for n in range(7)]
+    assert {owner['costPerHour'] for owner in seen} == {Decimal('20.5')}
+
+
+def test_claim_and_release_are_conditional(repository):
+    repository.create_slot(free_slot('s1'))
+
+    assert repository.claim_slot('s1', 'driver@example.com', BOOKING)['status'] == 'driver@example.com'
+    with pytest.raises(SlotConflict) as raised:
+        repository.claim_slot('s1', 'other@example.com', BOOKING)
+    assert raised.value.slot['status'] == 'driver@example.com'
+    with pytest.raises(SlotConflict):
+        repository.release_slot('s1', 'other@example.com')
+    with pytest.raises(SlotConflict) as raised:
+        repository.claim_slot('missing', 'driver@example.com', BOOKING)
+    assert raised.value.slot is None
+
+    released = repository.release_slot('s1', 'driver@example.com')
+    assert (released['bookingDate'], released['checkinTime']) == ('2024-05-01', '10:00:00')
+    assert not repository.find_slot_by_id('s1')['status']
+
+
+def test_counters_follow_slot_writes(repository):
+    progress = list(repository.batch_create_slots([free_slot(f's{n}', floor_number=str(n % 2 + 1))
+                                                   for n in range(30)]))
+    assert sum(batch['written'] for batch in progress) == 30
+    repository.claim_slot('s1', 'driver@example.com', BOOKING)
+
+    summary = repository.find_availability('lot@example.com')
+    assert (summary['free'], summary['occupied']) == (29, 1)
+    assert summary['floors']['2'] == {'free': 14, 'occupied': 1}
+    assert repository.find_availability_for_owners(['lot@example.com']) == {
+        'lot@example.com': {'free': 29, 'occupied': 1}}
+
+
+def test_slot_pages_filter_by_floor(repository):
+    for n in range(9):
+        repository.create_slot(free_slot(f's{n}', floor_number=str(n % 3 + 1)))
+    seen, cursor = [], None
+    while True:
+        page, cursor = repository.find_slots_page('lot@example.com', 2, cursor, '3', ['id', 'floorNumber'])
+        seen.extend(page)
+        if cursor is None:
+            break
+
+    assert sorted(slot['id'] for slot in seen) == ['s2', 's5', 's8']
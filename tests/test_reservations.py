@@ -0,0 +1,103 @@
+"""Reservations never overlap, and bookings respect and record them."""
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import free_slot, logged_in
+from storage import ReservationConflict, SlotConflict
+from storage.memory import MemoryRepository
+from storage.sqlite import SQLiteRepository
+
+BOOKING = {'bookingDate': '2024-05-01', 'checkinTime': '10:00:00'}
+
+
+def reservation(start, end, email='other@example.com', slot_id='s1'):
+    return {'slotId': slot_id, 'start': f'2024-05-01T{start}', 'end': f'2024-05-01T{end}',
+            'ownerEmail': 'lot@example.com', 'floorNumber': '1', 'email': email}
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'dynamodb'])
+def repository(request, tmp_path):
+    if request.param == 'memory':
+        repository = MemoryRepository()
+    elif request.param == 'sqlite':
+        repository = SQLiteRepository(str(tmp_path / 'parking.db'))
+        repository.init_schema()
+    else:
+        repository = request.getfixturevalue('dynamodb_repository')
+    repository.create_slot(free_slot('s1'))
+    repository.create_slot(free_slot('s2'))
+    return repository
+
+
+def test_overlapping_windows_conflict(repository):
+    repository.create_reservation(reservation('12:00:00', '14:00:00'))
+
+    with pytest.raises(ReservationConflict) as raised:
+        repository.create_reservation(reservation('13:00:00', '15:00:00', email='driver@example.com'))
+    assert raised.value.reservation['start'] == '2024-05-01T12:00:00'
+
+    repository.create_reservation(reservation('14:00:00', '15:00:00', email='driver@example.com'))
+    repository.create_reservation(reservation('12:00:00', '14:00:00', slot_id='s2'))
+
+
+def test_lot_reservations_are_found_by_window(repository):
+    repository.create_reservation(reservation('08:00:00', '09:00:00'))
+    repository.create_reservation(reservation('12:00:00', '14:00:00'))
+    repository.create_reservation(reservation('13:00:00', '16:00:00', slot_id='s2'))
+
+    found = repository.find_owner_reservations('lot@example.com', '2024-05-01T13:30:00', '2024-05-01T15:00:00')
+
+    assert [(r['slotId'], r['start']) for r in found] == [('s1', '2024-05-01T12:00:00'),
+                                                          ('s2', '2024-05-01T13:00:00')]
+
+
+def test_booking_holds_until_the_next_reservation(repository):
+    repository.create_reservation(reservation('12:00:00', '13:00:00'))
+
+    slot = repository.claim_slot('s1', 'driver@example.com', BOOKING)
+
+    assert slot['holdUntil'] == '2024-05-01T12:00:00'
+    assert repository.claim_slot('s2', 'driver@example.com', BOOKING)['holdUntil'] is None
+
+
+def test_booking_inside_someone_elses_window_conflicts(repository):
+    repository.create_reservation(reservation('09:00:00', '11:00:00'))
+
+    with pytest.raises(ReservationConflict):
+        repository.claim_slot('s1', 'driver@example.com', BOOKING)
+    assert repository.claim_slot('s1', 'other@example.com', BOOKING)['status'] == 'other@example.com'
+
+
+def test_open_ended_stay_blocks_new_reservations(repository):
+    repository.claim_slot('s1', 'driver@example.com', BOOKING)
+
+    with pytest.raises(SlotConflict):
+        repository.create_reservation(reservation('12:00:00', '13:00:00'))
+
+
+def test_only_the_reserver_can_cancel(repository):
+    repository.create_reservation(reservation('12:00:00', '13:00:00'))
+
+    with pytest.raises(ReservationConflict):
+        repository.cancel_reservation('s1', '2024-05-01T12:00:00', 'driver@example.com')
+    repository.cancel_reservation('s1', '2024-05-01T12:00:00', 'other@example.com')
+    with pytest.raises(ReservationConflict) as raised:
+        repository.cancel_reservation('s1', '2024-05-01T12:00:00', 'other@example.com')
+    assert raised.value.reservation is None
+
+
+def test_reserve_route_and_free_slots(app_module):
+    for slot_id in ('s1', 's2'):
+        app_module.create_slot(free_slot(slot_id))
+    start = (datetime.now() + timedelta(days=1)).replace(hour=9, minute=0, second=0, microsecond=0)
+    window = {'start': start.isoformat(), 'end': (start + timedelta(hours=2)).isoformat()}
+    client = logged_in(app_module, 'driver@example.com')
+
+    assert client.post('/reserve', data={'slotId': 's1', **window}).status_code == 200
+    assert logged_in(app_module, 'other@example.com').post(
+        '/reserve', data={'slotId': 's1', **window}).status_code == 409
+    free = client.get('/api/slots/lot@example.com/free', query_string=window).get_json()
+    assert [slot['id'] for slot in free['slots']] == ['s2']
+    assert client.post('/reserve', data={'slotId': 's1', 'start': window['end'],
+                                         'end': window['start']}).status_code == 400
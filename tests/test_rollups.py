@@ -0,0 +1,72 @@
+"""Rollups spread stays over hours and days and agree with a backfill."""
+from decimal import Decimal
+
+import pytest
+
+import rollups
+from conftest import free_slot, logged_in
+from storage.memory import MemoryRepository
+from storage.sqlite import SQLiteRepository
+
+BOOKED = {'event': 'booked', 'floorNumber': '2', 'bookingDate': '2024-05-01', 'checkinTime': '23:30:00',
+          'at': '2024-05-01T23:30:00'}
+CHECKOUT = dict(BOOKED, event='checkout', at='2024-05-02T01:15:00', bill=Decimal('35.00'))
+
+
+def test_checkout_spreads_minutes_over_hours_and_days():
+    deltas = rollups.entry_deltas(CHECKOUT)
+
+    assert deltas['HOUR#2024-05-01T23#TOTAL']['occupiedMinutes'] == Decimal('30.00')
+    assert deltas['HOUR#2024-05-02T00#FLOOR#2']['occupiedMinutes'] == Decimal('60.00')
+    assert deltas['DAY#2024-05-02#TOTAL'] == {'occupiedMinutes': Decimal('75.00'), 'revenue': Decimal('35.00')}
+    assert deltas['DAY#2024-05-01#TOTAL'] == {'occupiedMinutes': Decimal('30.00')}
+
+
+def test_booking_counts_once_at_checkin():
+    assert rollups.entry_deltas(BOOKED) == {
+        'HOUR#2024-05-01T23#TOTAL': {'bookings': 1}, 'HOUR#2024-05-01T23#FLOOR#2': {'bookings': 1},
+        'DAY#2024-05-01#TOTAL': {'bookings': 1}, 'DAY#2024-05-01#FLOOR#2': {'bookings': 1}}
+
+
+def test_backfill_skips_incomplete_entries():
+    rows = rollups.backfill([BOOKED, CHECKOUT, {'event': 'checkout', 'at': 'not a time'}])
+
+    assert rows == rollups.merge(rollups.entry_deltas(BOOKED), rollups.entry_deltas(CHECKOUT))
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'dynamodb'])
+def repository(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryRepository()
+    if request.param == 'sqlite':
+        repository = SQLiteRepository(str(tmp_path / 'parking.db'))
+        repository.init_schema()
+        return repository
+    return request.getfixturevalue('dynamodb_repository')
+
+
+def test_incremental_rows_match_a_backfill(repository):
+    for n, entry in enumerate([BOOKED, CHECKOUT]):
+        repository.add_rollups('lot@example.com', rollups.entry_deltas(entry), token=f'e{n}')
+    incremental = repository.find_rollups('lot@example.com', 'DAY#2024-05')
+
+    repository.replace_rollups('lot@example.com', rollups.backfill([BOOKED, CHECKOUT]))
+
+    assert repository.find_rollups('lot@example.com', 'DAY#2024-05') == incremental
+    summary = rollups.summarize(incremental, 'DAY')
+    assert summary['totals'] == {'occupiedMinutes': Decimal('105.00'), 'bookings': 1, 'revenue': Decimal('35.00')}
+    assert [period['period'] for period in summary['periods']] == ['2024-05-01', '2024-05-02']
+
+
+def test_owner_stats_reflect_bookings(app_module):
+    app_module.save_owner({'email': 'lot@example.com', 'password': 'x', 'orgType': 'mall',
+                           'orgName': 'Lot', 'costPerHour': 20})
+    app_module.create_slot(free_slot('s1'))
+    driver = logged_in(app_module, 'driver@example.com')
+    driver.post('/book', data={'slotId': 's1'})
+    driver.post('/cancel', data={'slotId': 's1'})
+
+    stats = logged_in(app_module, 'lot@example.com').get('/api/owner/stats').get_json()
+
+    assert stats['totals']['bookings'] == 1
+    assert driver.get('/api/owner/stats').status_code == 403
@@ -0,0 +1,46 @@
+"""Lot and floor free/occupied counters move with every slot write."""
+from conftest import free_slot, logged_in
+
+
+def availability(app_module, owner_email='lot@example.com'):
+    response = logged_in(app_module, 'driver@example.com').get(f'/api/availability/{owner_email}')
+    assert response.status_code == 200
+    body = response.get_json()
+    return body['free'], body['occupied'], body['floors']
+
+
+def test_counters_follow_create_book_and_cancel(app_module):
+    app_module.save_owner({'email': 'lot@example.com', 'password': 'x', 'orgType': 'mall',
+                           'orgName': 'Lot', 'costPerHour': 20})
+    for n in range(3):
+        assert app_module.create_slot(free_slot(f's{n}', floor_number=str(n % 2 + 1)))
+    assert availability(app_module) == (3, 0, {'1': {'free': 2, 'occupied': 0},
+                                               '2': {'free': 1, 'occupied': 0}})
+
+    driver = logged_in(app_module, 'driver@example.com')
+    assert driver.post('/book', data={'slotId': 's1'}).status_code == 200
+    assert availability(app_module) == (2, 1, {'1': {'free': 2, 'occupied': 0},
+                                               '2': {'free': 0, 'occupied': 1}})
+
+    assert driver.post('/cancel', data={'slotId': 's1'}).status_code == 200
+    assert availability(app_module)[:2] == (3, 0)
+
+
+def test_losing_booking_does_not_move_counters(app_module):
+    app_module.create_slot(free_slot('s1'))
+    logged_in(app_module, 'driver@example.com').post('/book', data={'slotId': 's1'})
+
+    assert logged_in(app_module, 'other@example.com').post('/book', data={'slotId': 's1'}).status_code == 409
+    assert availability(app_module)[:2] == (0, 1)
+
+
+def test_rebuild_recounts_slots_that_predate_the_counters(app_module):
+    app_module.save_slot(free_slot('s1'))
+    app_module.save_slot(dict(free_slot('s2'), bookingDate='2024-05-01', checkinTime='10:00:00',
+                              status='driver@example.com'))
+    assert availability(app_module)[:2] == (0, 0)
+
+    result = app_module.app.test_cli_runner().invoke(args=['rebuild-counters', 'lot@example.com'])
+
+    assert result.exit_code == 0
+    assert availability(app_module) == (1, 1, {'1': {'free': 1, 'occupied': 1}})
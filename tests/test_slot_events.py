@@ -0,0 +1,48 @@
+"""Slot changes are pushed to the subscribers of the slot's lot."""
+from conftest import free_slot, logged_in
+from events import EventBroker
+
+
+def test_events_reach_only_their_channel():
+    broker = EventBroker()
+    mine, other = broker.subscribe('lot@example.com'), broker.subscribe('elsewhere@example.com')
+
+    broker.publish('lot@example.com', {'id': 's1', 'status': 'driver@example.com'})
+
+    assert mine.get_nowait() == {'id': 's1', 'status': 'driver@example.com'}
+    assert other.empty()
+
+
+def test_full_subscriber_drops_its_oldest_event():
+    broker = EventBroker(max_queue=2)
+    subscription = broker.subscribe('lot@example.com')
+
+    for n in range(3):
+        broker.publish('lot@example.com', {'id': f's{n}'})
+
+    assert [subscription.get_nowait()['id'] for _ in range(2)] == ['s1', 's2']
+
+
+def test_unsubscribe_forgets_the_channel():
+    broker = EventBroker()
+    subscription = broker.subscribe('lot@example.com')
+
+    broker.unsubscribe('lot@example.com', subscription)
+
+    assert broker.subscriber_count() == 0
+
+
+def test_book_and_cancel_publish_the_new_state(app_module):
+    app_module.save_owner({'email': 'lot@example.com', 'password': 'x', 'orgType': 'mall',
+                           'orgName': 'Lot', 'costPerHour': 20})
+    app_module.create_slot(free_slot('s1'))
+    subscription = app_module.slot_events.subscribe('lot@example.com')
+    try:
+        driver = logged_in(app_module, 'driver@example.com')
+        assert driver.post('/book', data={'slotId': 's1'}).status_code == 200
+        assert driver.post('/cancel', data={'slotId': 's1'}).status_code == 200
+
+        assert subscription.get_nowait() == {'id': 's1', 'status': 'driver@example.com'}
+        assert subscription.get_nowait() == {'id': 's1', 'status': None}
+    finally:
+        app_module.slot_events.unsubscribe('lot@example.com', subscription)
@@ -0,0 +1,104 @@
+"""Cancelled booking transactions on DynamoDB: only a failed slot condition
+is a slot conflict; counter conflicts are retried and throttling surfaces."""
+import pytest
+
+from conftest import free_slot
+from storage import ReservationConflict, SlotConflict, Throttled
+
+BOOKING = {'bookingDate': '2024-05-01', 'checkinTime': '10:00:00'}
+
+
+def cancel_with(client, *codes, item=None):
+    reasons = [{'Code': code} for code in codes]
+    if item is not None:
+        reasons[0]['Item'] = item
+    return client.exceptions.TransactionCanceledException(
+        {'Error': {'Code': 'TransactionCanceledException', 'Message': 'cancelled'},
+         'CancellationReasons': reasons},
+        'TransactWriteItems')
+
+
+@pytest.fixture
+def stub_transactions(dynamodb_repository, monkeypatch):
+    """Make the next transactions fail with the given errors, then go through."""
+    client = dynamodb_repository.client
+    real = client.transact_write_items
+    failures = []
+
+    def transact_write_items(**kwargs):
+        if failures:
+            raise failures.pop(0)
+        return real(**kwargs)
+
+    monkeypatch.setattr(client, 'transact_write_items', transact_write_items)
+    monkeypatch.setattr('storage.dynamodb.sleep', lambda seconds: None)
+    return client, failures
+
+
+def test_counter_conflict_is_retried(dynamodb_repository, stub_transactions):
+    client, failures = stub_transactions
+    dynamodb_repository.create_slot(free_slot('s1'))
+    failures.append(cancel_with(client, 'None', 'TransactionConflict'))
+
+    slot = dynamodb_repository.claim_slot('s1', 'driver@example.com', BOOKING)
+
+    assert slot['status'] == 'driver@example.com'
+    assert dynamodb_repository.find_availability('lot@example.com')['occupied'] == 1
+
+
+def test_persistent_counter_conflict_is_not_a_missing_slot(dynamodb_repository, stub_transactions):
+    client, failures = stub_transactions
+    dynamodb_repository.create_slot(free_slot('s1'))
+    failures.extend(cancel_with(client, 'None', 'TransactionConflict') for _ in range(10))
+
+    with pytest.raises(ReservationConflict) as raised:
+        dynamodb_repository.claim_slot('s1', 'driver@example.com', BOOKING)
+    assert raised.value.reservation is None
+
+
+def test_throttled_counter_raises_throttled(dynamodb_repository, stub_transactions):
+    client, failures = stub_transactions
+    dynamodb_repository.create_slot(free_slot('s1'))
+    dynamodb_repository.claim_slot('s1', 'driver@example.com', BOOKING)
+    failures.append(cancel_with(client, 'None', 'ThrottlingError', 'TransactionConflict'))
+
+    with pytest.raises(Throttled):
+        dynamodb_repository.release_slot('s1', 'driver@example.com')
+
+
+def test_failed_slot_condition_is_a_slot_conflict(dynamodb_repository):
+    dynamodb_repository.create_slot(free_slot('s1'))
+    dynamodb_repository.claim_slot('s1', 'driver@example.com', BOOKING)
+
+    with pytest.raises(SlotConflict) as raised:
+        dynamodb_repository.claim_slot('s1', 'other@example.com', BOOKING)
+    assert raised.value.slot['status'] == 'driver@example.com'
+
+
+def test_lot_total_is_summed_over_shards(dynamodb_repository):
+    for n in range(6):
+        dynamodb_repository.create_slot(free_slot(f's{n}', floor_number=str(n % 2 + 1)))
+    for n in range(4):
+        dynamodb_repository.claim_slot(f's{n}', 'driver@example.com', BOOKING)
+    dynamodb_repository.release_slot('s0', 'driver@example.com')
+
+    expected = {'free': 3, 'occupied': 3}
+    assert dynamodb_repository.find_availability_for_owners(['lot@example.com']) == {'lot@example.com': expected}
+    summary = dynamodb_repository.find_availability('lot@example.com')
+    assert {'free': summary['free'], 'occupied': summary['occupied']} == expected
+
+    dynamodb_repository.rebuild_slot_counters('lot@example.com')
+    assert dynamodb_repository.find_availability_for_owners(['lot@example.com']) == {'lot@example.com': expected}
+
+
+def test_release_is_one_read_and_one_transaction(dynamodb_repository):
+    dynamodb_repository.create_slot(free_slot('s1'))
+    dynamodb_repository.claim_slot('s1', 'driver@example.com', BOOKING)
+    calls = []
+    dynamodb_repository.client.meta.events.register(
+        'before-call.dynamodb', lambda model, **kwargs: calls.append(model.name))
+
+    released = dynamodb_repository.release_slot('s1', 'driver@example.com')
+
+    assert calls == ['GetItem', 'TransactWriteItems']
+    assert released['bookingDate'] == '2024-05-01'
@@ -0,0 +1,53 @@
+"""/api/slots pages through a lot's slots without exposing who booked them."""
+import pytest
+
+from conftest import free_slot, logged_in
+
+
+@pytest.fixture
+def lot(app_module):
+    for n in range(12):
+        app_module.create_slot(dict(free_slot(f's{n:02d}', floor_number=str(n % 3 + 1)), slotNumber=str(n)))
+    app_module.claim_slot('s00', 'driver@example.com')
+    app_module.claim_slot('s01', 'other@example.com')
+    return logged_in(app_module, 'driver@example.com')
+
+
+def fetch_all(client, **params):
+    slots, cursor = [], None
+    while True:
+        query = dict(params, **({'cursor': cursor} if cursor else {}))
+        body = client.get('/api/slots/lot@example.com', query_string=query).get_json()
+        assert body['status'] == 'success'
+        assert len(body['slots']) <= params.get('limit', 50)
+        slots.extend(body['slots'])
+        cursor = body['nextCursor']
+        if not cursor:
+            return slots
+
+
+def test_pages_cover_the_lot_once(lot):
+    slots = fetch_all(lot, limit=5)
+
+    assert sorted(slot['id'] for slot in slots) == [f's{n:02d}' for n in range(12)]
+
+
+def test_slots_carry_flags_instead_of_emails(lot):
+    slots = {slot['id']: slot for slot in fetch_all(lot, limit=50)}
+
+    assert set(slots['s00']) == {'id', 'slotNumber', 'floorNumber', 'booked', 'mine'}
+    assert (slots['s00']['booked'], slots['s00']['mine']) == (True, True)
+    assert (slots['s01']['booked'], slots['s01']['mine']) == (True, False)
+    assert (slots['s02']['booked'], slots['s02']['mine']) == (False, False)
+
+
+def test_floor_filter_fills_whole_pages(lot):
+    body = lot.get('/api/slots/lot@example.com', query_string={'floor': '2', 'limit': 3}).get_json()
+
+    assert len(body['slots']) == 3
+    assert {slot['floorNumber'] for slot in body['slots']} == {'2'}
+    assert sorted(slot['id'] for slot in fetch_all(lot, floor='2', limit=3)) == ['s01', 's04', 's07', 's10']
+
+
+def test_bad_cursor_is_a_client_error(lot):
+    assert lot.get('/api/slots/lot@example.com', query_string={'cursor': '!!'}).status_code == 400
@@ -0,0 +1,91 @@
+"""The sweeper tracks open stays by expiry and flags or releases the overdue ones."""
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import free_slot
+from sweeper import ExpiryHeap, stay_expiry
+
+STAY = {'status': 'driver@example.com', 'bookingDate': '2024-05-01', 'checkinTime': '10:00:00'}
+
+
+def test_stay_expiry():
+    assert stay_expiry(STAY, max_hours=4) == datetime(2024, 5, 1, 14)
+    assert stay_expiry(dict(STAY, holdUntil='2024-05-01T12:00:00'), max_hours=4) == datetime(2024, 5, 1, 12)
+    assert stay_expiry(dict(STAY, holdUntil='2024-05-01T12:00:00')) == datetime(2024, 5, 1, 12)
+    assert stay_expiry(STAY) is None
+
+
+def test_stay_expiry_caps_a_far_hold_at_the_maximum_stay():
+    held = dict(STAY, holdUntil='2024-05-03T09:00:00')
+
+    assert stay_expiry(held, max_hours=4) == datetime(2024, 5, 1, 14)
+    assert stay_expiry(held) == datetime(2024, 5, 3, 9)
+
+
+def test_heap_pops_due_stays_in_order():
+    heap = ExpiryHeap()
+    heap.add('late', datetime(2024, 5, 1, 12), 't1')
+    heap.add('early', datetime(2024, 5, 1, 11), 't2')
+    heap.add('later', datetime(2024, 5, 1, 13), 't3')
+
+    assert heap.pop_due(datetime(2024, 5, 1, 12)) == [('early', 't2'), ('late', 't1')]
+    assert len(heap) == 1 and 'later' in heap
+
+
+def test_heap_readd_replaces_and_discard_drops():
+    heap = ExpiryHeap()
+    heap.add('s1', datetime(2024, 5, 1, 11), 't1')
+    heap.add('s1', datetime(2024, 5, 1, 15), 't2')
+    heap.add('s2', datetime(2024, 5, 1, 11), 't3')
+    heap.discard('s2')
+
+    assert heap.pop_due(datetime(2024, 5, 1, 14)) == []
+    assert heap.pop_due(datetime(2024, 5, 1, 15)) == [('s1', 't2')]
+    assert len(heap) == 0
+
+
+@pytest.fixture
+def parked(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, 'STAY_MAX_HOURS', 2)
+    repository = app_module.repository
+    repository.save_owner({'email': 'lot@example.com', 'orgName': 'Lot', 'orgType': 'mall', 'costPerHour': 20})
+    repository.create_slot(free_slot('s1'))
+    repository.create_slot(free_slot('s2'))
+    app_module.claim_slot('s1', 'driver@example.com')
+    checkin = datetime.fromisoformat(
+        f"{repository.find_slot_by_id('s1')['bookingDate']}T{repository.find_slot_by_id('s1')['checkinTime']}")
+    heap = ExpiryHeap()
+    app_module.reconcile_stays(heap)
+    return app_module, heap, checkin
+
+
+def test_reconcile_tracks_only_open_stays(parked):
+    app_module, heap, checkin = parked
+
+    assert 's1' in heap and 's2' not in heap
+    assert app_module.settle_overstays(heap, now=checkin + timedelta(hours=1)) == 0
+
+
+def test_flag_marks_overdue_stay_once(parked, monkeypatch):
+    app_module, heap, checkin = parked
+    monkeypatch.setattr(app_module, 'OVERSTAY_ACTION', 'flag')
+
+    assert app_module.settle_overstays(heap, now=checkin + timedelta(hours=3)) == 1
+
+    slot = app_module.repository.find_slot_by_id('s1')
+    assert slot['status'] == 'driver@example.com' and slot['overstayAt']
+    entries, _ = app_module.repository.find_user_history('driver@example.com')
+    assert [entry['event'] for entry in entries] == ['overstay']
+    app_module.reconcile_stays(heap)
+    assert 's1' not in heap
+
+
+def test_release_checks_the_stay_out(parked, monkeypatch):
+    app_module, heap, checkin = parked
+    monkeypatch.setattr(app_module, 'OVERSTAY_ACTION', 'release')
+
+    assert app_module.settle_overstays(heap, now=checkin + timedelta(hours=3)) == 1
+
+    assert app_module.repository.find_slot_by_id('s1')['status'] is None
+    assert app_module.find_availability_for_owners(['lot@example.com'])['lot@example.com']['free'] == 2
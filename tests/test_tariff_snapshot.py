@@ -0,0 +1,48 @@
+"""Bookings carry the tariff they were made under, so billing is one read."""
+from datetime import timedelta
+from decimal import Decimal
+
+import pytest
+
+from billing import booking_start
+from conftest import free_slot, logged_in
+
+
+@pytest.fixture
+def booked(app_module):
+    app_module.save_owner({'email': 'lot@example.com', 'password': 'x', 'orgType': 'mall', 'orgName': 'Lot',
+                           'costPerHour': 20, 'graceMinutes': 10})
+    app_module.create_slot(free_slot('s1'))
+    app_module.claim_slot('s1', 'driver@example.com')
+    return app_module
+
+
+def test_booking_stores_the_owner_tariff(booked):
+    slot = booked.find_slot_by_id('s1')
+
+    assert slot['tariff'] == {'costPerHour': Decimal('20'), 'graceMinutes': 10}
+    assert slot['orgName'] == 'Lot'
+
+
+def test_price_change_does_not_touch_a_running_stay(booked):
+    booked.save_owner({'email': 'lot@example.com', 'password': 'x', 'orgType': 'mall', 'orgName': 'Lot',
+                       'costPerHour': 1000})
+    slot = booked.find_slot_by_id('s1')
+
+    assert booked.bill_booking(slot, now=booking_start(slot) + timedelta(hours=2)) == Decimal('40.00')
+
+
+def test_bill_needs_no_owner_lookup(booked, monkeypatch):
+    monkeypatch.setattr(booked, 'find_owner_by_email', lambda email: pytest.fail('owner read'))
+
+    response = logged_in(booked, 'driver@example.com').post('/get_bill', data={'slotId': 's1'})
+
+    assert response.status_code == 200
+    assert response.get_json()['orgName'] == 'Lot'
+
+
+def test_release_clears_the_snapshot(booked):
+    assert logged_in(booked, 'driver@example.com').post('/cancel', data={'slotId': 's1'}).status_code == 200
+
+    slot = booked.find_slot_by_id('s1')
+    assert not slot.get('tariff') and not slot.get('orgName')
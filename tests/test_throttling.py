@@ -0,0 +1,79 @@
+"""A call DynamoDB keeps throttling gives up in bounded time and answers 503."""
+import json
+from types import SimpleNamespace
+
+import pytest
+from botocore.awsrequest import AWSResponse
+
+from conftest import free_slot
+from storage import Throttled
+
+
+class _Body:
+    def __init__(self, data):
+        self.data = data
+
+    def read(self):
+        return self.data
+
+    def stream(self, **kwargs):
+        yield self.data
+
+
+def throttle_every_call(repository):
+    """Answer every DynamoDB request with ProvisionedThroughputExceededException."""
+    body = json.dumps({'__type': 'com.amazonaws.dynamodb.v20120810#ProvisionedThroughputExceededException',
+                       'message': 'Rate of requests exceeds the allowed throughput'}).encode()
+    sent = []
+
+    def before_send(request, **kwargs):
+        sent.append(request)
+        return AWSResponse(request.url, 400, {'x-amzn-RequestId': 'throttled'}, _Body(body))
+
+    repository.client.meta.events.register('before-send.dynamodb', before_send)
+    return sent
+
+
+@pytest.fixture
+def throttled_repository(dynamodb_repository, monkeypatch):
+    dynamodb_repository.create_slot(free_slot('s1'))
+    retry = dynamodb_repository.clients.throttle_retry
+    monkeypatch.setattr(retry, 'base_delay', 0.01)
+    monkeypatch.setattr(retry, 'max_delay', 0.05)
+    # Always wait the longest the backoff allows
+    monkeypatch.setattr('storage.dynamodb.random.uniform', lambda low, high: high)
+    return dynamodb_repository
+
+
+def test_throttles_are_not_also_rate_limited_by_botocore(dynamodb_repository):
+    assert dynamodb_repository.client.meta.config.retries['mode'] == 'standard'
+
+
+def test_fully_throttled_call_is_bounded(throttled_repository, monkeypatch):
+    retry = throttled_repository.clients.throttle_retry
+    sent = throttle_every_call(throttled_repository)
+    # botocore sleeps between attempts for as long as the needs-retry handler says
+    sleeps = []
+    monkeypatch.setattr('botocore.endpoint.time', SimpleNamespace(sleep=sleeps.append))
+
+    with pytest.raises(Throttled) as raised:
+        throttled_repository.find_slot_by_id('s1')
+
+    assert raised.value.attempts == retry.max_attempts
+    assert len(sent) == retry.max_attempts
+    assert sleeps == [min(retry.max_delay, retry.base_delay * 2 ** (attempts - 1))
+                      for attempts in range(1, retry.max_attempts)]
+    assert sum(sleeps) == pytest.approx(retry.max_total_delay())
+
+
+def test_throttled_route_answers_503(throttled_repository, app_module, monkeypatch):
+    monkeypatch.setattr(app_module, 'repository', throttled_repository)
+    throttle_every_call(throttled_repository)
+    client = app_module.app.test_client()
+    with client.session_transaction() as session:
+        session['logged_in_email'] = 'driver@example.com'
+
+    response = client.post('/get_bill', data={'slotId': 's1'})
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
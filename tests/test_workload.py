@@ -0,0 +1,63 @@
+"""The workload simulator draws realistic arrivals and replays them in order."""
+import os
+import random
+import subprocess
+import sys
+import threading
+
+BENCHMARKS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks')
+sys.path.insert(0, BENCHMARKS)
+
+from workload import Scheduler, arrival_times, diurnal  # noqa: E402
+
+
+def test_diurnal_peaks_at_commute_hours():
+    assert diurnal(9) > diurnal(13) > diurnal(3)
+    assert diurnal(18) > diurnal(13)
+    assert diurnal(0) == diurnal(24)
+
+
+def test_arrivals_keep_the_mean_rate():
+    for profile in ('poisson', 'diurnal'):
+        arrivals = list(arrival_times(100, 240, profile, random.Random(1)))
+
+        assert arrivals == sorted(arrivals) and 0 <= arrivals[0] and arrivals[-1] < 240
+        assert 0.95 * 24000 < len(arrivals) < 1.05 * 24000
+
+
+def test_diurnal_arrivals_follow_the_profile():
+    hours = [t % 24 for t in arrival_times(100, 240, 'diurnal', random.Random(2))]
+
+    morning = sum(1 for hour in hours if 8 <= hour < 10)
+    night = sum(1 for hour in hours if 2 <= hour < 4)
+    assert morning > 5 * night
+
+
+def test_scheduler_runs_due_events_in_order_including_added_ones():
+    scheduler = Scheduler(workers=1)
+    ran = []
+    lock = threading.Lock()
+
+    def record(name, then=None):
+        with lock:
+            ran.append(name)
+        if then:
+            scheduler.at(0, lambda: record(then))
+
+    scheduler.at(2, lambda: record('second'))
+    scheduler.at(1, lambda: record('first', then='added'))
+    scheduler.run()
+
+    assert sorted(ran) == ['added', 'first', 'second']
+    assert ran[0] == 'first'
+    assert len(scheduler.late) == 3
+
+
+def test_workload_runs_end_to_end():
+    result = subprocess.run([sys.executable, os.path.join(BENCHMARKS, 'workload.py'), '--backend', 'memory',
+                             '--owners', '2', '--slots', '10', '--arrivals', '20', '--hours', '1',
+                             '--speedup', '36000', '--workers', '4'],
+                            check=True, capture_output=True, text=True)
+
+    assert 'backend=memory' in result.stdout
+    assert 'booking conflict rate' in result.stdout